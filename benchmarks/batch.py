@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Measures the throughput, in scripts per second, of running many small Lox
+# scripts: one plox process per script, against --batch with 1 to N worker
+# processes.
+#
+#   ./benchmarks/batch.py
+#   ./benchmarks/batch.py --scripts 2000 --jobs 8 --engine closure
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plox.Interpreter import ENGINES
+
+SCRIPT = '''
+class Counter {
+  init(start) { this.count = start; }
+  add(n) { this.count = this.count + n; return this; }
+}
+
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+
+var counter = Counter(%d);
+for (var i = 0; i < 10; i = i + 1) counter.add(i);
+print counter.count + fib(10);
+'''
+
+def writeScripts(directory, count):
+    for i in range(count):
+        with open(os.path.join(directory, f'script{i:05d}.lox'), 'w') as f:
+            f.write(SCRIPT % i)
+
+def timeCommand(command):
+    start = time.perf_counter()
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scripts', type=int, default=500)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='largest worker count to try')
+    parser.add_argument('--engine', choices=ENGINES, default='tree')
+    parser.add_argument('--single', type=int, default=50,
+                        help='scripts to time with one plox process each (0 to skip)')
+    args = parser.parse_args()
+    plox = [sys.executable, os.path.join(ROOT, 'plox.py'), '--no-cache', f'--engine={args.engine}']
+
+    with tempfile.TemporaryDirectory() as directory:
+        writeScripts(directory, args.scripts)
+        print(f'{args.scripts} scripts, {args.engine} engine')
+        if args.single:
+            scripts = sorted(os.listdir(directory))[:args.single]
+            elapsed = sum(timeCommand(plox + [os.path.join(directory, script)]) for script in scripts)
+            print(f'  {"process per script":20}{len(scripts) / elapsed:10.1f} scripts/s')
+        jobs = 1
+        while True:
+            elapsed = timeCommand(plox + ['--batch', directory, '-j', str(jobs)])
+            print(f'  {f"--batch -j {jobs}":20}{args.scripts / elapsed:10.1f} scripts/s')
+            if jobs >= args.jobs:
+                break
+            jobs = min(jobs * 2, args.jobs)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
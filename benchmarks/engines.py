@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Runs Lox scripts under every plox engine, checks that they all print the
+# same thing as the tree-walker and reports wall-clock time per engine.
+#
+#   ./benchmarks/engines.py                      # everything under test-files/
+#   ./benchmarks/engines.py test-files/fib_clock.lox --repeat 5
+import argparse
+import glob
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plox.Interpreter import ENGINES
+
+def runScript(engine, path):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'plox.py'), f'--engine={engine}', path],
+        capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, stripTimings(result.stdout + result.stderr)
+
+def stripTimings(output):
+    # Scripts that call clock() print their own timings; those differ per run.
+    lines = output.splitlines()
+    kept = []
+    skipNext = False
+    for line in lines:
+        if skipNext:
+            skipNext = False
+            continue
+        if line.startswith('Time to execute') or line.startswith('elapsed'):
+            skipNext = True
+            continue
+        kept.append(line)
+    return kept
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('scripts', nargs='*')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    args = parser.parse_args()
+
+    scripts = args.scripts or sorted(glob.glob(os.path.join(ROOT, 'test-files', '**', '*.lox'), recursive=True))
+    engines = args.engines.split(',')
+    mismatches = 0
+
+    print(f'{"script":44}' + ''.join(f'{engine:>12}' for engine in engines) + '   speedup')
+    for script in scripts:
+        timings = []
+        expected = None
+        for engine in engines:
+            samples = []
+            for _ in range(args.repeat):
+                elapsed, output = runScript(engine, script)
+                samples.append(elapsed)
+            if expected is None:
+                expected = output
+            elif output != expected:
+                mismatches += 1
+                print(f'  output mismatch: {engine} on {script}', file=sys.stderr)
+            timings.append(statistics.median(samples))
+        name = os.path.relpath(script, ROOT)
+        speedups = '  '.join(f'{timings[0] / t:.2f}x' for t in timings[1:])
+        print(f'{name:44}' + ''.join(f'{t:11.3f}s' for t in timings) + f'   {speedups}')
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
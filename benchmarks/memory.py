@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Reports how much memory the front end holds per token and per AST node,
+# measured with tracemalloc on a large source built by repeating the
+# scripts under test-files/, and how much a two-field instance costs in the
+# tree-walking interpreter.
+#
+#   ./benchmarks/memory.py
+#   ./benchmarks/memory.py --size 4
+import argparse
+import glob
+import gc
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plox.RegexScanner import RegexScanner
+from plox.Parser import Parser
+from plox.Expr import Expr
+from plox.Stmt import Stmt
+from plox.Interpreter import Interpreter
+from plox.Resolver import Resolver
+
+INSTANCES = '''
+class Node { init(value, next) { this.value = value; this.next = next; } }
+var head = nil;
+for (var i = 0; i < %d; i = i + 1) head = Node(nil, head);
+'''
+
+def buildSource(megabytes):
+    sample = '\n'.join(
+        open(path).read()
+        for path in sorted(glob.glob(os.path.join(ROOT, 'test-files', '**', '*.lox'), recursive=True)))
+    copies = max(1, int(megabytes * 1024 * 1024 / len(sample)))
+    return '\n'.join([sample] * copies)
+
+def countNodes(statements):
+    # Every Expr/Stmt reachable from the parsed program.
+    seen = set()
+    pending = [node for node in statements if node is not None]
+    while pending:
+        node = pending.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        for name in getattr(type(node), '__slots__', None) or vars(node):
+            value = getattr(node, name)
+            values = value if isinstance(value, list) else [value]
+            pending.extend(v for v in values if isinstance(v, (Expr, Stmt)))
+    return len(seen)
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=float, default=1, help='source size in MB')
+    parser.add_argument('--instances', type=int, default=100000)
+    args = parser.parse_args()
+
+    source = buildSource(args.size)
+    tokens, tokenBytes = measure(lambda: RegexScanner(source).scanTokens())
+    statements, nodeBytes = measure(lambda: Parser(tokens).parse())
+    nodes = countNodes(statements)
+
+    interpreter = Interpreter()
+    program = Parser(RegexScanner(INSTANCES % args.instances).scanTokens()).parse()
+    Resolver(interpreter).resolve(program)
+    _, instanceBytes = measure(lambda: interpreter.interpret(program))
+
+    print(f'source:  {len(source) / (1024 * 1024):.1f} MB')
+    print(f'tokens:  {len(tokens):9d}  {tokenBytes / (1024 * 1024):8.1f} MB  {tokenBytes / len(tokens):6.1f} bytes/token')
+    print(f'nodes:   {nodes:9d}  {nodeBytes / (1024 * 1024):8.1f} MB  {nodeBytes / nodes:6.1f} bytes/node')
+    print(f'objects: {args.instances:9d}  {instanceBytes / (1024 * 1024):8.1f} MB  '
+          f'{instanceBytes / args.instances:6.1f} bytes/instance')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Compares the bytecode VM, whose call stack lives on the heap, with the
+# recursive engines: time on shallow recursion (fib) and the deepest
+# recursion each engine gets through before reporting a stack overflow.
+#
+#   ./benchmarks/recursion.py
+#   ./benchmarks/recursion.py --fib 25 --depths 1000,100000 --max-depth 200000
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plox.Interpreter import ENGINES
+
+FIB = '''
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+print fib(%d);
+'''
+
+COUNT = '''
+fun count(n) {
+  if (n == 0) return 0;
+  return count(n - 1) + 1;
+}
+print count(%d);
+'''
+
+def runSource(engine, source, maxDepth=None):
+    with tempfile.NamedTemporaryFile('w', suffix='.lox', delete=False) as f:
+        f.write(source)
+    command = [sys.executable, os.path.join(ROOT, 'plox.py'), '--no-cache', f'--engine={engine}', f.name]
+    if maxDepth:
+        command.append(f'--max-depth={maxDepth}')
+    try:
+        start = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True)
+        return time.perf_counter() - start, result.stdout + result.stderr
+    finally:
+        os.unlink(f.name)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fib', type=int, default=20)
+    parser.add_argument('--depths', default='100,1000,10000,50000')
+    parser.add_argument('--max-depth', type=int,
+                        help='passed to every engine (default: each engine\'s own limit)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    args = parser.parse_args()
+    engines = args.engines.split(',')
+
+    print(f'shallow: fib({args.fib})')
+    for engine in engines:
+        samples = [runSource(engine, FIB % args.fib, args.max_depth)[0] for _ in range(args.repeat)]
+        print(f'  {engine:10}{statistics.median(samples):9.3f}s')
+
+    print('deep: count(n)')
+    print(f'  {"n":>10}' + ''.join(f'{engine:>12}' for engine in engines))
+    for depth in map(int, args.depths.split(',')):
+        cells = []
+        for engine in engines:
+            elapsed, output = runSource(engine, COUNT % depth, args.max_depth)
+            cells.append(f'{elapsed:11.3f}s' if f'{float(depth)}' in output else f'{"overflow":>12}')
+        print(f'  {depth:>10}' + ''.join(cells))
+
+if __name__ == '__main__':
+    main()
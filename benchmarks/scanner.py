@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Measures scanner throughput in MB/s on a large source built by repeating
+# the scripts under test-files/, and checks both scanners agree on it.
+#
+#   ./benchmarks/scanner.py                   # ~4 MB of source
+#   ./benchmarks/scanner.py --size 16 --repeat 5
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plox.Scanner import Scanner
+from plox.RegexScanner import RegexScanner
+
+SCANNERS = {'Scanner': Scanner, 'RegexScanner': RegexScanner}
+
+def buildSource(megabytes):
+    sample = '\n'.join(
+        open(path).read()
+        for path in sorted(glob.glob(os.path.join(ROOT, 'test-files', '**', '*.lox'), recursive=True)))
+    copies = max(1, int(megabytes * 1024 * 1024 / len(sample)))
+    return '\n'.join([sample] * copies)
+
+def tokenStream(tokens):
+    return [(token.type, token.lexeme, token.literal, token.line) for token in tokens]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=float, default=4, help='source size in MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    source = buildSource(args.size)
+    size = len(source.encode()) / (1024 * 1024)
+    print(f'source: {size:.1f} MB')
+
+    results = dict()
+    for name, scanner in SCANNERS.items():
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            tokens = scanner(source).scanTokens()
+            samples.append(time.perf_counter() - start)
+        results[name] = tokenStream(tokens)
+        elapsed = statistics.median(samples)
+        print(f'{name:14} {elapsed:8.3f}s {size / elapsed:8.2f} MB/s  ({len(tokens)} tokens)')
+
+    if results['Scanner'] != results['RegexScanner']:
+        print('token streams differ', file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
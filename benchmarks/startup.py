@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Measures how long `./plox.py script.lox` takes to start: the wall-clock
+# time of running a one-line script (with a warm .loxc cache and without
+# one) next to a bare `python -c pass`, and, from `python -X importtime`,
+# the total import time and the modules that cost the most.
+#
+#   ./benchmarks/startup.py
+#   ./benchmarks/startup.py --runs 50 --top 20 --json startup.json
+import argparse
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+PLOX = os.path.join(ROOT, 'plox.py')
+
+def wallTime(command, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def importTimes(command):
+    # {module: (self, cumulative)} in microseconds, for the top-level import
+    # of each module (-X importtime lists every module once).
+    result = subprocess.run([sys.executable, '-X', 'importtime', *command],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        selfTime, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(selfTime), int(cumulative), len(name) - len(name.lstrip()))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to list')
+    parser.add_argument('--json', metavar='PATH', help='write the results to PATH')
+    args = parser.parse_args()
+
+    # Make sure every run finds up to date .pyc files, even when bytecode
+    # writing is off (PYTHONDONTWRITEBYTECODE), so compiling plox's own
+    # modules is not counted as import time.
+    compileall.compile_dir(os.path.join(ROOT, 'plox'), quiet=1)
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, 'one.lox')
+        with open(script, 'w') as f:
+            f.write('print 1;\n')
+        cached = [PLOX, script]
+        subprocess.run([sys.executable, *cached], stdout=subprocess.DEVNULL)
+        results = {
+            'python': wallTime([sys.executable, '-c', 'pass'], args.runs),
+            'cached': wallTime([sys.executable, *cached], args.runs),
+            'uncached': wallTime([sys.executable, PLOX, '--no-cache', script], args.runs),
+        }
+        times = importTimes(cached)
+        baseline = importTimes(['-c', 'pass'])
+
+    # Modules imported at the top level on behalf of plox, i.e. not by
+    # Python itself on startup.
+    topLevel = {name: cumulative for name, (_, cumulative, indent) in times.items()
+                if indent == 1 and name not in baseline}
+    results['imports'] = sum(topLevel.values()) / 1e6
+    results['modules'] = len(set(times) - set(baseline))
+
+    print(f'python -c pass      {results["python"] * 1000:8.1f} ms')
+    print(f'plox.py (cached)    {results["cached"] * 1000:8.1f} ms')
+    print(f'plox.py --no-cache  {results["uncached"] * 1000:8.1f} ms')
+    print(f'imports             {results["imports"] * 1000:8.1f} ms in {results["modules"]} modules')
+    print(f'slowest imports (self time, cumulative):')
+    slowest = sorted(((selfTime, cumulative, name) for name, (selfTime, cumulative, _) in times.items()
+                      if name not in baseline), reverse=True)[:args.top]
+    for selfTime, cumulative, name in slowest:
+        print(f'  {name:28}{selfTime / 1000:7.1f} ms{cumulative / 1000:8.1f} ms')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
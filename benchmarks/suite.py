@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Runs the Lox benchmarks under benchmarks/lox/ (a scaled-down take on the
+# Crafting Interpreters benchmark set) several times per engine and reports
+# the median and standard deviation of the wall-clock time, and the peak RSS,
+# of each run of plox. Results can be written as JSON, and compared with a
+# baseline written by an earlier run to catch regressions.
+#
+#   ./benchmarks/suite.py
+#   ./benchmarks/suite.py fib zoo --engines tree,closure --repeat 10
+#   ./benchmarks/suite.py --save-baseline benchmarks/baseline.json
+#   ./benchmarks/suite.py --baseline benchmarks/baseline.json --threshold 5
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plox.Interpreter import ENGINES
+from engines import stripTimings
+
+BENCHMARKS = os.path.join(ROOT, 'benchmarks', 'lox')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+def runOnce(engine, path, flags):
+    # Peak RSS comes from wait4, so it is that of this run of plox alone.
+    command = [sys.executable, os.path.join(ROOT, 'plox.py'), f'--engine={engine}', *flags, path]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = process.stdout.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.stdout.close()
+    rss = usage.ru_maxrss * 1024 if sys.platform != 'darwin' else usage.ru_maxrss
+    return elapsed, rss, os.waitstatus_to_exitcode(status), stripTimings(output)
+
+def runBenchmark(engine, path, flags, repeat):
+    samples = []
+    peak = 0
+    expected = None
+    for _ in range(repeat):
+        elapsed, rss, status, output = runOnce(engine, path, flags)
+        if status != 0 or any('Error' in line or 'failure' in line for line in output):
+            raise SystemExit(f'{engine} failed on {path}:\n' + '\n'.join(output))
+        if expected is None:
+            expected = output
+        elif output != expected:
+            raise SystemExit(f'{engine} printed different output across runs of {path}')
+        samples.append(elapsed)
+        peak = max(peak, rss)
+    return {
+        'median': statistics.median(samples),
+        'stddev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rss': peak,
+        'samples': samples,
+    }
+
+def compare(results, baseline):
+    # Yields (engine, name, change) for every benchmark in both runs, with
+    # the relative change of the median in percent.
+    for engine, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            before = baseline.get(engine, {}).get(name)
+            if before is not None:
+                yield engine, name, 100.0 * (result['median'] / before['median'] - 1.0)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmarks', nargs='*', help='names under benchmarks/lox/ (default: all)')
+    parser.add_argument('--engines', default='tree', help=f'comma separated (default: tree; any of {",".join(ENGINES)})')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--flags', default='', help='extra plox options, e.g. "-O1 --memoize"')
+    parser.add_argument('--json', metavar='PATH', help='write the results to PATH')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='compare with the results in PATH (default: benchmarks/baseline.json if present)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results to PATH as the new baseline')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent slowdown of a median that counts as a regression (default: 10)')
+    args = parser.parse_args()
+
+    names = args.benchmarks or sorted(
+        os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(BENCHMARKS, '*.lox')))
+    engines = args.engines.split(',')
+    flags = args.flags.split()
+
+    results = {}
+    print(f'{"benchmark":18}{"engine":>10}{"median":>11}{"stddev":>11}{"peak RSS":>12}')
+    for name in names:
+        path = os.path.join(BENCHMARKS, f'{name}.lox')
+        for engine in engines:
+            result = runBenchmark(engine, path, flags, args.repeat)
+            results.setdefault(engine, {})[name] = result
+            print(f'{name:18}{engine:>10}{result["median"]:10.3f}s{result["stddev"]:10.3f}s'
+                  f'{result["rss"] / (1024 * 1024):9.1f} MB')
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'flags': args.flags,
+        'results': results,
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+
+    baselinePath = args.baseline or (DEFAULT_BASELINE if os.path.exists(DEFAULT_BASELINE) else None)
+    if baselinePath is None or baselinePath == args.save_baseline:
+        return 0
+    with open(baselinePath) as f:
+        baseline = json.load(f)['results']
+    regressions = 0
+    print(f'compared with {os.path.relpath(baselinePath)}:')
+    for engine, name, change in compare(results, baseline):
+        regressed = change > args.threshold
+        regressions += regressed
+        print(f'  {name:18}{engine:>10}{change:+9.1f}%' + ('  REGRESSION' if regressed else ''))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
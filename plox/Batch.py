@@ -0,0 +1,89 @@
+import io
+import os
+import sys
+import glob
+import time
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+# Runs many scripts (--batch) on a pool of worker processes that have
+# already imported plox, so each script only costs a fresh Lox and
+# Interpreter. Every script's stdout and stderr are captured and written out
+# in input order, followed by a summary.
+#
+# The batch exits with the highest exit status of any script (see
+# Lox.exitStatus).
+
+# Set up in each worker by warm().
+options = None
+
+def warm(batchOptions):
+    # Imports everything a script could need up front, once per worker.
+    global options
+    options = batchOptions
+    from . import Lox, Interpreter, Parser, Resolver, RegexScanner
+    if options['engine'] == 'closure':
+        from . import ClosureCompiler
+    elif options['engine'] == 'bytecode':
+        from . import BytecodeCompiler, VM
+    elif options['engine'] == 'python':
+        from . import PythonGenerator, PythonRuntime
+    if options['cache'] is not None:
+        from . import Cache
+    if options['optimize']:
+        from . import Optimizer
+    if options['memoize']:
+        from . import Memoizer
+
+def runScript(path: str):
+    from .Lox import Lox, EXIT_RUNTIME_ERROR
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        print(f'Executing file: {path}')
+        lox = Lox(options['engine'], None, options['cache'], options['maxDepth'],
+                  options['optimize'], options['memoize'])
+        try:
+            with open(path, 'r') as f:
+                lox.run(f.read(), path)
+            status = lox.exitStatus()
+        except Exception:
+            print(f"Some failure occured: {sys.exc_info()[0]}")
+            traceback.print_exc()
+            status = EXIT_RUNTIME_ERROR
+    return stdout.getvalue(), stderr.getvalue(), status
+
+def findScripts(path: str):
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '**', '*.lox'), recursive=True))
+    return [path]
+
+def runBatch(path: str, jobs: int, batchOptions: dict) -> int:
+    scripts = findScripts(path)
+    start = time.perf_counter()
+    if jobs == 1:
+        warm(batchOptions)
+        results = map(runScript, scripts)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(jobs, initializer=warm, initargs=(batchOptions,))
+        results = pool.imap(runScript, scripts, chunksize=max(1, len(scripts) // (jobs * 8)))
+    failed = []
+    try:
+        for script, (stdout, stderr, status) in zip(scripts, results):
+            sys.stdout.write(stdout)
+            sys.stderr.write(stderr)
+            if status:
+                failed.append((script, status))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    sys.stdout.flush()
+    elapsed = time.perf_counter() - start
+    for script, status in failed:
+        print(f'batch: {script} exited with {status}', file=sys.stderr)
+    rate = len(scripts) / elapsed if elapsed else 0.0
+    print(f'batch: {len(scripts)} scripts, {len(failed)} failed, {elapsed:.3f}s '
+          f'({rate:.1f} scripts/s, {jobs} workers)', file=sys.stderr)
+    return max((status for _, status in failed), default=0)
@@ -0,0 +1,388 @@
+from __future__ import annotations
+from enum import Enum
+from .Expr import *
+from .Stmt import *
+from .TokenType import Token, TokenType
+from .Chunk import Chunk, OpCode, MAX_OPERAND
+from .VMObjects import ObjFunction
+from .Util import error
+
+class FunctionKind(Enum):
+    SCRIPT = 0
+    FUNCTION = 1
+    METHOD = 2
+    INITIALIZER = 3
+
+class Local:
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.isCaptured = False
+
+class FunctionState:
+    def __init__(self, enclosing, function: ObjFunction, kind: FunctionKind):
+        self.enclosing: FunctionState = enclosing
+        self.function = function
+        self.kind = kind
+        # Slot zero holds the callee, or the receiver for methods.
+        slotZero = 'this' if kind in (FunctionKind.METHOD, FunctionKind.INITIALIZER) else ''
+        self.locals: list[Local] = [Local(slotZero, 0)]
+        self.upvalues: list[tuple] = []
+        self.scopeDepth = 0
+
+class ClassState:
+    def __init__(self, enclosing, hasSuperclass: bool):
+        self.enclosing: ClassState = enclosing
+        self.hasSuperclass = hasSuperclass
+
+# Compiles a resolved program into bytecode for the VM. Locals live in stack
+# slots and variables captured by closures become upvalues, following the
+# clox design; the Resolver has already rejected invalid programs, so the
+# compiler only reports limits of the instruction format.
+class BytecodeCompiler(ExprVisitor, StmtVisitor):
+    def __init__(self):
+        self.state: FunctionState = None
+        self.classState: ClassState = None
+        self.line = 0
+        self.hadError = False
+
+    def compile(self, statements: list[Stmt]) -> ObjFunction:
+        self.state = FunctionState(None, ObjFunction(None), FunctionKind.SCRIPT)
+        for stmt in statements:
+            self.compileStmt(stmt)
+        self.emitReturn()
+        return self.state.function
+
+    def compileStmt(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def compileExpr(self, expr: Expr):
+        expr.accept(self)
+
+    # Emitting
+
+    def chunk(self) -> Chunk:
+        return self.state.function.chunk
+
+    def emitOp(self, op: OpCode, token=None):
+        chunk = self.chunk()
+        if token is not None:
+            chunk.tokens[chunk.count()] = token
+            if isinstance(token, Token):
+                self.line = token.line
+        chunk.write(op, self.line)
+
+    def emitOperand(self, operand: int):
+        if operand > MAX_OPERAND:
+            self.error('Too many constants or locals in one function.')
+            operand = 0
+        self.chunk().write(operand, self.line)
+
+    def emitOps(self, op: OpCode, *operands, token=None):
+        self.emitOp(op, token)
+        for operand in operands:
+            self.emitOperand(operand)
+
+    def makeConstant(self, value) -> int:
+        return self.chunk().addConstant(value)
+
+    def emitConstant(self, value):
+        self.emitOps(OpCode.CONSTANT, self.makeConstant(value))
+
+    def emitJump(self, op: OpCode) -> int:
+        self.emitOps(op, 0)
+        return self.chunk().count() - 1
+
+    def patchJump(self, offset: int):
+        target = self.chunk().count()
+        if target > MAX_OPERAND:
+            self.error('Too much code to jump over.')
+        self.chunk().code[offset] = target & MAX_OPERAND
+
+    def emitLoop(self, loopStart: int):
+        self.emitOps(OpCode.LOOP, loopStart)
+
+    def emitReturn(self):
+        if self.state.kind == FunctionKind.INITIALIZER:
+            self.emitOps(OpCode.GET_LOCAL, 0)
+        else:
+            self.emitOp(OpCode.NIL)
+        self.emitOp(OpCode.RETURN)
+
+    def error(self, message: str):
+        error(Token(TokenType.EOF, '', None, self.line), f'<Compiler> {message}', self)
+
+    # Scopes and variables
+
+    def beginScope(self):
+        self.state.scopeDepth += 1
+
+    def endScope(self):
+        state = self.state
+        state.scopeDepth -= 1
+        while state.locals and state.locals[-1].depth > state.scopeDepth:
+            if state.locals[-1].isCaptured:
+                self.emitOp(OpCode.CLOSE_UPVALUE)
+            else:
+                self.emitOp(OpCode.POP)
+            state.locals.pop()
+
+    def addLocal(self, name: str):
+        self.state.locals.append(Local(name, self.state.scopeDepth))
+
+    def resolveLocal(self, state: FunctionState, name: str) -> int:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i].name == name:
+                return i
+        return -1
+
+    def addUpvalue(self, state: FunctionState, index: int, isLocal: bool) -> int:
+        upvalue = (1 if isLocal else 0, index)
+        for i, existing in enumerate(state.upvalues):
+            if existing == upvalue:
+                return i
+        state.upvalues.append(upvalue)
+        state.function.upvalueCount = len(state.upvalues)
+        return len(state.upvalues) - 1
+
+    def resolveUpvalue(self, state: FunctionState, name: str) -> int:
+        if state.enclosing is None:
+            return -1
+        local = self.resolveLocal(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].isCaptured = True
+            return self.addUpvalue(state, local, True)
+        upvalue = self.resolveUpvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.addUpvalue(state, upvalue, False)
+        return -1
+
+    def namedVariable(self, name: Token, assign: bool = False):
+        lexeme = name.lexeme
+        slot = self.resolveLocal(self.state, lexeme)
+        if slot != -1:
+            self.emitOps(OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL, slot)
+            return
+        upvalue = self.resolveUpvalue(self.state, lexeme)
+        if upvalue != -1:
+            self.emitOps(OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE, upvalue)
+            return
+        constant = self.makeConstant(lexeme)
+        self.emitOps(OpCode.SET_GLOBAL if assign else OpCode.GET_GLOBAL, constant, token=name)
+
+    def defineVariable(self, name: Token):
+        if self.state.scopeDepth > 0:
+            self.addLocal(name.lexeme)
+            return
+        self.emitOps(OpCode.DEFINE_GLOBAL, self.makeConstant(name.lexeme), token=name)
+
+    # Statements
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.compileExpr(stmt.expression)
+        self.emitOp(OpCode.POP)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.compileExpr(stmt.expression)
+        self.emitOp(OpCode.PRINT)
+
+    def visitVarStmt(self, stmt: Var):
+        self.line = stmt.name.line
+        if stmt.initializer:
+            self.compileExpr(stmt.initializer)
+        else:
+            self.emitOp(OpCode.NIL)
+        self.defineVariable(stmt.name)
+
+    def visitBlockStmt(self, stmt: Block):
+        self.beginScope()
+        for statement in stmt.statements:
+            self.compileStmt(statement)
+        self.endScope()
+
+    def visitIfStmt(self, stmt: If):
+        self.compileExpr(stmt.condition)
+        thenJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+        self.compileStmt(stmt.thenBranch)
+        if stmt.elseBranch:
+            elseJump = self.emitJump(OpCode.JUMP)
+            self.patchJump(thenJump)
+            self.compileStmt(stmt.elseBranch)
+            self.patchJump(elseJump)
+        else:
+            self.patchJump(thenJump)
+
+    def visitWhileStmt(self, stmt: While):
+        loopStart = self.chunk().count()
+        self.compileExpr(stmt.condition)
+        exitJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+        self.compileStmt(stmt.body)
+        self.emitLoop(loopStart)
+        self.patchJump(exitJump)
+
+    def visitReturnStmt(self, stmt: Return):
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self.emitReturn()
+            return
+        if stmt.tail:
+            self.call(stmt.value, True)
+        else:
+            self.compileExpr(stmt.value)
+        self.emitOp(OpCode.RETURN)
+
+    def visitFunctionStmt(self, stmt: Function):
+        if self.state.scopeDepth > 0:
+            # Declare before compiling the body so the function can refer to itself.
+            self.addLocal(stmt.name.lexeme)
+            self.function(stmt, FunctionKind.FUNCTION)
+            return
+        self.function(stmt, FunctionKind.FUNCTION)
+        self.defineVariable(stmt.name)
+
+    def function(self, stmt: Function, kind: FunctionKind):
+        self.line = stmt.name.line
+        state = FunctionState(self.state, ObjFunction(stmt.name.lexeme, len(stmt.params)), kind)
+        self.state = state
+        self.beginScope()
+        for param in stmt.params:
+            self.addLocal(param.lexeme)
+        for statement in stmt.body:
+            self.compileStmt(statement)
+        self.emitReturn()
+        self.state = state.enclosing
+
+        self.emitOps(OpCode.CLOSURE, self.makeConstant(state.function))
+        for isLocal, index in state.upvalues:
+            self.emitOperand(isLocal)
+            self.emitOperand(index)
+
+    def visitClassStmt(self, stmt: Class):
+        name = stmt.name
+        self.line = name.line
+        self.emitOps(OpCode.CLASS, self.makeConstant(name.lexeme))
+        self.defineVariable(name)
+
+        self.classState = ClassState(self.classState, stmt.superclass is not None)
+        if stmt.superclass is not None:
+            self.namedVariable(stmt.superclass.name)
+            self.beginScope()
+            self.addLocal('super')
+            self.namedVariable(name)
+            self.emitOp(OpCode.INHERIT, token=stmt.superclass.name)
+
+        self.namedVariable(name)
+        for method in stmt.methods:
+            kind = FunctionKind.INITIALIZER if method.name.lexeme == 'init' else FunctionKind.METHOD
+            self.function(method, kind)
+            self.emitOps(OpCode.METHOD, self.makeConstant(method.name.lexeme))
+        self.emitOp(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self.endScope()
+        self.classState = self.classState.enclosing
+
+    # Expressions
+
+    def visitLiteralExpr(self, expr: Literal):
+        value = expr.value
+        if value is None:
+            self.emitOp(OpCode.NIL)
+        elif value is True:
+            self.emitOp(OpCode.TRUE)
+        elif value is False:
+            self.emitOp(OpCode.FALSE)
+        else:
+            self.emitConstant(value)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        self.compileExpr(expr.expression)
+
+    def visitUnaryExpr(self, expr: Unary):
+        self.compileExpr(expr.right)
+        if expr.operator.type is TokenType.MINUS:
+            self.emitOp(OpCode.NEGATE, token=expr.operator)
+        elif expr.operator.type is TokenType.BANG:
+            self.emitOp(OpCode.NOT, token=expr.operator)
+
+    BINARY_OPS = {
+        TokenType.PLUS: OpCode.ADD,
+        TokenType.MINUS: OpCode.SUBTRACT,
+        TokenType.STAR: OpCode.MULTIPLY,
+        TokenType.SLASH: OpCode.DIVIDE,
+        TokenType.GREATER: OpCode.GREATER,
+        TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+        TokenType.LESS: OpCode.LESS,
+        TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+        TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+        TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    }
+
+    def visitBinaryExpr(self, expr: Binary):
+        self.compileExpr(expr.left)
+        self.compileExpr(expr.right)
+        self.emitOp(self.BINARY_OPS[expr.operator.type], token=expr.operator)
+
+    def visitLogicalExpr(self, expr: Logical):
+        self.compileExpr(expr.left)
+        if expr.operator.type == TokenType.OR:
+            elseJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+            endJump = self.emitJump(OpCode.JUMP)
+            self.patchJump(elseJump)
+            self.emitOp(OpCode.POP)
+            self.compileExpr(expr.right)
+            self.patchJump(endJump)
+        else:
+            endJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+            self.emitOp(OpCode.POP)
+            self.compileExpr(expr.right)
+            self.patchJump(endJump)
+
+    def visitVariableExpr(self, expr: Variable):
+        self.namedVariable(expr.name)
+
+    def visitAssignExpr(self, expr: Assign):
+        self.compileExpr(expr.value)
+        self.namedVariable(expr.name, assign=True)
+
+    def visitThisExpr(self, expr: This):
+        self.namedVariable(expr.keyword)
+
+    def visitCallExpr(self, expr: Call):
+        self.call(expr, False)
+
+    def call(self, expr: Call, tail: bool):
+        callee = expr.callee
+        if isinstance(callee, Get):
+            self.compileExpr(callee.object)
+            for arg in expr.args:
+                self.compileExpr(arg)
+            self.emitOps(OpCode.TAIL_INVOKE if tail else OpCode.INVOKE, self.makeConstant(callee.name.lexeme), len(expr.args),
+                         token=(callee.name, expr.paren))
+            return
+        if isinstance(callee, Super):
+            self.namedVariable(Token(TokenType.THIS, 'this', None, callee.keyword.line))
+            for arg in expr.args:
+                self.compileExpr(arg)
+            self.namedVariable(callee.keyword)
+            self.emitOps(OpCode.TAIL_SUPER_INVOKE if tail else OpCode.SUPER_INVOKE, self.makeConstant(callee.method.lexeme), len(expr.args),
+                         token=(callee.method, expr.paren))
+            return
+        self.compileExpr(callee)
+        for arg in expr.args:
+            self.compileExpr(arg)
+        self.emitOps(OpCode.TAIL_CALL if tail else OpCode.CALL, len(expr.args), token=expr.paren)
+
+    def visitGetExpr(self, expr: Get):
+        self.compileExpr(expr.object)
+        self.emitOps(OpCode.GET_PROPERTY, self.makeConstant(expr.name.lexeme), token=expr.name)
+
+    def visitSetExpr(self, expr: Set):
+        self.compileExpr(expr.object)
+        self.compileExpr(expr.value)
+        self.emitOps(OpCode.SET_PROPERTY, self.makeConstant(expr.name.lexeme), token=expr.name)
+
+    def visitSuperExpr(self, expr: Super):
+        self.namedVariable(Token(TokenType.THIS, 'this', None, expr.keyword.line))
+        self.namedVariable(expr.keyword)
+        self.emitOps(OpCode.GET_SUPER, self.makeConstant(expr.method.lexeme), token=expr.method)
@@ -0,0 +1,60 @@
+import os
+import pickle
+from zlib import crc32, adler32
+
+# Bump whenever the pickled form changes: the AST classes, Token or what
+# the Resolver annotates. Stale files are then recompiled and overwritten.
+FORMAT_VERSION = 4
+
+class Cache:
+    # Keeps the parsed and resolved form of a script in a .loxc file, much
+    # like CPython's __pycache__. By default the file lives in a
+    # __loxcache__ directory next to the script. Optimized programs get
+    # their own files (<script>.opt-1.loxc), like CPython's .opt-1.pyc.
+    def __init__(self, directory: str = None, optimize: int = 0):
+        self.directory = directory
+        self.optimize = optimize
+
+    def pathFor(self, script: str) -> str:
+        script = os.path.abspath(script)
+        stem = os.path.splitext(os.path.basename(script))[0]
+        if self.optimize:
+            stem = f'{stem}.opt-{self.optimize}'
+        if self.directory is None:
+            return os.path.join(os.path.dirname(script), '__loxcache__', f'{stem}.loxc')
+        # A shared directory can see scripts with the same name from
+        # different places.
+        tag = f'{crc32(script.encode()):08x}'
+        return os.path.join(self.directory, f'{stem}-{tag}.loxc')
+
+    def digest(self, source: str):
+        # Guards against stale files rather than tampering, so two cheap
+        # checksums do; hashlib alone would take longer to import than
+        # loading a small script's cache file.
+        data = source.encode()
+        return len(data), crc32(data), adler32(data)
+
+    def load(self, script: str, source: str):
+        # Returns the resolved statements or None if there is no valid entry.
+        try:
+            with open(self.pathFor(script), 'rb') as f:
+                version, digest, statements = pickle.load(f)
+        except Exception:
+            return None
+        if version != FORMAT_VERSION or digest != self.digest(source):
+            return None
+        return statements
+
+    def store(self, script: str, source: str, statements):
+        path = self.pathFor(script)
+        temp = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp, 'wb') as f:
+                pickle.dump((FORMAT_VERSION, self.digest(source), statements), f,
+                            pickle.HIGHEST_PROTOCOL)
+            # Readers never see a half written file.
+            os.replace(temp, path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            if os.path.exists(temp):
+                os.remove(temp)
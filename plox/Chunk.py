@@ -0,0 +1,145 @@
+from __future__ import annotations
+from array import array
+import math
+from enum import IntEnum
+from .TokenType import Token
+
+class OpCode(IntEnum):
+    CONSTANT = 0
+    NIL = 1
+    TRUE = 2
+    FALSE = 3
+    POP = 4
+    GET_LOCAL = 5
+    SET_LOCAL = 6
+    GET_GLOBAL = 7
+    DEFINE_GLOBAL = 8
+    SET_GLOBAL = 9
+    GET_UPVALUE = 10
+    SET_UPVALUE = 11
+    GET_PROPERTY = 12
+    SET_PROPERTY = 13
+    GET_SUPER = 14
+    EQUAL = 15
+    NOT_EQUAL = 16
+    GREATER = 17
+    GREATER_EQUAL = 18
+    LESS = 19
+    LESS_EQUAL = 20
+    ADD = 21
+    SUBTRACT = 22
+    MULTIPLY = 23
+    DIVIDE = 24
+    NOT = 25
+    NEGATE = 26
+    PRINT = 27
+    JUMP = 28
+    JUMP_IF_FALSE = 29
+    LOOP = 30
+    CALL = 31
+    INVOKE = 32
+    SUPER_INVOKE = 33
+    CLOSURE = 34
+    CLOSE_UPVALUE = 35
+    RETURN = 36
+    CLASS = 37
+    INHERIT = 38
+    METHOD = 39
+    POP_JUMP_IF_FALSE = 40
+    # `return f(...)`: like CALL/INVOKE/SUPER_INVOKE, but the callee's frame
+    # replaces the caller's instead of being pushed on top of it.
+    TAIL_CALL = 41
+    TAIL_INVOKE = 42
+    TAIL_SUPER_INVOKE = 43
+
+# Number of operand words following each opcode. CLOSURE is variable length:
+# one constant index followed by an (isLocal, index) pair per upvalue.
+OPERAND_COUNT = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1,
+    OpCode.SET_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.GET_UPVALUE: 1,
+    OpCode.SET_UPVALUE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_FALSE: 1,
+    OpCode.POP_JUMP_IF_FALSE: 1,
+    OpCode.LOOP: 1,
+    OpCode.CALL: 1,
+    OpCode.INVOKE: 2,
+    OpCode.SUPER_INVOKE: 2,
+    OpCode.TAIL_CALL: 1,
+    OpCode.TAIL_INVOKE: 2,
+    OpCode.TAIL_SUPER_INVOKE: 2,
+    OpCode.CLASS: 1,
+    OpCode.METHOD: 1,
+}
+
+# Instructions and operands share one stream of unsigned 32 bit words, so
+# jump targets and constant indexes fit scripts of any practical size.
+MAX_OPERAND = 0xFFFFFFFF
+
+class Chunk:
+    def __init__(self):
+        self.code = array('I')
+        self.lines = array('I')
+        self.constants: list[object] = list()
+        self.constantIndex: dict = dict()
+        # Offset of an instruction that can fail at run time -> the token
+        # its error is reported against.
+        self.tokens: dict[int, Token] = dict()
+
+    def write(self, word: int, line: int):
+        self.code.append(word)
+        self.lines.append(line)
+
+    def count(self) -> int:
+        return len(self.code)
+
+    def addConstant(self, value: object) -> int:
+        key = (type(value), value)
+        if type(value) is float:
+            # 0.0 == -0.0, but they print differently.
+            key = (float, value, math.copysign(1.0, value))
+        index = self.constantIndex.get(key)
+        if index is None:
+            index = len(self.constants)
+            self.constants.append(value)
+            self.constantIndex[key] = index
+        return index
+
+    def disassemble(self, name: str) -> str:
+        lines = [f'== {name} ==']
+        offset = 0
+        while offset < len(self.code):
+            offset = self.disassembleInstruction(offset, lines)
+        return '\n'.join(lines)
+
+    def disassembleInstruction(self, offset: int, out: list) -> int:
+        op = OpCode(self.code[offset])
+        line = self.lines[offset]
+        sameLine = offset > 0 and self.lines[offset - 1] == line
+        prefix = f'{offset:04d} {"   |" if sameLine else f"{line:4d}"} {op.name:<16}'
+        if op is OpCode.CLOSURE:
+            function = self.constants[self.code[offset + 1]]
+            out.append(f'{prefix} {self.code[offset + 1]:4d} {function!r}')
+            offset += 2
+            for _ in range(function.upvalueCount):
+                isLocal, index = self.code[offset], self.code[offset + 1]
+                out.append(f'{offset:04d}    |   {"local" if isLocal else "upvalue"} {index}')
+                offset += 2
+            return offset
+        count = OPERAND_COUNT.get(op, 0)
+        operands = list(self.code[offset + 1:offset + 1 + count])
+        if op in (OpCode.CONSTANT, OpCode.GET_GLOBAL, OpCode.DEFINE_GLOBAL, OpCode.SET_GLOBAL,
+                  OpCode.GET_PROPERTY, OpCode.SET_PROPERTY, OpCode.GET_SUPER, OpCode.CLASS,
+                  OpCode.METHOD, OpCode.INVOKE, OpCode.SUPER_INVOKE, OpCode.TAIL_INVOKE,
+                  OpCode.TAIL_SUPER_INVOKE):
+            operands.append(repr(self.constants[operands[0]]))
+        out.append(f'{prefix} ' + ' '.join(str(o) for o in operands))
+        return offset + 1 + count
@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import socket
+
+# Client for the plox server (Server.py). It only needs the standard
+# library, so starting it is much cheaper than starting plox itself.
+#
+# The protocol is one JSON object per line. The client sends a single
+# request, {"args": [plox options and script], "cwd": "..."} or
+# {"args": [...], "cwd": "...", "source": "..."} to run source instead of a
+# file, then reads {"stdout": text}, {"stderr": text} messages as the
+# script runs and a final {"exit": status}.
+
+def defaultSocket() -> str:
+    return f'/tmp/plox-{os.getuid()}.sock'
+
+def request(path: str, message: dict, stdout=None, stderr=None) -> int:
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(json.dumps(message).encode() + b'\n')
+        for line in connection.makefile('r', encoding='utf-8'):
+            reply = json.loads(line)
+            if 'stdout' in reply:
+                stdout.write(reply['stdout'])
+                stdout.flush()
+            elif 'stderr' in reply:
+                stderr.write(reply['stderr'])
+                stderr.flush()
+            elif 'exit' in reply:
+                return reply['exit']
+    print('plox server closed the connection', file=stderr)
+    return 1
+
+def main():
+    # ploxc.py [--socket PATH] <plox options> script: options are those of
+    # plox.py and are parsed by the server. A script of `-` is read from
+    # stdin and sent along.
+    args = sys.argv[1:]
+    path = defaultSocket()
+    if args[:1] == ['--socket'] and len(args) > 1:
+        path, args = args[1], args[2:]
+    message = {'args': [arg for arg in args if arg != '-'], 'cwd': os.getcwd()}
+    if '-' in args:
+        message['source'] = sys.stdin.read()
+    try:
+        sys.exit(request(path, message))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f'no plox server is listening on {path}; start one with ./plox.py --serve', file=sys.stderr)
+        sys.exit(1)
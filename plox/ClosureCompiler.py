@@ -0,0 +1,592 @@
+from __future__ import annotations
+from .Expr import *
+from .Stmt import *
+from .TokenType import TokenType
+from .Environment import Environment
+from .LoxCallable import LoxCallable
+from .NativeFunctions import NativeError
+from .LoxFunction import LoxFunction, trampoline
+from .LoxClass import LoxClass
+from .LoxInstance import LoxInstance
+from .Interpreter import isEqual
+from .Rope import STRING_TYPES, concat
+from .InlineCache import MISSING
+
+# Compiles a resolved AST into nested Python closures. Every node is visited
+# once; the closures it produces take the current Environment and either
+# return a value (expressions) or a completion (statements): None to carry
+# on, or a one-element tuple holding the value of a `return`.
+
+class ClosureFunction(LoxFunction):
+    __slots__ = ('body',)
+
+    def __init__(self, declaration: Function, closure: Environment, isInitializer: bool, body):
+        super().__init__(declaration, closure, isInitializer)
+        self.body = body
+
+    def call(self, interpreter, args):
+        environment = Environment(self.closure)
+        environment.slots = list(args)
+        completion = self.body(environment)
+        if self.isInitializer:
+            return self.closure.slots[0]
+        if completion is not None:
+            if len(completion) == 3:
+                return trampoline(interpreter, completion)
+            return completion[0]
+
+    def callBound(self, interpreter, instance, args):
+        this = Environment(self.closure)
+        this.slots = [instance]
+        environment = Environment(this)
+        environment.slots = list(args)
+        completion = self.body(environment)
+        if self.isInitializer:
+            return instance
+        if completion is not None:
+            if len(completion) == 3:
+                return trampoline(interpreter, completion)
+            return completion[0]
+
+    def execute(self, interpreter, environment: Environment):
+        return self.body(environment)
+
+    def bind(self, instance: LoxInstance):
+        environment = Environment(self.closure)
+        environment.define("this", instance)
+        return ClosureFunction(self.declaration, environment, self.isInitializer, self.body)
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def compile(self, statements: list[Stmt]):
+        return self.compileStmts(statements)
+
+    def compileStmt(self, stmt: Stmt):
+        return stmt.accept(self)
+
+    def compileExpr(self, expr: Expr):
+        return expr.accept(self)
+
+    def compileStmts(self, statements: list[Stmt]):
+        compiled = tuple(self.compileStmt(stmt) for stmt in statements)
+        if len(compiled) == 0:
+            return lambda env: None
+        if len(compiled) == 1:
+            return compiled[0]
+        if len(compiled) == 2:
+            first, second = compiled
+            def run2(env):
+                completion = first(env)
+                if completion is not None:
+                    return completion
+                return second(env)
+            return run2
+        def run(env):
+            for stmt in compiled:
+                completion = stmt(env)
+                if completion is not None:
+                    return completion
+        return run
+
+    def runtimeError(self, token, message):
+        return self.interpreter.runtimeError(token, message)
+
+    # Statements
+
+    def visitBlockStmt(self, stmt: Block):
+        body = self.compileStmts(stmt.statements)
+        def block(env):
+            return body(Environment(env))
+        return block
+
+    def visitExpressionStmt(self, stmt: Expression):
+        expression = self.compileExpr(stmt.expression)
+        def expressionStmt(env):
+            expression(env)
+        return expressionStmt
+
+    def visitPrintStmt(self, stmt: Print):
+        expression = self.compileExpr(stmt.expression)
+        def printStmt(env):
+            print(expression(env))
+        return printStmt
+
+    def visitVarStmt(self, stmt: Var):
+        name = stmt.name.lexeme
+        if stmt.initializer:
+            initializer = self.compileExpr(stmt.initializer)
+            def varStmt(env):
+                env.define(name, initializer(env))
+        else:
+            def varStmt(env):
+                env.define(name, None)
+        return varStmt
+
+    def visitIfStmt(self, stmt: If):
+        condition = self.compileExpr(stmt.condition)
+        thenBranch = self.compileStmt(stmt.thenBranch)
+        if stmt.elseBranch:
+            elseBranch = self.compileStmt(stmt.elseBranch)
+            def ifElseStmt(env):
+                value = condition(env)
+                if value is None or value is False:
+                    return elseBranch(env)
+                return thenBranch(env)
+            return ifElseStmt
+        def ifStmt(env):
+            value = condition(env)
+            if value is None or value is False:
+                return None
+            return thenBranch(env)
+        return ifStmt
+
+    def visitWhileStmt(self, stmt: While):
+        condition = self.compileExpr(stmt.condition)
+        body = self.compileStmt(stmt.body)
+        def whileStmt(env):
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return None
+                completion = body(env)
+                if completion is not None:
+                    return completion
+        return whileStmt
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.tail:
+            return self.tailCall(stmt.value)
+        if stmt.value:
+            value = self.compileExpr(stmt.value)
+            def returnStmt(env):
+                return (value(env),)
+        else:
+            def returnStmt(env):
+                return (None,)
+        return returnStmt
+
+    def visitFunctionStmt(self, stmt: Function):
+        name = stmt.name.lexeme
+        body = self.compileStmts(stmt.body)
+        memo = self.interpreter.memo
+        if memo is not None and stmt in memo.functions:
+            def memoizedFunctionStmt(env):
+                env.define(name, memo.wrap(ClosureFunction(stmt, env, False, body)))
+            return memoizedFunctionStmt
+        def functionStmt(env):
+            env.define(name, ClosureFunction(stmt, env, False, body))
+        return functionStmt
+
+    def visitClassStmt(self, stmt: Class):
+        name = stmt.name.lexeme
+        line = stmt.name.line
+        superclassExpr = self.compileExpr(stmt.superclass) if stmt.superclass is not None else None
+        methods = [
+            (method, method.name.lexeme, self.compileStmts(method.body))
+            for method in stmt.methods]
+        def classStmt(env):
+            superclass = None
+            if superclassExpr is not None:
+                superclass = superclassExpr(env)
+                if not isinstance(superclass, LoxClass):
+                    raise self.runtimeError(stmt.superclass.name, "Superclass must be a class")
+            methodEnv = env
+            if superclassExpr is not None:
+                methodEnv = Environment(env)
+                methodEnv.define("super", superclass)
+            functions = dict()
+            for method, methodName, body in methods:
+                functions[methodName] = ClosureFunction(
+                    method, methodEnv, methodName == 'init', body)
+            env.define(name, LoxClass(name, superclass, functions, line))
+        return classStmt
+
+    # Expressions
+
+    def visitLiteralExpr(self, expr: Literal):
+        value = expr.value
+        return lambda env: value
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.compileExpr(expr.expression)
+
+    def variableAccess(self, expr: Expr, name: Token):
+        distance, slot = expr.depth, expr.slot
+        if distance is None:
+            globals = self.interpreter.globals
+            return lambda env: globals.get(name)
+        if distance == 0:
+            return lambda env: env.slots[slot]
+        if distance == 1:
+            return lambda env: env.enclosing.slots[slot]
+        if distance == 2:
+            return lambda env: env.enclosing.enclosing.slots[slot]
+        return lambda env: env.ancestor(distance).slots[slot]
+
+    def visitVariableExpr(self, expr: Variable):
+        return self.variableAccess(expr, expr.name)
+
+    def visitThisExpr(self, expr: This):
+        return self.variableAccess(expr, expr.keyword)
+
+    def visitAssignExpr(self, expr: Assign):
+        value = self.compileExpr(expr.value)
+        distance, slot = expr.depth, expr.slot
+        name = expr.name
+        if distance is None:
+            globals = self.interpreter.globals
+            def assignGlobal(env):
+                result = value(env)
+                globals.assign(name, result)
+                return result
+            return assignGlobal
+        def assign(env):
+            result = value(env)
+            env.ancestor(distance).slots[slot] = result
+            return result
+        return assign
+
+    def visitLogicalExpr(self, expr: Logical):
+        left = self.compileExpr(expr.left)
+        right = self.compileExpr(expr.right)
+        if expr.operator.type == TokenType.OR:
+            def logicalOr(env):
+                value = left(env)
+                if value is None or value is False:
+                    return right(env)
+                return value
+            return logicalOr
+        def logicalAnd(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+        return logicalAnd
+
+    def visitUnaryExpr(self, expr: Unary):
+        right = self.compileExpr(expr.right)
+        operator = expr.operator
+        if operator.type is TokenType.MINUS:
+            def negate(env):
+                value = right(env)
+                if not isinstance(value, float):
+                    raise self.runtimeError(operator, 'Operand must be a number')
+                return value * -1.0
+            return negate
+        if operator.type is TokenType.BANG:
+            def bang(env):
+                value = right(env)
+                return value is None or value is False
+            return bang
+        return right
+
+    def visitBinaryExpr(self, expr: Binary):
+        left = self.compileExpr(expr.left)
+        right = self.compileExpr(expr.right)
+        operator = expr.operator
+        opType = operator.type
+        runtimeError = self.runtimeError
+
+        if opType is TokenType.PLUS:
+            def add(env):
+                l = left(env)
+                r = right(env)
+                if isinstance(l, float) and isinstance(r, float):
+                    return l + r
+                if isinstance(l, STRING_TYPES) and isinstance(r, STRING_TYPES):
+                    return concat(l, r)
+                raise runtimeError(operator, "Operands must be two strings or two numbers")
+            return add
+        if opType is TokenType.SLASH:
+            def divide(env):
+                l = left(env)
+                r = right(env)
+                if not (isinstance(l, float) and isinstance(r, float)):
+                    raise runtimeError(operator, 'Operand must be a number')
+                if r == 0:
+                    raise runtimeError(operator, "Divide by zero is not allowed")
+                return l / r
+            return divide
+        if opType is TokenType.EQUAL_EQUAL:
+            return lambda env: isEqual(left(env), right(env))
+        if opType is TokenType.BANG_EQUAL:
+            return lambda env: not isEqual(left(env), right(env))
+
+        operation = {
+            TokenType.GREATER: float.__gt__,
+            TokenType.GREATER_EQUAL: float.__ge__,
+            TokenType.LESS: float.__lt__,
+            TokenType.LESS_EQUAL: float.__le__,
+            TokenType.MINUS: float.__sub__,
+            TokenType.STAR: float.__mul__,
+        }[opType]
+        def numeric(env):
+            l = left(env)
+            r = right(env)
+            if isinstance(l, float) and isinstance(r, float):
+                return operation(l, r)
+            raise runtimeError(operator, 'Operand must be a number')
+        return numeric
+
+    def visitCallExpr(self, expr: Call):
+        if type(expr.callee) is Get:
+            return self.methodCall(expr)
+        if type(expr.callee) is Super:
+            return self.superCall(expr)
+        callee = self.compileExpr(expr.callee)
+        args = tuple(self.compileExpr(arg) for arg in expr.args)
+        paren = expr.paren
+        interpreter = self.interpreter
+        argCount = len(args)
+
+        def checkCallee(function, paren):
+            if not isinstance(function, LoxCallable):
+                raise self.runtimeError(paren, "Can only call functions and classes")
+            if argCount != function.arity():
+                raise self.runtimeError(
+                    paren,
+                    f'Expected {function.arity()} arguments got {argCount}.')
+
+        if argCount == 0:
+            def call0(env):
+                function = callee(env)
+                checkCallee(function, paren)
+                try:
+                    return function.call(interpreter, [])
+                except NativeError as e:
+                    raise self.runtimeError(paren, e.message)
+                except RecursionError as e:
+                    if not hasattr(e, 'paren'):
+                        e.paren = paren
+                    raise
+            return call0
+        if argCount == 1:
+            arg0, = args
+            def call1(env):
+                function = callee(env)
+                values = [arg0(env)]
+                checkCallee(function, paren)
+                try:
+                    return function.call(interpreter, values)
+                except NativeError as e:
+                    raise self.runtimeError(paren, e.message)
+                except RecursionError as e:
+                    if not hasattr(e, 'paren'):
+                        e.paren = paren
+                    raise
+            return call1
+        def call(env):
+            function = callee(env)
+            values = [arg(env) for arg in args]
+            checkCallee(function, paren)
+            try:
+                return function.call(interpreter, values)
+            except NativeError as e:
+                raise self.runtimeError(paren, e.message)
+            except RecursionError as e:
+                if not hasattr(e, 'paren'):
+                    e.paren = paren
+                raise
+        return call
+
+    def tailCall(self, expr: Call):
+        # `return f(...)`: a Lox function is not called here but handed back
+        # as a (function, this, args) completion, which the trampoline of the
+        # function being returned from runs in its own Python frame.
+        calleeExpr = expr.callee
+        if type(calleeExpr) is Get:
+            lookup = self.methodLookup(calleeExpr)
+        elif type(calleeExpr) is Super:
+            lookup = self.superLookup(calleeExpr)
+        else:
+            callee = self.compileExpr(calleeExpr)
+            lookup = lambda env: (callee(env), None)
+        args = tuple(self.compileExpr(arg) for arg in expr.args)
+        paren = expr.paren
+        interpreter = self.interpreter
+        argCount = len(args)
+        def tailCall(env):
+            function, instance = lookup(env)
+            values = [arg(env) for arg in args]
+            if not isinstance(function, LoxCallable):
+                raise self.runtimeError(paren, "Can only call functions and classes")
+            if argCount != function.arity():
+                raise self.runtimeError(
+                    paren, f'Expected {function.arity()} arguments got {argCount}.')
+            if type(function) is not ClosureFunction:
+                try:
+                    return (function.call(interpreter, values),)
+                except NativeError as e:
+                    raise self.runtimeError(paren, e.message)
+            return (function, instance, values)
+        return tailCall
+
+    def methodLookup(self, expr: Get):
+        # Returns a function giving the (method, instance) pair of obj.name,
+        # or (field value, None) when it is a field.
+        object = self.compileExpr(expr.object)
+        name = expr.name
+        cache = self.interpreter.inlineCache(name)
+        entries = cache.entries
+        def methodLookup(env):
+            instance = object(env)
+            if not isinstance(instance, LoxInstance):
+                raise self.runtimeError(name, "Only instances have properties.")
+            entry = entries.get(instance.shape, MISSING)
+            if entry is MISSING:
+                entry = cache.missGet(instance)
+            else:
+                cache.hits += 1
+            if type(entry) is int:
+                return instance.values[entry], None
+            if entry is None:
+                raise instance.runtimeError(name, f'Undefined property {name.lexeme}')
+            return entry, instance
+        return methodLookup
+
+    def methodCall(self, expr: Call):
+        # obj.name(args): the method comes from the inline cache and is
+        # called with `this` bound directly. Fields go through the generic
+        # property access.
+        object = self.compileExpr(expr.callee.object)
+        name = expr.callee.name
+        args = tuple(self.compileExpr(arg) for arg in expr.args)
+        paren = expr.paren
+        interpreter = self.interpreter
+        argCount = len(args)
+        cache = interpreter.inlineCache(name)
+        entries = cache.entries
+
+        def methodCall(env):
+            instance = object(env)
+            if not isinstance(instance, LoxInstance):
+                raise self.runtimeError(name, "Only instances have properties.")
+            entry = entries.get(instance.shape, MISSING)
+            if entry is MISSING:
+                entry = cache.missGet(instance)
+            else:
+                cache.hits += 1
+            if type(entry) is int:
+                function = instance.values[entry]
+            elif entry is None:
+                raise instance.runtimeError(name, f'Undefined property {name.lexeme}')
+            else:
+                values = [arg(env) for arg in args]
+                if argCount != entry.arity():
+                    raise self.runtimeError(
+                        paren, f'Expected {entry.arity()} arguments got {argCount}.')
+                try:
+                    return entry.callBound(interpreter, instance, values)
+                except RecursionError as e:
+                    if not hasattr(e, 'paren'):
+                        e.paren = paren
+                    raise
+            values = [arg(env) for arg in args]
+            if not isinstance(function, LoxCallable):
+                raise self.runtimeError(paren, "Can only call functions and classes")
+            if argCount != function.arity():
+                raise self.runtimeError(
+                    paren, f'Expected {function.arity()} arguments got {argCount}.')
+            try:
+                return function.call(interpreter, values)
+            except NativeError as e:
+                raise self.runtimeError(paren, e.message)
+            except RecursionError as e:
+                if not hasattr(e, 'paren'):
+                    e.paren = paren
+                raise
+        return methodCall
+
+    def superCall(self, expr: Call):
+        superMethod = self.superLookup(expr.callee)
+        args = tuple(self.compileExpr(arg) for arg in expr.args)
+        paren = expr.paren
+        interpreter = self.interpreter
+        argCount = len(args)
+        def superCall(env):
+            method, instance = superMethod(env)
+            values = [arg(env) for arg in args]
+            if argCount != method.arity():
+                raise self.runtimeError(
+                    paren, f'Expected {method.arity()} arguments got {argCount}.')
+            try:
+                return method.callBound(interpreter, instance, values)
+            except RecursionError as e:
+                if not hasattr(e, 'paren'):
+                    e.paren = paren
+                raise
+        return superCall
+
+    def visitGetExpr(self, expr: Get):
+        object = self.compileExpr(expr.object)
+        name = expr.name
+        cache = self.interpreter.inlineCache(name)
+        entries = cache.entries
+        def get(env):
+            instance = object(env)
+            if not isinstance(instance, LoxInstance):
+                raise self.runtimeError(name, "Only instances have properties.")
+            entry = entries.get(instance.shape, MISSING)
+            if entry is MISSING:
+                entry = cache.missGet(instance)
+            else:
+                cache.hits += 1
+            if type(entry) is int:
+                return instance.values[entry]
+            if entry is None:
+                raise instance.runtimeError(name, f'Undefined property {name.lexeme}')
+            return entry.bind(instance)
+        return get
+
+    def visitSetExpr(self, expr: Set):
+        object = self.compileExpr(expr.object)
+        value = self.compileExpr(expr.value)
+        name = expr.name
+        cache = self.interpreter.inlineCache(name)
+        entries = cache.entries
+        def set(env):
+            instance = object(env)
+            if not isinstance(instance, LoxInstance):
+                raise self.runtimeError(name, "Only instances have fields")
+            result = value(env)
+            entry = entries.get(instance.shape, MISSING)
+            if entry is MISSING:
+                entry = cache.missSet(instance)
+            else:
+                cache.hits += 1
+            if type(entry) is int:
+                instance.values[entry] = result
+            else:
+                instance.values.append(result)
+                instance.shape = entry
+            return result
+        return set
+
+    def superLookup(self, expr: Super):
+        # Returns a function giving the (method, instance) pair of a super
+        # access.
+        distance, slot = expr.depth, expr.slot
+        method = expr.method
+        cache = self.interpreter.inlineCache(method)
+        entries = cache.entries
+        def superLookup(env):
+            superclass = env.getAt(distance, slot)
+            instance = env.getAt(distance - 1, 0)
+            function = entries.get(superclass, MISSING)
+            if function is MISSING:
+                function = cache.miss(superclass)
+            else:
+                cache.hits += 1
+            if function is None:
+                raise self.runtimeError(method, f'Undefined property {method.lexeme}')
+            return function, instance
+        return superLookup
+
+    def visitSuperExpr(self, expr: Super):
+        superLookup = self.superLookup(expr)
+        def superExpr(env):
+            function, instance = superLookup(env)
+            return function.bind(instance)
+        return superExpr
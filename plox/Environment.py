@@ -1,17 +1,31 @@
-from typing import Any
+from __future__ import annotations
 from .TokenType import Token
 from .RuntimeError import RuntimeError
 
 class Environment:
+    # The global environment keeps its variables in a dict, since globals
+    # are looked up by name at runtime. Local environments keep theirs in
+    # `slots`, in declaration order, which matches the (depth, slot) pairs
+    # the Resolver assigns to every local variable reference.
+    __slots__ = ('enclosing', 'slots', 'values')
+
     def __init__(self, enclosing=None):
-        self.values: dict[str, Any] = dict()
         self.enclosing: Environment = enclosing
+        self.slots: list = []
+        self.values: dict[str, object] = dict() if enclosing is None else None
 
-    def define(self, name: str, value: Any):
-        self.values[name] = value
+    def define(self, name: str, value: object):
+        if self.values is None:
+            self.slots.append(value)
+        else:
+            self.values[name] = value
 
-    def getAt(self, distance: int, name: str):
-        return self.ancestor(distance).values.get(name)
+    def getAt(self, distance: int, slot: int):
+        environment = self
+        while distance:
+            environment = environment.enclosing
+            distance -= 1
+        return environment.slots[slot]
 
     def ancestor(self, distance: int):
         environment = self
@@ -20,23 +34,18 @@ class Environment:
         return environment
 
     def get(self, name: Token):
-        if self.values.get(name.lexeme) is not None:
+        if name.lexeme in self.values:
             return self.values[name.lexeme]
-        if self.enclosing:
-            return self.enclosing.get(name)
         raise self.runtimeError(name, f'Undefined variable {name.lexeme}.')
 
-    def assignAt(self, distance: int, name: Token, value: Any):
-        self.ancestor(distance).values[name.lexeme] = value
+    def assignAt(self, distance: int, slot: int, value: object):
+        self.ancestor(distance).slots[slot] = value
 
-    def assign(self, name: Token, value: Any):
-        if self.values.get(name.lexeme) is not None:
+    def assign(self, name: Token, value: object):
+        if name.lexeme in self.values:
             self.values[name.lexeme] = value
             return
-        if self.enclosing:
-            self.enclosing.assign(name, value)
-            return
         raise self.runtimeError(name, f"Undefined variable '{name.lexeme}'.")
 
     def runtimeError(self, name, message):
-        return RuntimeError(name, message, 'Environment Search')
\ No newline at end of file
+        return RuntimeError(name, message, 'Environment Search')
@@ -1,6 +1,7 @@
-from typing import *
+from __future__ import annotations
 from .TokenType import Token
 class Expr:
+	__slots__ = ()
 	def init(self): pass
 	def accept(self,visitor): pass
 class ExprVisitor:
@@ -18,86 +19,133 @@ class ExprVisitor:
 	def visitAssignExpr(self,expr:Expr): pass
 
 class Binary(Expr):
+	__slots__ = ('left', 'operator', 'right',)
 	def __init__(self,left:Expr, operator:Token, right:Expr):
 		self.left = left
 		self. operator =  operator
 		self. right =  right
+	def __reduce__(self):
+		return (Binary, (self.left, self.operator, self.right, ))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitBinaryExpr(self)
 
 class Call(Expr):
-	def __init__(self,callee:Expr, paren:Token, args:List[Expr]):
+	__slots__ = ('callee', 'paren', 'args',)
+	def __init__(self,callee:Expr, paren:Token, args:list[Expr]):
 		self.callee = callee
 		self. paren =  paren
 		self. args =  args
+	def __reduce__(self):
+		return (Call, (self.callee, self.paren, self.args, ))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitCallExpr(self)
 
 class Get(Expr):
+	__slots__ = ('object', 'name', 'cache',)
 	def __init__(self,object:Expr, name:Token):
 		self.object = object
 		self. name =  name
+		self.cache = None
+	def __reduce__(self):
+		return (Get, (self.object, self.name, ), (None, {'cache': self.cache}))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitGetExpr(self)
 
 class Grouping(Expr):
+	__slots__ = ('expression',)
 	def __init__(self,expression:Expr):
 		self.expression = expression
+	def __reduce__(self):
+		return (Grouping, (self.expression, ))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitGroupingExpr(self)
 
 class Literal(Expr):
-	def __init__(self,value:Any):
+	__slots__ = ('value',)
+	def __init__(self,value:object):
 		self.value = value
+	def __reduce__(self):
+		return (Literal, (self.value, ))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitLiteralExpr(self)
 
 class Logical(Expr):
+	__slots__ = ('left', 'operator', 'right',)
 	def __init__(self,left:Expr, operator:Token, right: Expr):
 		self.left = left
 		self. operator =  operator
 		self. right =  right
+	def __reduce__(self):
+		return (Logical, (self.left, self.operator, self.right, ))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitLogicalExpr(self)
 
 class Set(Expr):
+	__slots__ = ('object', 'name', 'value', 'cache',)
 	def __init__(self,object:Expr, name:Token, value:Expr):
 		self.object = object
 		self. name =  name
 		self. value =  value
+		self.cache = None
+	def __reduce__(self):
+		return (Set, (self.object, self.name, self.value, ), (None, {'cache': self.cache}))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitSetExpr(self)
 
 class Super(Expr):
+	__slots__ = ('keyword', 'method', 'depth', 'slot', 'cache',)
 	def __init__(self,keyword:Token, method:Token):
 		self.keyword = keyword
 		self. method =  method
+		self.depth = None
+		self.slot = None
+		self.cache = None
+	def __reduce__(self):
+		return (Super, (self.keyword, self.method, ), (None, {'depth': self.depth, 'slot': self.slot, 'cache': self.cache}))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitSuperExpr(self)
 
 class This(Expr):
+	__slots__ = ('keyword', 'depth', 'slot',)
 	def __init__(self,keyword:Token):
 		self.keyword = keyword
+		self.depth = None
+		self.slot = None
+	def __reduce__(self):
+		return (This, (self.keyword, ), (None, {'depth': self.depth, 'slot': self.slot}))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitThisExpr(self)
 
 class Unary(Expr):
+	__slots__ = ('operator', 'right',)
 	def __init__(self,operator:Token, right:Expr):
 		self.operator = operator
 		self. right =  right
+	def __reduce__(self):
+		return (Unary, (self.operator, self.right, ))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitUnaryExpr(self)
 
 class Variable(Expr):
+	__slots__ = ('name', 'depth', 'slot',)
 	def __init__(self,name:Token):
 		self.name = name
+		self.depth = None
+		self.slot = None
+	def __reduce__(self):
+		return (Variable, (self.name, ), (None, {'depth': self.depth, 'slot': self.slot}))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitVariableExpr(self)
 
 class Assign(Expr):
+	__slots__ = ('name', 'value', 'depth', 'slot',)
 	def __init__(self,name: Token, value: Expr):
 		self.name = name
 		self. value =  value
+		self.depth = None
+		self.slot = None
+	def __reduce__(self):
+		return (Assign, (self.name, self.value, ), (None, {'depth': self.depth, 'slot': self.slot}))
 	def accept(self, visitor:ExprVisitor):
 		return visitor.visitAssignExpr(self)
 
@@ -11,29 +11,29 @@ class GenerateAst:
             "Expr",
            [
                "Binary   ; left:Expr, operator:Token, right:Expr",
-               "Call     ; callee:Expr, paren:Token, args:List[Expr]",
-               "Get      ; object:Expr, name:Token",
+               "Call     ; callee:Expr, paren:Token, args:list[Expr]",
+               "Get      ; object:Expr, name:Token ; cache",
                "Grouping ; expression:Expr",
-               "Literal  ; value:Any",
+               "Literal  ; value:object",
                "Logical  ; left:Expr, operator:Token, right: Expr",
-               "Set      ; object:Expr, name:Token, value:Expr",
-               "Super    ; keyword:Token, method:Token",
-               "This     ; keyword:Token",
+               "Set      ; object:Expr, name:Token, value:Expr ; cache",
+               "Super    ; keyword:Token, method:Token ; depth, slot, cache",
+               "This     ; keyword:Token ; depth, slot",
                "Unary    ; operator:Token, right:Expr",
-               "Variable ; name:Token",
-               "Assign   ; name: Token, value: Expr"
+               "Variable ; name:Token ; depth, slot",
+               "Assign   ; name: Token, value: Expr ; depth, slot"
            ])
 
         self.defineAst(
             "Stmt",
             [
-                "Block      ; statements:List[Stmt]",
-                "Class      ; name:Token, superclass:Variable, methods:List",
+                "Block      ; statements:list[Stmt]",
+                "Class      ; name:Token, superclass:Variable, methods:list",
                 "Expression ; expression:Expr",
                 "If         ; condition:Expr, thenBranch:Stmt, elseBranch:Stmt",
-                "Function   ; name:Token, params:List[Token], body:List[Stmt]",
+                "Function   ; name:Token, params:list[Token], body:list[Stmt]",
                 "Print      ; expression:Expr",
-                "Return     ; keyword:Token, value:Expr",
+                "Return     ; keyword:Token, value:Expr ; tail",
                 "Var        ; name:Token, initializer:Expr",
                 "While      ; condition:Expr, body:Stmt"
             ],
@@ -47,26 +47,41 @@ class GenerateAst:
     def defineAst(self, baseName: str, types: list, imports=list()):
         path = f'{self.outputDir}/{baseName}.py'
         fileWriter = open(path, 'w')
-        fileWriter.write('from typing import *\n')
+        # Annotations are never evaluated, which keeps typing out of startup.
+        fileWriter.write('from __future__ import annotations\n')
         fileWriter.write('from .TokenType import Token\n')
         for i in imports:
             fileWriter.write(f'from {i} import *\n')
-        fileWriter.write(f'class {baseName}:\n\tdef init(self): pass\n')
+        fileWriter.write(f'class {baseName}:\n\t__slots__ = ()\n\tdef init(self): pass\n')
         fileWriter.write(f'\tdef accept(self,visitor): pass\n')
         self.defineVisitor(fileWriter, baseName, types)
         for type in types:
-            className, fields = [
+            className, fields, *annotations = [
                 x.strip() for x in type.split(';')]
-            self.defineType(fileWriter, baseName, className, fields)
+            self.defineType(fileWriter, baseName, className, fields, annotations)
         fileWriter.write('\n')
         fileWriter.close()
 
-    def defineType(self, fileWriter, baseName, className, fields):
+    def defineType(self, fileWriter, baseName, className, fields, annotations):
+        # Annotations are filled in after parsing (e.g. by the Resolver)
+        # and start out as None.
+        extra = [x.strip() for x in annotations[0].split(',')] if annotations else []
         fileWriter.write(f'class {className}({baseName}):\n\t')
+        names = [field.split(':')[0].strip() for field in fields.split(',')]
+        fileWriter.write(f'__slots__ = ({", ".join(map(repr, names + extra))},)\n\t')
         fileWriter.write(f'def __init__(self,{fields}):\n');
         for field in fields.split(','):
             name = field.split(':')[0]
             fileWriter.write(f'\t\tself.{name} = {name}\n')
+        for name in extra:
+            fileWriter.write(f'\t\tself.{name} = None\n')
+        # Pickled as a plain constructor call (see Cache.py), which is far
+        # smaller and faster than the default state dict of a slots class.
+        fileWriter.write(f'\tdef __reduce__(self):\n')
+        state = ''
+        if extra:
+            state = f', (None, {{{", ".join(f"{name!r}: self.{name}" for name in extra)}}})'
+        fileWriter.write(f'\t\treturn ({className}, ({"".join(f"self.{name}, " for name in names)}){state})\n')
         fileWriter.write(f'\tdef accept(self, visitor:{baseName}Visitor):\n')
         fileWriter.write(f'\t\treturn visitor.visit{className}{baseName}(self)\n')
         fileWriter.write('\n')
@@ -0,0 +1,69 @@
+import sys
+
+# Property lookups are cached per access site. Get and Set sites are keyed
+# by the instance's shape, which also identifies its class (every class has
+# its own root shape); super accesses are keyed by the superclass. Neither
+# shapes nor classes change once created, so entries never go stale, and
+# since an entry holds on to its key, that identity can't be reused while
+# cached.
+
+POLYMORPHIC_LIMIT = 4
+MISSING = object()
+
+class InlineCache:
+    __slots__ = ('token', 'entries', 'hits', 'misses', 'megamorphic')
+
+    def __init__(self, token):
+        self.token = token
+        # Get:   shape -> field offset (int), or the method (None if absent)
+        # Set:   shape -> field offset (int), or the shape after adding it
+        # Super: class -> method (None if absent)
+        self.entries: dict = dict()
+        self.hits = 0
+        self.misses = 0
+        self.megamorphic = False
+
+    def miss(self, klass):
+        self.misses += 1
+        return self.remember(klass, klass.findMethod(self.token.lexeme))
+
+    def missGet(self, instance):
+        self.misses += 1
+        name = self.token.lexeme
+        entry = instance.shape.offsets.get(name)
+        if entry is None:
+            entry = instance.klass.findMethod(name)
+        return self.remember(instance.shape, entry)
+
+    def missSet(self, instance):
+        self.misses += 1
+        name = self.token.lexeme
+        entry = instance.shape.offsets.get(name)
+        if entry is None:
+            entry = instance.shape.withField(name)
+        return self.remember(instance.shape, entry)
+
+    def remember(self, key, entry):
+        if len(self.entries) < POLYMORPHIC_LIMIT:
+            self.entries[key] = entry
+        else:
+            self.megamorphic = True
+        return entry
+
+    def state(self) -> str:
+        if self.megamorphic:
+            return 'megamorphic'
+        if len(self.entries) > 1:
+            return 'polymorphic'
+        return 'monomorphic'
+
+def printStats(caches, file=sys.stderr, top: int = 10):
+    hits = sum(cache.hits for cache in caches)
+    misses = sum(cache.misses for cache in caches)
+    total = hits + misses
+    rate = 100.0 * hits / total if total else 0.0
+    print(f'inline caches: {len(caches)} sites, {hits} hits, {misses} misses ({rate:.1f}% hit rate)', file=file)
+    busiest = sorted(caches, key=lambda cache: cache.hits + cache.misses, reverse=True)[:top]
+    for cache in busiest:
+        print(f'  [Line {cache.token.line}] {cache.token.lexeme:16} {cache.state():12} '
+              f'{cache.hits} hits, {cache.misses} misses', file=file)
@@ -1,5 +1,5 @@
-from os import environ
-from plox.LoxInstance import LoxInstance
+from __future__ import annotations
+from .LoxInstance import LoxInstance
 from .LoxFunction import LoxFunction
 from .LoxCallable import LoxCallable
 from .Expr import *
@@ -8,41 +8,189 @@ from .RuntimeError import *
 from .Stmt import *
 from .Environment import Environment
 from .NativeFunctions import *
-from .LoxFunction import LoxFunction
-from .ReturnEx import ReturnEx
+from .Rope import STRING_TYPES, concat
 from .LoxClass import LoxClass
-
-from typing import List
+from .InlineCache import InlineCache, MISSING
+from .Quickening import Quickening
+
+ENGINES = ('tree', 'closure', 'bytecode', 'python')
+
+# Deepest Lox call stack the bytecode VM allows before reporting a stack
+# overflow. The other engines recurse in Python and are bounded by Python's
+# recursion limit, which an explicit depth only raises to fit about that
+# many calls.
+DEFAULT_MAX_DEPTH = 100000
+# Results kept by --memoize when no size is given.
+DEFAULT_MEMO_SIZE = 10000
+# Rough number of Python frames the recursive engines use per Lox call.
+PYTHON_FRAMES_PER_CALL = {'tree': 12, 'closure': 6, 'python': 2}
+
+def isEqual(left, right) -> bool:
+    # Lox values of different types are never equal, so true != 1 and
+    # nil only equals nil. A string can be either a str or a Rope.
+    if type(left) is type(right):
+        return left == right
+    return isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES) and left == right
 
 class Interpreter(ExprVisitor, StmtVisitor):
-    def __init__(self):
+    # What function and class declarations create. The variant run while
+    # observers are attached (see Observer.py) swaps in ones that report
+    # calls and new instances.
+    functionType = LoxFunction
+    classType = LoxClass
+
+    def __init__(self, engine: str = 'tree', dumpPython: str = None, maxDepth: int = None,
+                 memoize: int = 0):
         self.hadRuntimeError = False
+        # Set when the bytecode compiler rejects a program.
+        self.hadCompileError = False
         self.globals = Environment()
         self.environment = self.globals
-        self.globals.define('clock', ClockNative())
-        self.locals: dict[Expr, int] = {}
-
-    def interpret(self, statements: List[Stmt]):
+        for name, native in NATIVES.items():
+            self.globals.define(name, native())
+        self.engine = engine
+        self.vm = None
+        # Every inline cache created, only kept for --ic-stats: otherwise a
+        # cache lives on its node (or closure) and goes away with it.
+        self.inlineCaches: list[InlineCache] = None
+        self.dumpPython = dumpPython
+        self.python = None
+        self.maxDepth = maxDepth or DEFAULT_MAX_DEPTH
+        if maxDepth and engine in PYTHON_FRAMES_PER_CALL:
+            import sys
+            limit = maxDepth * PYTHON_FRAMES_PER_CALL[engine] + 100
+            sys.setrecursionlimit(max(sys.getrecursionlimit(), limit))
+        self.memo = None
+        if memoize:
+            if engine not in ('tree', 'closure'):
+                raise ValueError(f'memoization is not supported by the {engine} engine')
+            from .Memoizer import Memo
+            self.memo = Memo(memoize)
+        self.observers = []
+        self.quickening = Quickening()
+        # Line of the statement being run, kept up to date while observed.
+        self.line = 0
+        # Observed functions that ended in a tail call, waiting for the call
+        # they handed over to (see Observer.py).
+        self.tailCallers = []
+
+    def interpret(self, statements: list[Stmt]):
+        if self.memo is not None:
+            self.memo.analyze(statements)
         try:
+            if self.engine == 'closure':
+                from .ClosureCompiler import ClosureCompiler
+                ClosureCompiler(self).compile(statements)(self.globals)
+                return
+            if self.engine == 'bytecode':
+                self.runBytecode(statements)
+                return
+            if self.engine == 'python':
+                self.runPython(statements)
+                return
             for stmt in statements:
                 self.execute(stmt)
         except RuntimeError as e:
-            pass
+            self.runtimeFailed(e)
+        except RecursionError as e:
+            self.runtimeFailed(self.stackOverflow(e))
+
+    def runtimeFailed(self, error: RuntimeError):
+        self.hadRuntimeError = True
+        self.environment = self.globals
 
+    def addObserver(self, observer):
+        # Until the last observer is removed, statements are run by the
+        # instrumented TracingInterpreter, a tree-walker. The closure engine
+        # shares its globals and functions; the others keep their own.
+        if self.engine not in ('tree', 'closure'):
+            raise ValueError(f'observers are not supported by the {self.engine} engine')
+        from .Observer import TracingInterpreter
+        self.observers.append(observer)
+        self.__class__ = TracingInterpreter
+
+    def removeObserver(self, observer):
+        self.observers.remove(observer)
+        if not self.observers:
+            self.__class__ = Interpreter
+
+    def runBytecode(self, statements: list[Stmt]):
+        from .BytecodeCompiler import BytecodeCompiler
+        from .VM import VM
+        compiler = BytecodeCompiler()
+        function = compiler.compile(statements)
+        if compiler.hadError:
+            self.hadCompileError = True
+            return
+        if self.vm is None:
+            self.vm = VM(self)
+            for name, value in self.globals.values.items():
+                self.vm.defineNative(name, value)
+        self.vm.interpret(function)
+
+    def runPython(self, statements: list[Stmt]):
+        from .PythonGenerator import PythonGenerator
+        from .PythonRuntime import translateError
+        if self.python is None:
+            # Generated modules share one namespace so that globals persist
+            # across REPL lines, just like self.globals does.
+            self.python = (PythonGenerator(self), dict(), dict())
+            for name, value in self.globals.values.items():
+                self.python[1][f'l_{name}'] = value
+        generator, namespace, lineTokens = self.python
+        source, lines = generator.generate(statements, namespace.keys())
+        if self.dumpPython:
+            with open(self.dumpPython, 'w') as f:
+                f.write(source)
+        lineTokens[generator.filename] = lines
+        code = compile(source, generator.filename, 'exec')
+        try:
+            exec(code, namespace)
+        except (NameError, AttributeError, RecursionError) as e:
+            error = translateError(e, lineTokens)
+            if error is None:
+                raise
+            raise error from None
+
+    def stackOverflow(self, error: RecursionError):
+        # Report against the paren of the innermost Lox call, which the
+        # tree and closure call sites record on the error on its way out.
+        paren = getattr(error, 'paren', None)
+        if paren is None:
+            paren = Token(TokenType.RIGHT_PAREN, ')', None, 0)
+        return self.runtimeError(paren, 'Stack overflow')
+
+    def collectCacheStats(self):
+        self.inlineCaches = []
+
+    def inlineCache(self, token: Token) -> InlineCache:
+        cache = InlineCache(token)
+        if self.inlineCaches is not None:
+            self.inlineCaches.append(cache)
+        return cache
+
+    # Statements return a completion: None to carry on, or a one-element
+    # tuple holding the value of a `return`, which every enclosing block and
+    # loop hands straight back to the function call.
     def execute(self, statement: Stmt):
-        statement.accept(self)
+        return statement.accept(self)
 
-    def resolve(self, expr: Expr, depth: int):
-        self.locals[expr] = depth
+    def resolve(self, expr: Expr, depth: int, slot: int):
+        # Stored on the node itself, so it goes away with the program.
+        expr.depth = depth
+        expr.slot = slot
 
-    def executeBlock(self, statements:List[Stmt], environment: Environment):
+    def executeBlock(self, statements:list[Stmt], environment: Environment):
+        # Runtime errors abort the whole program, and interpret() puts the
+        # environment back, so there is no need for a try/finally here.
         previous = self.environment
-        try:
-            self.environment = environment
-            for statement in statements:
-                self.execute(statement)
-        finally:
-            self.environment = previous
+        self.environment = environment
+        for statement in statements:
+            completion = statement.accept(self)
+            if completion is not None:
+                self.environment = previous
+                return completion
+        self.environment = previous
 
     def visitVarStmt(self,stmt:Var):
         value = None
@@ -55,6 +203,15 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
     def visitLogicalExpr(self, expr: Logical):
         left = self.evaluate(expr.left)
+        self.quickening.logical(expr, left)
+        return self.logicalOperation(expr, left)
+
+    def logicalFallback(self, expr: Logical, left):
+        # A quickened node (see Quickening.py) whose guard failed.
+        self.quickening.deoptimize(expr, left)
+        return self.logicalOperation(expr, left)
+
+    def logicalOperation(self, expr: Logical, left):
         if expr.operator.type == TokenType.OR:
             if self.isTruthy(left):
                 return left
@@ -70,7 +227,9 @@ class Interpreter(ExprVisitor, StmtVisitor):
         self.evaluate(stmt.expression)
 
     def visitFunctionStmt(self, stmt: Function):
-        function = LoxFunction(stmt, self.environment, False)
+        function = self.functionType(stmt, self.environment, False)
+        if self.memo is not None and stmt in self.memo.functions:
+            function = self.memo.wrap(function)
         self.environment.define(stmt.name.lexeme, function)
 
     def visitClassStmt(self, stmt: Class):
@@ -78,57 +237,106 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if stmt.superclass is not None:
             superclass = self.evaluate(stmt.superclass)
             if not isinstance(superclass, LoxClass):
-                self.runtimeError(stmt.superclass.name, "Superclass must be a class")
-        self.environment.define(stmt.name.lexeme, (not None))
+                raise self.runtimeError(stmt.superclass.name, "Superclass must be a class")
         if stmt.superclass is not None:
             self.environment = Environment(self.environment)
             self.environment.define("super", superclass)
         methods: dict[str, LoxFunction] = dict()
         for method in stmt.methods:
-            function = LoxFunction(method, self.environment,
+            function = self.functionType(method, self.environment,
                 (method.name.lexeme == 'init'))
             methods[method.name.lexeme] = function
-        klass = LoxClass(stmt.name.lexeme, superclass, methods)
+        klass = self.classType(stmt.name.lexeme, superclass, methods, stmt.name.line)
         if superclass is not None:
             self.environment = self.environment.enclosing
-        self.environment.assign(stmt.name, klass)
+        self.environment.define(stmt.name.lexeme, klass)
 
     def visitGetExpr(self, expr: Get):
-        object = self.evaluate(expr.object)
-        if isinstance(object, LoxInstance):
-            return object.get(expr.name)
-        raise self.runtimeError(expr.name, "Only instances have properties.")
+        return self.getProperty(expr, self.evaluate(expr.object))
+
+    def getProperty(self, expr: Get, object):
+        if not isinstance(object, LoxInstance):
+            raise self.runtimeError(expr.name, "Only instances have properties.")
+        return self.propertyValue(expr, object, self.lookupProperty(expr, object))
+
+    def lookupProperty(self, expr: Get, object: LoxInstance):
+        # Returns the field offset (an int) or the method (None if there is
+        # neither) for the object's shape, through the site's inline cache.
+        cache = expr.cache
+        if cache is None:
+            cache = expr.cache = self.inlineCache(expr.name)
+        entry = cache.entries.get(object.shape, MISSING)
+        if entry is MISSING:
+            return cache.missGet(object)
+        cache.hits += 1
+        return entry
+
+    def propertyValue(self, expr: Get, object: LoxInstance, entry):
+        if type(entry) is int:
+            return object.values[entry]
+        if entry is None:
+            raise object.runtimeError(expr.name, f'Undefined property {expr.name.lexeme}')
+        return entry.bind(object)
+
+    def findMethod(self, expr, name: Token, klass: LoxClass):
+        cache = expr.cache
+        if cache is None:
+            cache = expr.cache = self.inlineCache(name)
+        method = cache.entries.get(klass, MISSING)
+        if method is MISSING:
+            return cache.miss(klass)
+        cache.hits += 1
+        return method
 
     def visitSetExpr(self, expr: Set):
         object = self.evaluate(expr.object)
         if not isinstance(object, LoxInstance):
             raise self.runtimeError(expr.name, "Only instances have fields")
         value = self.evaluate(expr.value)
-        object.set(expr.name, value)
+        # Looked up only now: evaluating the value may have added fields.
+        cache = expr.cache
+        if cache is None:
+            cache = expr.cache = self.inlineCache(expr.name)
+        entry = cache.entries.get(object.shape, MISSING)
+        if entry is MISSING:
+            entry = cache.missSet(object)
+        else:
+            cache.hits += 1
+        if type(entry) is int:
+            object.values[entry] = value
+        else:
+            object.values.append(value)
+            object.shape = entry
         return value
 
     def visitSuperExpr(self, expr: Super):
-        distance = self.locals.get(expr)
-        superclass = self.environment.getAt(distance, "super")
-        obj = self.environment.getAt(distance-1, "this")
-        method = superclass.findMethod(expr.method.lexeme)
-        if method is None:
-            self.runtimeError(expr.method, f'Undefined property {expr.method.lexeme}')
+        method, obj = self.superMethod(expr)
         return method.bind(obj)
 
+    def superMethod(self, expr: Super):
+        distance = expr.depth
+        superclass = self.environment.getAt(distance, expr.slot)
+        obj = self.environment.getAt(distance-1, 0)
+        method = self.findMethod(expr, expr.method, superclass)
+        if method is None:
+            raise self.runtimeError(expr.method, f'Undefined property {expr.method.lexeme}')
+        return method, obj
+
     def visitThisExpr(self, expr: This):
         return self.lookupVariable(expr.keyword, expr)
 
     def visitIfStmt(self, stmt: If):
         eval_result = self.evaluate(stmt.condition)
         if self.isTruthy(eval_result):
-            self.execute(stmt.thenBranch)
+            return self.execute(stmt.thenBranch)
         elif stmt.elseBranch:
-            self.execute(stmt.elseBranch)
+            return self.execute(stmt.elseBranch)
 
     def visitWhileStmt(self, stmt: While):
         while self.isTruthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            completion = self.execute(stmt.body)
+            if completion is not None:
+                return completion
 
     def visitPrintStmt(self,stmt:Print):
         value = self.evaluate(stmt.expression)
@@ -137,12 +345,47 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visitReturnStmt(self, stmt: Return):
         value = None
         if stmt.value:
+            if stmt.tail:
+                return self.tailCall(stmt.value)
             value = self.evaluate(stmt.value)
-        raise ReturnEx(value)
+        return (value,)
+
+    def tailCall(self, expr: Call):
+        # Like visitCallExpr, but a Lox function is not called here: it is
+        # handed back as a (function, this, args) completion and run by the
+        # trampoline of the LoxFunction being returned from.
+        calleeExpr = expr.callee
+        instance = None
+        if type(calleeExpr) is Get:
+            object = self.evaluate(calleeExpr.object)
+            if not isinstance(object, LoxInstance):
+                raise self.runtimeError(calleeExpr.name, "Only instances have properties.")
+            entry = self.lookupProperty(calleeExpr, object)
+            if entry is not None and type(entry) is not int:
+                callee, instance = entry, object
+            else:
+                callee = self.propertyValue(calleeExpr, object, entry)
+        elif type(calleeExpr) is Super:
+            callee, instance = self.superMethod(calleeExpr)
+        else:
+            callee = self.evaluate(calleeExpr)
+        args = [self.evaluate(arg) for arg in expr.args]
+
+        if not isinstance(callee, LoxCallable):
+            raise self.runtimeError(expr.paren, "Can only call functions and classes")
+        if len(args) != callee.arity():
+            raise self.runtimeError(
+                expr.paren,
+                f'Expected {callee.arity()} arguments got {len(args)}.')
+        if type(callee) is not self.functionType:
+            try:
+                return (callee.call(self, args),)
+            except NativeError as e:
+                raise self.runtimeError(expr.paren, e.message)
+        return (callee, instance, args)
 
     def visitBlockStmt(self,stmt:Block):
-        self.executeBlock(stmt.statements, Environment(self.environment))
-        return
+        return self.executeBlock(stmt.statements, Environment(self.environment))
 
     def visitGroupingExpr(self,expr:Grouping):
         return self.evaluate(expr.expression)
@@ -164,17 +407,39 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
     def visitUnaryExpr(self,expr:Unary):
         right = self.evaluate(expr.right)
+        self.quickening.unary(expr, right)
+        return self.unaryOperation(expr, right)
+
+    def unaryFallback(self, expr: Unary, right):
+        self.quickening.deoptimize(expr, right)
+        return self.unaryOperation(expr, right)
 
-        if expr.operator is TokenType.MINUS:
+    def unaryOperation(self, expr: Unary, right):
+        if expr.operator.type is TokenType.MINUS:
             self.checkNumberOperands(expr.operator, right)
             right = right * -1.0
-        elif expr.operator is TokenType.BANG:
+        elif expr.operator.type is TokenType.BANG:
             right = not self.isTruthy(right)
 
         return right
 
     def visitCallExpr(self, expr: Call):
-        callee = self.evaluate(expr.callee)
+        # Method calls look the method up through the inline cache and call
+        # it with `this` bound directly, skipping the bound LoxFunction.
+        calleeExpr = expr.callee
+        if type(calleeExpr) is Get:
+            object = self.evaluate(calleeExpr.object)
+            if not isinstance(object, LoxInstance):
+                raise self.runtimeError(calleeExpr.name, "Only instances have properties.")
+            entry = self.lookupProperty(calleeExpr, object)
+            if entry is not None and type(entry) is not int:
+                return self.callMethod(expr, entry, object)
+            callee = self.propertyValue(calleeExpr, object, entry)
+        elif type(calleeExpr) is Super:
+            method, object = self.superMethod(calleeExpr)
+            return self.callMethod(expr, method, object)
+        else:
+            callee = self.evaluate(calleeExpr)
         args = list()
         for arg in expr.args:
             args.append(self.evaluate(arg))
@@ -188,23 +453,49 @@ class Interpreter(ExprVisitor, StmtVisitor):
                 expr.paren,
                 f'Expected {fun.arity()} arguments got {len(args)}.')
 
-        return fun.call(self, args)
+        try:
+            return fun.call(self, args)
+        except NativeError as e:
+            raise self.runtimeError(expr.paren, e.message)
+        except RecursionError as e:
+            # The innermost call site the error passes through is where the
+            # stack overflowed (see stackOverflow). Only set an attribute:
+            # the stack is still too deep to call anything here.
+            if not hasattr(e, 'paren'):
+                e.paren = expr.paren
+            raise
+
+    def callMethod(self, expr: Call, method: LoxFunction, object: LoxInstance):
+        args = [self.evaluate(arg) for arg in expr.args]
+        if len(args) != method.arity():
+            raise self.runtimeError(
+                expr.paren,
+                f'Expected {method.arity()} arguments got {len(args)}.')
+        try:
+            return method.callBound(self, object, args)
+        except RecursionError as e:
+            if not hasattr(e, 'paren'):
+                e.paren = expr.paren
+            raise
 
     def visitVariableExpr(self,expr:Variable):
         return self.lookupVariable(expr.name, expr)
 
     def lookupVariable(self, name:Token,expr:Expr):
-        distance = self.locals.get(expr)
+        distance = expr.depth
         if distance is not None:
-            return self.environment.getAt(distance, name.lexeme)
+            environment = self.environment
+            while distance:
+                environment = environment.enclosing
+                distance -= 1
+            return environment.slots[expr.slot]
         else:
             return self.globals.get(name)
 
     def visitAssignExpr(self,expr:Assign):
         value = self.evaluate(expr.value)
-        distance = self.locals.get(expr)
-        if distance is not None:
-            self.environment.assignAt(distance, expr.name, value)
+        if expr.depth is not None:
+            self.environment.assignAt(expr.depth, expr.slot, value)
         else:
             self.globals.assign(expr.name, value)
         return value
@@ -212,41 +503,49 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visitBinaryExpr(self,expr:Binary):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
+        self.quickening.binary(expr, left, right)
+        return self.binaryOperation(expr, left, right)
+
+    def binaryFallback(self, expr: Binary, left, right):
+        self.quickening.deoptimize(expr, left, right)
+        return self.binaryOperation(expr, left, right)
+
+    def binaryOperation(self, expr: Binary, left, right):
         opType = expr.operator.type
         if opType is TokenType.GREATER:
-            self.checkNumberOperands(opType, left, right)
+            self.checkNumberOperands(expr.operator, left, right)
             return left > right
         elif opType is TokenType.GREATER_EQUAL:
-            self.checkNumberOperands(opType, left, right)
+            self.checkNumberOperands(expr.operator, left, right)
             return left >= right
         elif opType is TokenType.LESS:
-            self.checkNumberOperands(opType, left, right)
+            self.checkNumberOperands(expr.operator, left, right)
             return left < right
         elif opType is TokenType.LESS_EQUAL:
-            self.checkNumberOperands(opType, left, right)
+            self.checkNumberOperands(expr.operator, left, right)
             return left <= right
         elif opType is TokenType.MINUS:
-            self.checkNumberOperands(opType, left, right)
+            self.checkNumberOperands(expr.operator, left, right)
             return left - right
         elif opType is TokenType.PLUS:
             isTwoNumbers = isinstance(left, float) and isinstance(right, float)
-            isTwoStrings = isinstance(left, str) and isinstance(right, str)
-            if not (isTwoStrings or isTwoNumbers):
-                raise self.runTimeError(opType, "Operands must be two strings or two numbers")
-            return left + right
+            if isTwoNumbers:
+                return left + right
+            if isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+                return concat(left, right)
+            raise self.runtimeError(expr.operator, "Operands must be two strings or two numbers")
         elif opType is TokenType.SLASH:
-            self.checkNumberOperands(opType, left, right)
+            self.checkNumberOperands(expr.operator, left, right)
             if right == 0:
-                raise self.runTimeError(opType, "Divide by zero is not allowed")
+                raise self.runtimeError(expr.operator, "Divide by zero is not allowed")
             return left / right
         elif opType is TokenType.STAR:
-            self.checkNumberOperands(opType, left, right)
+            self.checkNumberOperands(expr.operator, left, right)
             return left * right
         elif opType is TokenType.BANG_EQUAL:
-            # print(f"left == right = {left == right}")
-            return not (left == right)
+            return not isEqual(left, right)
         elif opType is TokenType.EQUAL_EQUAL:
-            return (left == right)
+            return isEqual(left, right)
 
     def runtimeError(self, token, message):
         return RuntimeError(token, message, 'Interpreter')
\ No newline at end of file
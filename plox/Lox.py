@@ -1,25 +1,69 @@
 import sys
-from types import resolve_bases
-from .Scanner import Scanner
-from .TokenType import *
-from .Util import *
-from .Parser import Parser
-from .AstPrinter import AstPrinter
-from .Interpreter import Interpreter
-from .Resolver import Resolver
-import traceback
+from .Interpreter import Interpreter, ENGINES, DEFAULT_MAX_DEPTH, DEFAULT_MEMO_SIZE
+
+# Startup time matters for short scripts, so the front end (scanner, parser
+# and resolver) is only imported when a script is not found in the cache,
+# and anything else only when it is used.
+
+# Exit statuses, as in clox.
+EXIT_COMPILE_ERROR = 65
+EXIT_RUNTIME_ERROR = 70
 
 class Lox:
-    def __init__(self):
+    def __init__(self, engine: str = 'tree', dumpPython: str = None, cache=None, maxDepth: int = None,
+                 optimize: int = 0, memoize: int = 0):
         self.hadError = False
         self.hadRuntimeError = False
-        self.interpreter = Interpreter()
+        self.interpreter = Interpreter(engine, dumpPython, maxDepth, memoize)
+        self.cache = cache
+        self.optimizer = None
+        if optimize:
+            from .Optimizer import Optimizer
+            self.optimizer = Optimizer(optimize)
+
+    def exitStatus(self) -> int:
+        if self.hadError or self.interpreter.hadCompileError:
+            return EXIT_COMPILE_ERROR
+        if self.interpreter.hadRuntimeError:
+            return EXIT_RUNTIME_ERROR
+        return 0
 
     def runFile(self, path: str):
         try:
             f = open(path, 'r')
-            self.run(str(f.read()))
+            self.run(str(f.read()), path)
         except:
+            import traceback
+            print(f"Some failure occured: {sys.exc_info()[0]}")
+            traceback.print_exc()
+
+    def runStream(self, path: str):
+        # Scans, parses, resolves and runs one top-level declaration at a
+        # time, so output starts early and the whole program is never held
+        # in memory. Stops at the first error, like run().
+        from .RegexScanner import RegexScanner
+        from .Parser import Parser
+        from .Resolver import Resolver
+        try:
+            with open(path, 'r') as f:
+                parser = Parser(RegexScanner(f).iterTokens())
+                for statement in parser.declarations():
+                    if parser.hadError:
+                        print("Parsing failed")
+                        self.hadError = True
+                        return
+                    resolver = Resolver(self.interpreter)
+                    resolver.resolve([statement])
+                    if resolver.hadError:
+                        print("Variable resolution failed")
+                        self.hadError = True
+                        return
+                    statements = self.optimize([statement])
+                    self.interpreter.interpret(statements)
+                    if self.interpreter.hadRuntimeError or self.interpreter.hadCompileError:
+                        return
+        except:
+            import traceback
             print(f"Some failure occured: {sys.exc_info()[0]}")
             traceback.print_exc()
 
@@ -35,33 +79,181 @@ class Lox:
                 self.run(inputData)
                 self.hadError = False
 
-    def run(self, source: str):
-        scanner = Scanner(source)
+    def run(self, source: str, path: str = None):
+        statements = None
+        if path is not None and self.cache is not None:
+            statements = self.cache.load(path, source)
+        if statements is None:
+            statements = self.compile(source, path)
+            if statements is None:
+                return
+
+        self.interpreter.interpret(statements)
+
+    def compile(self, source: str, path: str = None):
+        from .RegexScanner import RegexScanner
+        from .Parser import Parser
+        from .Resolver import Resolver
+        scanner = RegexScanner(source)
         tokens = scanner.scanTokens()
 
         parser = Parser(tokens)
         statements = parser.parse()
         if parser.hadError:
             print("Parsing failed")
+            self.hadError = True
             return
 
         resolver = Resolver(self.interpreter)
         resolver.resolve(statements)
         if resolver.hadError:
             print("Variable resolution failed")
+            self.hadError = True
             return
+        statements = self.optimize(statements)
 
-        self.interpreter.interpret(statements)
+        # Scanning errors are only reported, so a script that had any is
+        # not cached: the errors would not be reported again.
+        if path is not None and self.cache is not None and not scanner.hadError:
+            self.cache.store(path, source, statements)
+        return statements
+
+    def optimize(self, statements):
+        if self.optimizer is None:
+            return statements
+        from .Resolver import Resolver
+        statements = self.optimizer.optimize(statements)
+        # Removed declarations shift the slots of the locals after them.
+        Resolver(self.interpreter).resolve(statements)
+        return statements
+
+def defaultOptions() -> dict:
+    import os
+    return {
+        'engine': 'tree', 'batch': None, 'jobs': os.cpu_count(), 'serve': False, 'socket': None,
+        'stream': False, 'no_cache': False, 'cache_dir': None, 'max_depth': None, 'optimize': 0,
+        'opt_stats': False, 'memoize': False, 'memo_size': DEFAULT_MEMO_SIZE, 'memo_stats': False,
+        'profile': False, 'profile_json': None, 'ic_stats': False, 'quicken_stats': False,
+        'dump_python': None,
+    }
+
+def parseArgs(argv):
+    if len(argv) == 1 and not argv[0].startswith('-'):
+        # `./plox.py script`, by far the most common command line, is
+        # answered without importing argparse (and shutil, gettext, locale).
+        from types import SimpleNamespace
+        return SimpleNamespace(script=argv[0], **defaultOptions())
+    import argparse
+    parser = argparse.ArgumentParser(prog='./plox.py')
+    parser.add_argument('script', nargs='?')
+    parser.add_argument('--engine', choices=ENGINES,
+                        help='execution backend (default: tree)')
+    parser.add_argument('--batch', metavar='DIR',
+                        help='run every .lox script under DIR (or the script DIR) in worker processes')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help='worker processes for --batch, threads for --serve (default: one per CPU)')
+    parser.add_argument('--serve', action='store_true',
+                        help='run scripts sent by ploxc.py, with -j N worker threads')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='UNIX socket for --serve (default: /tmp/plox-<uid>.sock)')
+    parser.add_argument('--stream', action='store_true',
+                        help='parse and run the script one declaration at a time')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not read or write cached .loxc files')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='keep .loxc files in DIR instead of __loxcache__ next to the script')
+    parser.add_argument('--max-depth', type=int, metavar='N',
+                        help=f'bytecode: report a stack overflow past N nested Lox calls (default: '
+                             f'{DEFAULT_MAX_DEPTH}); other engines: raise Python\'s recursion limit to fit '
+                             f'about N calls, without enforcing N')
+    parser.add_argument('-O', dest='optimize', type=int, choices=(0, 1), metavar='LEVEL',
+                        help='0: run the program as written (default), 1: fold constants and '
+                             'remove dead code before running it')
+    parser.add_argument('--opt-stats', action='store_true',
+                        help='print what the optimizer folded and removed '
+                             '(scripts loaded from the cache are not counted)')
+    parser.add_argument('--memoize', action='store_true',
+                        help='cache the results of pure functions (tree and closure engines)')
+    parser.add_argument('--memo-size', type=int, metavar='N',
+                        help=f'keep at most N memoized results (default: {DEFAULT_MEMO_SIZE})')
+    parser.add_argument('--memo-stats', action='store_true',
+                        help='print per-function memoization hits and misses after running')
+    parser.add_argument('--profile', action='store_true',
+                        help='print call counts and time per function after running (tree and closure engines)')
+    parser.add_argument('--profile-json', metavar='PATH',
+                        help='write the --profile report to PATH as JSON (implies --profile)')
+    parser.add_argument('--ic-stats', action='store_true',
+                        help='print inline cache hit rates after running (tree and closure engines)')
+    parser.add_argument('--quicken-stats', action='store_true',
+                        help='print which operators were specialized for their operand types (tree engine)')
+    parser.add_argument('--dump-python', metavar='PATH',
+                        help='write the module generated by --engine=python to PATH')
+    parser.set_defaults(**defaultOptions())
+    args = parser.parse_args(argv)
+    if args.engine not in ('tree', 'closure'):
+        for flag, used in (('--memoize', args.memoize), ('--profile', args.profile),
+                           ('--profile-json', args.profile_json)):
+            if used:
+                parser.error(f'{flag} is not supported by the {args.engine} engine')
+    return args
 
 def main():
-    args = sys.argv
-    argsLen = len(args)
-    lox = Lox()
-    if argsLen > 2:
-        print("Usage: ./plox.py [script]")
-    elif argsLen == 2:
-        print(f'Executing file: {args[1]}')
-        lox.runFile(args[1])
+    args = parseArgs(sys.argv[1:])
+    cache = None
+    if not args.no_cache:
+        from .Cache import Cache
+        cache = Cache(args.cache_dir, args.optimize)
+    if args.serve:
+        from .Server import serve
+        serve(args.socket, args.jobs)
+        return
+    if args.batch:
+        from .Batch import runBatch
+        sys.exit(runBatch(args.batch, args.jobs, {
+            'engine': args.engine, 'cache': cache, 'maxDepth': args.max_depth,
+            'optimize': args.optimize, 'memoize': args.memo_size if args.memoize else 0}))
+    lox = Lox(args.engine, args.dump_python, cache, args.max_depth, args.optimize,
+              args.memo_size if args.memoize else 0)
+    if args.ic_stats:
+        lox.interpreter.collectCacheStats()
+    if args.quicken_stats:
+        lox.interpreter.quickening.collectStats()
+    profiler = None
+    if args.profile or args.profile_json:
+        from .Profiler import Profiler
+        profiler = Profiler()
+        profiler.install(lox.interpreter)
+    if args.script:
+        print(f'Executing file: {args.script}')
+        if args.stream:
+            lox.runStream(args.script)
+        else:
+            lox.runFile(args.script)
     else:
         lox.runPrompt()
 
+    if profiler is not None:
+        from .Profiler import printReport, writeJson
+        profiler.uninstall()
+        printReport(profiler)
+        if args.profile_json:
+            writeJson(profiler, args.profile_json)
+
+    printStats(lox, args)
+    # The same status as ploxc.py and --batch give: 65 or 70 on errors.
+    sys.exit(lox.exitStatus())
+
+def printStats(lox: Lox, args):
+    # sys.stderr is passed explicitly since the server replaces it.
+    if args.opt_stats and lox.optimizer is not None:
+        from .Optimizer import printStats
+        printStats(lox.optimizer, file=sys.stderr)
+    if args.memo_stats and lox.interpreter.memo is not None:
+        from .Memoizer import printStats
+        printStats(lox.interpreter.memo, file=sys.stderr)
+    if args.ic_stats:
+        from .InlineCache import printStats
+        printStats(lox.interpreter.inlineCaches, file=sys.stderr)
+    if args.quicken_stats:
+        from .Quickening import printStats
+        printStats(lox.interpreter.quickening, file=sys.stderr)
@@ -0,0 +1,78 @@
+from array import array
+import math
+import operator
+
+# Lox's numeric array, made by the Array native: a contiguous buffer of
+# doubles. The array natives (see NativeFunctions.py) work on the whole
+# buffer at once, in C rather than in the interpreter: through NumPy when
+# it is installed and the array is long enough to be worth it, and
+# otherwise through array and map() over builtins.
+#
+# NumPy is only used where it gives the same result to the bit: element-wise
+# arithmetic and functions. Sums are always math.fsum, so that a script
+# prints the same numbers with or without it.
+
+# Shorter arrays never use NumPy, so small scripts don't pay for importing it.
+NUMPY_THRESHOLD = 10000
+
+class LoxArray:
+    __slots__ = ('values',)
+
+    def __init__(self, values: array):
+        self.values = values
+
+    def __repr__(self) -> str:
+        return str(self.values.tolist())
+
+    @staticmethod
+    def zeros(length: int):
+        return LoxArray(array('d', bytes(8 * length)))
+
+    def fill(self, value: float):
+        self.values[:] = array('d', [value]) * len(self.values)
+
+    def sum(self) -> float:
+        return math.fsum(self.values)
+
+    def dot(self, other) -> float:
+        return math.fsum(map(operator.mul, self.values, other.values))
+
+    def scale(self, factor: float):
+        numpy = numpyFor(self)
+        if numpy is not None:
+            return self.fromNumpy(numpy.multiply(self.view(numpy), factor))
+        return LoxArray(array('d', map(factor.__rmul__, self.values)))
+
+    def add(self, other):
+        numpy = numpyFor(self)
+        if numpy is not None:
+            return self.fromNumpy(numpy.add(self.view(numpy), other.view(numpy)))
+        return LoxArray(array('d', map(operator.add, self.values, other.values)))
+
+    def map(self, function, ufunc: str = None):
+        # function applied to every element, or NumPy's ufunc of that name.
+        numpy = numpyFor(self) if ufunc else None
+        if numpy is not None:
+            return self.fromNumpy(getattr(numpy, ufunc)(self.view(numpy)))
+        return LoxArray(array('d', map(function, self.values)))
+
+    def view(self, numpy):
+        return numpy.frombuffer(self.values, dtype=numpy.float64)
+
+    @staticmethod
+    def fromNumpy(result):
+        return LoxArray(array('d', result.tobytes()))
+
+# False until the first import attempt, then the module or None.
+numpy = False
+
+def numpyFor(loxArray: LoxArray):
+    global numpy
+    if len(loxArray.values) < NUMPY_THRESHOLD:
+        return None
+    if numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
@@ -1,6 +1,8 @@
 from abc import abstractmethod, ABCMeta
 class LoxCallable:
     __metaclass__ = ABCMeta
+    __slots__ = ()
+
     @abstractmethod
     def call(self, interpreter, args):
         raise NotImplementedError
@@ -1,26 +1,33 @@
-from typing import Dict
+from __future__ import annotations
 from .LoxFunction import LoxFunction
 from .LoxCallable import LoxCallable
 from . import LoxInstance
+from .Shape import Shape
 
 class LoxClass(LoxCallable):
-    def __init__(self, name:str, superclass, methods:Dict[str, LoxFunction]):
+    def __init__(self, name:str, superclass, methods:dict[str, LoxFunction], line:int = 0):
         self.name = name
+        # Line of the class declaration, for reports such as --profile.
+        self.line = line
         self.methods = methods
         self.superclass: LoxClass = superclass
+        # Methods can't change after the class is created.
+        self.initializer = self.findMethod("init")
+        # Every instance starts out with this (empty) shape.
+        self.shape = Shape()
 
     def __repr__(self):
         return f'<class {self.name}>'
 
     def call(self, interpreter, args):
         instance = LoxInstance.LoxInstance(self)
-        initializer = self.findMethod("init")
+        initializer = self.initializer
         if initializer is not None:
-            initializer.bind(instance).call(interpreter, args)
-        return LoxInstance.LoxInstance(self)
+            initializer.callBound(interpreter, instance, args)
+        return instance
 
     def arity(self) -> int:
-        initializer = self.findMethod("init")
+        initializer = self.initializer
         if initializer is None:
             return 0
         return initializer.arity()
@@ -2,9 +2,10 @@ from . import LoxInstance
 from .LoxCallable import LoxCallable
 from .Stmt import Function
 from .Environment import Environment
-from .ReturnEx import ReturnEx
 
 class LoxFunction(LoxCallable):
+    __slots__ = ('declaration', 'closure', 'isInitializer')
+
     def __init__(self, declaration: Function, closure: Environment, isInitializer: bool):
         self.declaration = declaration
         self.closure = closure
@@ -12,16 +13,32 @@ class LoxFunction(LoxCallable):
 
     def call(self, interpreter, args):
         environment = Environment(self.closure)
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, args[i])
-        try:
-            interpreter.executeBlock(self.declaration.body, environment)
-        except ReturnEx as err:
-            if self.isInitializer:
-                return self.closure.getAt(0, "this")
-            return err.value
+        environment.slots = list(args)
+        completion = interpreter.executeBlock(self.declaration.body, environment)
+        if self.isInitializer:
+            return self.closure.slots[0]
+        if completion is not None:
+            if len(completion) == 3:
+                return trampoline(interpreter, completion)
+            return completion[0]
+
+    def callBound(self, interpreter, instance, args):
+        # bind(instance).call(interpreter, args) without creating the
+        # bound LoxFunction.
+        this = Environment(self.closure)
+        this.slots = [instance]
+        environment = Environment(this)
+        environment.slots = list(args)
+        completion = interpreter.executeBlock(self.declaration.body, environment)
         if self.isInitializer:
-            return self.closure.getAt(0, "this")
+            return instance
+        if completion is not None:
+            if len(completion) == 3:
+                return trampoline(interpreter, completion)
+            return completion[0]
+
+    def execute(self, interpreter, environment: Environment):
+        return interpreter.executeBlock(self.declaration.body, environment)
 
     def arity(self) -> int:
         return len(self.declaration.params)
@@ -32,4 +49,21 @@ class LoxFunction(LoxCallable):
     def bind(self, instance: LoxInstance):
         environment = Environment(self.closure)
         environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.isInitializer)
\ No newline at end of file
+        return LoxFunction(self.declaration, environment, self.isInitializer)
+
+def trampoline(interpreter, completion):
+    # Runs the (function, this, args) completions of `return f(...)` one
+    # after the other, so a chain of tail calls takes constant Python stack.
+    while len(completion) == 3:
+        function, instance, args = completion
+        environment = Environment(function.closure)
+        if instance is not None:
+            environment.slots = [instance]
+            environment = Environment(environment)
+        environment.slots = args
+        completion = function.execute(interpreter, environment)
+        if function.isInitializer:
+            return function.closure.slots[0] if instance is None else instance
+        if completion is None:
+            return None
+    return completion[0]
@@ -1,19 +1,24 @@
-from typing import Any
+from __future__ import annotations
 from . import LoxClass
 from .TokenType import Token
 from .RuntimeError import RuntimeError
 
 class LoxInstance:
+    # Field values live in `values`, at the offsets given by `shape`.
+    __slots__ = ('klass', 'shape', 'values')
+
     def __init__(self, klass:LoxClass):
         self.klass = klass
-        self.fields: dict[str, Any] = dict()
+        self.shape = klass.shape
+        self.values: list = []
 
     def __repr__(self) -> str:
         return f'<class-instance {self.klass.name}>'
 
     def get(self, name:Token):
-        if self.fields.get(name.lexeme) is not None:
-            return self.fields.get(name.lexeme)
+        offset = self.shape.offsets.get(name.lexeme)
+        if offset is not None:
+            return self.values[offset]
 
         method = self.klass.findMethod(name.lexeme)
         if method:
@@ -24,5 +29,10 @@ class LoxInstance:
     def runtimeError(self, token:Token, message:str):
         return RuntimeError(token, message, "Instance Call")
 
-    def set(self, name:Token, value:Any):
-        self.fields[name.lexeme] = value
+    def set(self, name:Token, value:object):
+        offset = self.shape.offsets.get(name.lexeme)
+        if offset is not None:
+            self.values[offset] = value
+            return
+        self.shape = self.shape.withField(name.lexeme)
+        self.values.append(value)
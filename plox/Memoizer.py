@@ -0,0 +1,264 @@
+from __future__ import annotations
+import sys
+from collections import OrderedDict
+from .Expr import *
+from .Stmt import *
+from .LoxCallable import LoxCallable
+from .Rope import Rope
+from .Interpreter import DEFAULT_MEMO_SIZE
+
+# Memoization of pure Lox functions (--memoize). A top-level function is
+# pure when its result depends on nothing but its arguments: it reads only
+# its own parameters and locals, calls only pure functions, and has no
+# print, field access, assignment outside itself or nested declarations.
+# Calls to natives such as clock() make a function impure.
+#
+# Purity is proven per batch of statements (a script, a REPL line or a
+# streamed declaration), relying on global function names that are declared
+# once and never assigned. If a later batch writes one of those names, all
+# memoized results may be stale, so memoization is switched off for good.
+
+class FunctionPurity(ExprVisitor, StmtVisitor):
+    # Checks one top-level function body, collecting the global names it
+    # depends on.
+    def __init__(self):
+        self.pure = True
+        self.depends = set()
+        self.nonTailCalls = 0
+        # Scopes opened inside the function: a variable whose depth is
+        # smaller belongs to it.
+        self.scopes = 1
+
+    def check(self, stmt: Function):
+        self.stmts(stmt.body)
+        return self
+
+    def stmts(self, statements: list[Stmt]):
+        for stmt in statements:
+            stmt.accept(self)
+
+    def isOwn(self, expr: Expr) -> bool:
+        return expr.depth is not None and expr.depth < self.scopes
+
+    def visitBlockStmt(self, stmt: Block):
+        self.scopes += 1
+        self.stmts(stmt.statements)
+        self.scopes -= 1
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer:
+            stmt.initializer.accept(self)
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.pure = False
+
+    def visitClassStmt(self, stmt: Class):
+        self.pure = False
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression.accept(self)
+
+    def visitIfStmt(self, stmt: If):
+        stmt.condition.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch:
+            stmt.elseBranch.accept(self)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.pure = False
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value is None:
+            return
+        if stmt.tail:
+            # Counted as a tail call rather than one worth memoizing.
+            self.nonTailCalls -= 1
+        stmt.value.accept(self)
+
+    def visitWhileStmt(self, stmt: While):
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitCallExpr(self, expr: Call):
+        self.nonTailCalls += 1
+        if not isinstance(expr.callee, Variable) or self.isOwn(expr.callee):
+            self.pure = False
+        expr.callee.accept(self)
+        for arg in expr.args:
+            arg.accept(self)
+
+    def visitGetExpr(self, expr: Get):
+        self.pure = False
+
+    def visitSetExpr(self, expr: Set):
+        self.pure = False
+
+    def visitGroupingExpr(self, expr: Grouping):
+        expr.expression.accept(self)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitSuperExpr(self, expr: Super):
+        self.pure = False
+
+    def visitThisExpr(self, expr: This):
+        self.pure = False
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right.accept(self)
+
+    def visitVariableExpr(self, expr: Variable):
+        if not self.isOwn(expr):
+            if expr.depth is not None:
+                self.pure = False
+            self.depends.add(expr.name.lexeme)
+
+    def visitAssignExpr(self, expr: Assign):
+        if not self.isOwn(expr):
+            self.pure = False
+        expr.value.accept(self)
+
+class GlobalWrites:
+    # Every global name a batch declares or assigns, and how often.
+    def __init__(self):
+        self.counts: dict[str, int] = dict()
+        self.depth = 0
+
+    def write(self, name: str):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def walk(self, node):
+        if isinstance(node, list):
+            for child in node:
+                self.walk(child)
+        elif isinstance(node, (Expr, Stmt)):
+            if isinstance(node, Assign) and node.depth is None:
+                self.write(node.name.lexeme)
+            elif isinstance(node, (Var, Function, Class)) and self.depth == 0:
+                self.write(node.name.lexeme)
+            nested = isinstance(node, (Block, Function))
+            self.depth += nested
+            for name in type(node).__slots__:
+                self.walk(getattr(node, name))
+            self.depth -= nested
+
+class MemoizedFunction(LoxCallable):
+    __slots__ = ('function', 'memo', 'hits', 'misses')
+
+    def __init__(self, function: LoxCallable, memo):
+        self.function = function
+        self.memo = memo
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, interpreter, args):
+        memo = self.memo
+        key = memoKey(args) if memo.enabled else None
+        if key is None:
+            return self.function.call(interpreter, args)
+        key = (self, key)
+        entries = memo.entries
+        value = entries.get(key, memo)
+        if value is not memo:
+            self.hits += 1
+            entries.move_to_end(key)
+            return value
+        self.misses += 1
+        value = self.function.call(interpreter, args)
+        entries[key] = value
+        if len(entries) > memo.maxSize:
+            entries.popitem(last=False)
+        return value
+
+    def arity(self) -> int:
+        return self.function.arity()
+
+    def __repr__(self) -> str:
+        return repr(self.function)
+
+def memoKey(args):
+    # None if an argument is not a plain value. true == 1 and 0 == -0 to
+    # Python but not to Lox, so booleans and zeros are tagged.
+    key = []
+    for arg in args:
+        argType = type(arg)
+        if argType is float:
+            key.append(arg if arg != 0.0 else ('0', str(arg)))
+        elif argType is str or arg is None:
+            key.append(arg)
+        elif argType is Rope:
+            key.append(str(arg))
+        elif argType is bool:
+            key.append(('b', arg))
+        else:
+            return None
+    return tuple(key)
+
+class Memo:
+    # One LRU table of (function, arguments) -> result shared by every
+    # memoized function, holding at most maxSize results.
+    def __init__(self, maxSize: int = DEFAULT_MEMO_SIZE):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.enabled = True
+        self.functions: set = set()
+        self.pureNames: set = set()
+        self.depends: set = set()
+        self.memoized: list[MemoizedFunction] = []
+        self.analyzed = 0
+
+    def analyze(self, statements: list[Stmt]):
+        writes = GlobalWrites()
+        writes.walk(statements)
+        if self.depends & writes.counts.keys():
+            self.enabled = False
+            self.entries.clear()
+        if not self.enabled:
+            return
+        self.pureNames -= writes.counts.keys()
+        candidates = dict()
+        for stmt in statements:
+            if isinstance(stmt, Function) and writes.counts[stmt.name.lexeme] == 1:
+                self.analyzed += 1
+                purity = FunctionPurity().check(stmt)
+                if purity.pure:
+                    candidates[stmt.name.lexeme] = (stmt, purity)
+        # Drop functions depending on anything but pure functions until
+        # nothing changes; mutual recursion between pure functions is fine.
+        changed = True
+        while changed:
+            changed = False
+            for name, (stmt, purity) in list(candidates.items()):
+                if not purity.depends <= candidates.keys() | self.pureNames:
+                    del candidates[name]
+                    changed = True
+        for name, (stmt, purity) in candidates.items():
+            self.pureNames.add(name)
+            self.depends |= purity.depends | {name}
+            if purity.nonTailCalls > 0:
+                self.functions.add(stmt)
+
+    def wrap(self, function: LoxCallable) -> MemoizedFunction:
+        memoized = MemoizedFunction(function, self)
+        self.memoized.append(memoized)
+        return memoized
+
+def printStats(memo: Memo, file=sys.stderr, top: int = 10):
+    hits = sum(function.hits for function in memo.memoized)
+    misses = sum(function.misses for function in memo.memoized)
+    state = '' if memo.enabled else ', disabled after a redefinition'
+    print(f'memo: {len(memo.pureNames)} of {memo.analyzed} functions pure, {len(memo.functions)} memoized, '
+          f'{hits} hits, {misses} misses, {len(memo.entries)}/{memo.maxSize} entries{state}', file=file)
+    busiest = sorted(memo.memoized, key=lambda function: function.hits + function.misses, reverse=True)[:top]
+    for function in busiest:
+        print(f'  {function.function.declaration.name.lexeme:16} {function.hits} hits, {function.misses} misses',
+              file=file)
@@ -1,6 +1,17 @@
 from .LoxCallable import LoxCallable
+from .Rope import Rope, STRING_TYPES, concat
+from .LoxArray import LoxArray
+from array import array
+import math
 import time
 
+class NativeError(Exception):
+    # Raised by a native with just a message. Natives are not told where
+    # they were called from: the engine calling one reports it as a
+    # RuntimeError against the call's paren.
+    def __init__(self, message: str):
+        self.message = message
+
 class ClockNative(LoxCallable):
     def arity(self) -> int:
         return 0
@@ -9,3 +20,240 @@ class ClockNative(LoxCallable):
     def __repr__(self) -> str:
         return '<native fn>'
 
+class LenNative(LoxCallable):
+    # len(string): the number of characters, without flattening a rope.
+    # len(array): the number of elements.
+    def arity(self) -> int:
+        return 1
+    def call(self, interpreter, args):
+        value, = args
+        if type(value) is LoxArray:
+            return float(len(value.values))
+        if not isinstance(value, STRING_TYPES):
+            raise NativeError('Argument must be a string or an array')
+        return float(len(value))
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class SubstrNative(LoxCallable):
+    # substr(string, start, end): the characters from start up to, but not
+    # including, end. Only the pieces of a rope in that range are read.
+    def arity(self) -> int:
+        return 3
+    def call(self, interpreter, args):
+        string, start, end = args
+        if not isinstance(string, STRING_TYPES):
+            raise NativeError('Argument must be a string')
+        if not (isIndex(start) and isIndex(end) and start <= end <= len(string)):
+            raise NativeError('Substring bounds out of range')
+        if type(string) is Rope:
+            return string.slice(int(start), int(end))
+        return string[int(start):int(end)]
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class JoinNative(LoxCallable):
+    # join(a, b): a + b, where a number, boolean or nil is turned into the
+    # text `print` shows for it, so join(s, 1) appends "1.0" to s.
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        left, right = args
+        return concat(joinable(left), joinable(right))
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class ArrayNative(LoxCallable):
+    # Array(length): a new array of numbers (see LoxArray.py), all 0.
+    def arity(self) -> int:
+        return 1
+    def call(self, interpreter, args):
+        length, = args
+        if not isIndex(length):
+            raise NativeError('Array length must be a non-negative integer')
+        return LoxArray.zeros(int(length))
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class GetNative(LoxCallable):
+    # get(array, index)
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        loxArray, index = args
+        values = arrayArgument(loxArray).values
+        return values[indexArgument(index, len(values))]
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class SetNative(LoxCallable):
+    # set(array, index, value): returns value, like an assignment.
+    def arity(self) -> int:
+        return 3
+    def call(self, interpreter, args):
+        loxArray, index, value = args
+        values = arrayArgument(loxArray).values
+        values[indexArgument(index, len(values))] = numberArgument(value)
+        return value
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class PushNative(LoxCallable):
+    # push(array, value): appends value.
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        loxArray, value = args
+        arrayArgument(loxArray).values.append(numberArgument(value))
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class FillNative(LoxCallable):
+    # fill(array, value): sets every element to value and returns the array.
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        loxArray, value = args
+        arrayArgument(loxArray).fill(numberArgument(value))
+        return loxArray
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class SumNative(LoxCallable):
+    # sum(array)
+    def arity(self) -> int:
+        return 1
+    def call(self, interpreter, args):
+        loxArray, = args
+        return arrayArgument(loxArray).sum()
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class DotNative(LoxCallable):
+    # dot(a, b): the sum of the products of a and b's elements.
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        left, right = sameLength(*args)
+        return left.dot(right)
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class ScaleNative(LoxCallable):
+    # scale(array, factor): a new array of every element times factor.
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        loxArray, factor = args
+        return arrayArgument(loxArray).scale(numberArgument(factor))
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class AddNative(LoxCallable):
+    # add(a, b): a new array of the element-wise sums.
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        left, right = sameLength(*args)
+        return left.add(right)
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class MapNative(LoxCallable):
+    # map(array, native): a new array of native(element) for every element.
+    # Only natives can be mapped, since they can be called from any engine;
+    # the math natives below run over the whole buffer in C.
+    def arity(self) -> int:
+        return 2
+    def call(self, interpreter, args):
+        loxArray, function = args
+        values = arrayArgument(loxArray).values
+        if isinstance(function, MathNative):
+            if function.minimum is not None and values and min(values) < function.minimum:
+                raise NativeError(function.domainError)
+            return loxArray.map(function.function, function.ufunc)
+        if not isinstance(function, NATIVE_TYPES) or function.arity() != 1:
+            raise NativeError('Can only map natives that take one argument')
+        results = [function.call(interpreter, [value]) for value in values]
+        return LoxArray(array('d', [numberArgument(value) for value in results]))
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class MathNative(LoxCallable):
+    # A function of one number, also mapped over arrays by map(). `ufunc`
+    # names its NumPy equivalent; arguments below `minimum` are an error.
+    function = None
+    ufunc = None
+    minimum = None
+    domainError = None
+    def arity(self) -> int:
+        return 1
+    def call(self, interpreter, args):
+        value = numberArgument(args[0])
+        if self.minimum is not None and value < self.minimum:
+            raise NativeError(self.domainError)
+        return self.function(value)
+    def __repr__(self) -> str:
+        return '<native fn>'
+
+class SqrtNative(MathNative):
+    function = math.sqrt
+    ufunc = 'sqrt'
+    minimum = 0.0
+    domainError = 'Cannot take the square root of a negative number'
+
+class AbsNative(MathNative):
+    function = abs
+    ufunc = 'absolute'
+
+NATIVES = {
+    'clock': ClockNative,
+    'len': LenNative,
+    'substr': SubstrNative,
+    'join': JoinNative,
+    'Array': ArrayNative,
+    'get': GetNative,
+    'set': SetNative,
+    'push': PushNative,
+    'fill': FillNative,
+    'sum': SumNative,
+    'dot': DotNative,
+    'scale': ScaleNative,
+    'add': AddNative,
+    'map': MapNative,
+    'sqrt': SqrtNative,
+    'abs': AbsNative,
+}
+NATIVE_TYPES = tuple(NATIVES.values())
+
+def isIndex(value) -> bool:
+    return type(value) is float and value >= 0 and value.is_integer()
+
+def arrayArgument(value) -> LoxArray:
+    if type(value) is not LoxArray:
+        raise NativeError('Argument must be an array')
+    return value
+
+def numberArgument(value) -> float:
+    if type(value) is not float:
+        raise NativeError('Argument must be a number')
+    return value
+
+def indexArgument(index, length: int) -> int:
+    if not (isIndex(index) and index < length):
+        raise NativeError('Array index out of range')
+    return int(index)
+
+def sameLength(left, right):
+    arrayArgument(left)
+    arrayArgument(right)
+    if len(left.values) != len(right.values):
+        raise NativeError('Arrays must have the same length')
+    return left, right
+
+def joinable(value):
+    if isinstance(value, STRING_TYPES):
+        return value
+    if value is None or type(value) is float or type(value) is bool:
+        return str(value)
+    raise NativeError('Arguments must be strings, numbers, booleans or nil')
@@ -0,0 +1,161 @@
+from __future__ import annotations
+from .Expr import Expr
+from .Stmt import Stmt
+from .TokenType import Token
+from .RuntimeError import RuntimeError
+from .Environment import Environment
+from .LoxFunction import LoxFunction
+from .LoxClass import LoxClass
+from .LoxInstance import LoxInstance
+from .Interpreter import Interpreter
+
+# Hooks for tools such as coverage, tracing or custom metrics. Subclass
+# Observer, override what you need and pass it to
+# Interpreter.addObserver(). Every hook gets the source line it refers to.
+#
+# An unobserved Interpreter runs exactly as before: addObserver() switches
+# it to TracingInterpreter, which overrides execute() and the declarations,
+# and removeObserver() switches it back once no observer is left.
+# Observed programs run on the tree-walker, so observers can be attached
+# with the tree and closure engines only.
+
+class Observer:
+    def statementExecuted(self, stmt: Stmt, line: int):
+        # Called before the statement runs.
+        pass
+
+    def functionEntered(self, function: LoxFunction, args: list, line: int):
+        # `line` is that of the function's declaration.
+        pass
+
+    def functionExited(self, function: LoxFunction, value, line: int):
+        # Not called when a runtime error unwinds the function. A function
+        # that ends in a tail call exits right after its callee, with the
+        # same value, as if the call were not a tail call.
+        pass
+
+    def instanceCreated(self, instance: LoxInstance, line: int):
+        # Called before the initializer runs; `line` is the calling
+        # statement's.
+        pass
+
+    def runtimeErrorRaised(self, error: RuntimeError, line: int):
+        pass
+
+def firstLine(node) -> int:
+    # Line of the first token in the node, or 0 if it has none (`print 1;`).
+    # Quickened nodes (see Quickening.py) have the fields of their generic class.
+    for name in getattr(node, 'generic', type(node)).__slots__:
+        value = getattr(node, name)
+        for child in value if isinstance(value, list) else (value,):
+            if isinstance(child, Token):
+                return child.line
+            if isinstance(child, (Expr, Stmt)):
+                line = firstLine(child)
+                if line:
+                    return line
+    return 0
+
+class ObservedFunction(LoxFunction):
+    __slots__ = ()
+
+    def call(self, interpreter, args):
+        line = interpreter.line
+        for observer in interpreter.observers:
+            observer.functionEntered(self, args, self.declaration.name.line)
+        tailCallers = len(interpreter.tailCallers)
+        value = super().call(interpreter, args)
+        interpreter.line = line
+        self.exited(interpreter, tailCallers, value)
+        return value
+
+    def callBound(self, interpreter, instance, args):
+        line = interpreter.line
+        for observer in interpreter.observers:
+            observer.functionEntered(self, args, self.declaration.name.line)
+        tailCallers = len(interpreter.tailCallers)
+        value = super().callBound(interpreter, instance, args)
+        interpreter.line = line
+        self.exited(interpreter, tailCallers, value)
+        return value
+
+    def execute(self, interpreter, environment: Environment):
+        # Run by the trampoline for a tail call. A function that hands over
+        # to another tail call exits when the call that started the chain
+        # returns, see exited().
+        for observer in interpreter.observers:
+            observer.functionEntered(self, environment.slots, self.declaration.name.line)
+        completion = super().execute(interpreter, environment)
+        if completion is not None and len(completion) == 3:
+            interpreter.tailCallers.append(self)
+            return completion
+        value = completion[0] if completion is not None else None
+        for observer in interpreter.observers:
+            observer.functionExited(self, value, self.declaration.name.line)
+        return completion
+
+    def exited(self, interpreter, tailCallers: int, value):
+        # This call's value is also that of the tail calls it went through,
+        # which exit first, innermost first.
+        pending = interpreter.tailCallers
+        functions = pending[tailCallers:][::-1]
+        del pending[tailCallers:]
+        functions.append(self)
+        for function in functions:
+            for observer in interpreter.observers:
+                observer.functionExited(function, value, function.declaration.name.line)
+
+    def bind(self, instance: LoxInstance):
+        environment = Environment(self.closure)
+        environment.define("this", instance)
+        return ObservedFunction(self.declaration, environment, self.isInitializer)
+
+class ObservedClass(LoxClass):
+    def call(self, interpreter, args):
+        instance = LoxInstance(self)
+        for observer in interpreter.observers:
+            observer.instanceCreated(instance, interpreter.line)
+        initializer = self.initializer
+        if initializer is not None:
+            initializer.callBound(interpreter, instance, args)
+        return instance
+
+class TracingInterpreter(Interpreter):
+    functionType = ObservedFunction
+    classType = ObservedClass
+
+    def interpret(self, statements: list[Stmt]):
+        if self.memo is not None:
+            self.memo.analyze(statements)
+        try:
+            for stmt in statements:
+                self.execute(stmt)
+        except RuntimeError as e:
+            self.runtimeFailed(e)
+        except RecursionError as e:
+            self.runtimeFailed(self.stackOverflow(e))
+
+    def runtimeFailed(self, error: RuntimeError):
+        for observer in self.observers:
+            observer.runtimeErrorRaised(error, error.token.line)
+        # The error unwound the calls these were waiting on.
+        self.tailCallers.clear()
+        super().runtimeFailed(error)
+
+    def execute(self, statement: Stmt):
+        line = firstLine(statement)
+        if line:
+            self.line = line
+        for observer in self.observers:
+            observer.statementExecuted(statement, self.line)
+        return statement.accept(self)
+
+    def executeBlock(self, statements: list[Stmt], environment: Environment):
+        previous = self.environment
+        self.environment = environment
+        for statement in statements:
+            completion = self.execute(statement)
+            if completion is not None:
+                self.environment = previous
+                return completion
+        self.environment = previous
@@ -0,0 +1,388 @@
+from __future__ import annotations
+import sys
+from .Expr import *
+from .Stmt import *
+from .TokenType import TokenType
+from .Interpreter import isEqual
+
+# Static optimizations on a resolved AST, run before the program is handed to
+# an engine. Only rewrites that cannot change what the program prints or
+# which errors it reports are made: an operation that would fail at runtime
+# (1 / 0, "a" - 1, ...) is left for the engine to report. The tree is
+# changed in place; removed declarations shift the slots of later locals, so
+# the result has to be resolved again.
+
+class Binding:
+    def __init__(self, name: str):
+        self.name = name
+        self.reads = 0
+        self.assigned = False
+        # Read somewhere the optimizer cannot substitute a literal, like the
+        # superclass of a class declaration.
+        self.pinned = False
+        self.constant: Literal = None
+
+class BindingAnalyzer(ExprVisitor, StmtVisitor):
+    # Mirrors the Resolver's scopes and uses its depths to count the reads
+    # and assignments of every local declaration.
+    def __init__(self):
+        self.scopes: list[dict] = []
+        self.bindings: dict = dict()
+
+    def analyze(self, statements: list[Stmt]):
+        for stmt in statements:
+            stmt.accept(self)
+
+    def declare(self, node, name: str):
+        if not self.scopes:
+            return
+        binding = Binding(name)
+        self.scopes[-1][name] = binding
+        if node is not None:
+            self.bindings[node] = binding
+
+    def reference(self, expr: Expr, name: str) -> Binding:
+        if expr.depth is None:
+            return None
+        binding = self.scopes[-1 - expr.depth][name]
+        self.bindings[expr] = binding
+        return binding
+
+    def visitBlockStmt(self, stmt: Block):
+        self.scopes.append(dict())
+        self.analyze(stmt.statements)
+        self.scopes.pop()
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer:
+            stmt.initializer.accept(self)
+        self.declare(stmt, stmt.name.lexeme)
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.declare(stmt, stmt.name.lexeme)
+        self.function(stmt)
+
+    def function(self, stmt: Function):
+        self.scopes.append(dict())
+        for param in stmt.params:
+            self.declare(None, param.lexeme)
+        self.analyze(stmt.body)
+        self.scopes.pop()
+
+    def visitClassStmt(self, stmt: Class):
+        self.declare(None, stmt.name.lexeme)
+        if stmt.superclass is not None:
+            binding = self.reference(stmt.superclass, stmt.superclass.name.lexeme)
+            if binding is not None:
+                binding.pinned = True
+            self.scopes.append({'super': Binding('super')})
+        self.scopes.append({'this': Binding('this')})
+        for method in stmt.methods:
+            self.function(method)
+        self.scopes.pop()
+        if stmt.superclass is not None:
+            self.scopes.pop()
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression.accept(self)
+
+    def visitIfStmt(self, stmt: If):
+        stmt.condition.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch:
+            stmt.elseBranch.accept(self)
+
+    def visitPrintStmt(self, stmt: Print):
+        stmt.expression.accept(self)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value:
+            stmt.value.accept(self)
+
+    def visitWhileStmt(self, stmt: While):
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitCallExpr(self, expr: Call):
+        expr.callee.accept(self)
+        for arg in expr.args:
+            arg.accept(self)
+
+    def visitGetExpr(self, expr: Get):
+        expr.object.accept(self)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        expr.expression.accept(self)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitSetExpr(self, expr: Set):
+        expr.value.accept(self)
+        expr.object.accept(self)
+
+    def visitSuperExpr(self, expr: Super):
+        pass
+
+    def visitThisExpr(self, expr: This):
+        pass
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right.accept(self)
+
+    def visitVariableExpr(self, expr: Variable):
+        binding = self.reference(expr, expr.name.lexeme)
+        if binding is not None:
+            binding.reads += 1
+
+    def visitAssignExpr(self, expr: Assign):
+        expr.value.accept(self)
+        binding = self.reference(expr, expr.name.lexeme)
+        if binding is not None:
+            binding.assigned = True
+
+def countNodes(node) -> int:
+    if isinstance(node, list):
+        return sum(countNodes(child) for child in node)
+    if not isinstance(node, (Expr, Stmt)):
+        return 0
+    return 1 + sum(countNodes(getattr(node, name)) for name in type(node).__slots__)
+
+def isTruthy(value) -> bool:
+    return value is not None and value is not False
+
+class Optimizer(ExprVisitor, StmtVisitor):
+    # -O1: constant folding, propagation of locals that are never assigned,
+    # removal of dead branches and loops, and of unused local declarations
+    # that have no side effects.
+    def __init__(self, level: int = 1):
+        self.level = level
+        self.bindings: dict = dict()
+        self.nodesBefore = 0
+        self.nodesAfter = 0
+        self.folded = 0
+        self.propagated = 0
+        self.branches = 0
+        self.loops = 0
+        self.declarations = 0
+        self.statements = 0
+
+    def optimize(self, statements: list[Stmt]) -> list[Stmt]:
+        self.nodesBefore += countNodes(statements)
+        analyzer = BindingAnalyzer()
+        analyzer.analyze(statements)
+        self.bindings = analyzer.bindings
+        statements = self.optimizeStmts(statements)
+        self.bindings = dict()
+        self.nodesAfter += countNodes(statements)
+        return statements
+
+    def optimizeStmts(self, statements: list[Stmt]) -> list[Stmt]:
+        optimized = []
+        for stmt in statements:
+            stmt = stmt.accept(self)
+            if stmt is not None:
+                optimized.append(stmt)
+        return optimized
+
+    def optimizeBranch(self, stmt: Stmt) -> Stmt:
+        # A branch or loop body has to stay a statement.
+        stmt = stmt.accept(self)
+        return Block([]) if stmt is None else stmt
+
+    def expr(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    def fold(self, value) -> Literal:
+        self.folded += 1
+        return Literal(value)
+
+    def isPure(self, expr: Expr) -> bool:
+        # Evaluating it can neither fail nor have side effects.
+        if isinstance(expr, Literal):
+            return True
+        return isinstance(expr, Variable) and expr.depth is not None
+
+    def visitBlockStmt(self, stmt: Block):
+        stmt.statements = self.optimizeStmts(stmt.statements)
+        if not stmt.statements:
+            self.statements += 1
+            return None
+        return stmt
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer:
+            stmt.initializer = self.expr(stmt.initializer)
+        binding = self.bindings.get(stmt)
+        if binding is None or binding.assigned or binding.pinned:
+            return stmt
+        if stmt.initializer is None or isinstance(stmt.initializer, Literal):
+            # Every read becomes the literal, so the declaration goes away.
+            binding.constant = stmt.initializer or Literal(None)
+            self.declarations += 1
+            return None
+        if binding.reads == 0 and self.isPure(stmt.initializer):
+            self.declarations += 1
+            return None
+        return stmt
+
+    def visitFunctionStmt(self, stmt: Function):
+        binding = self.bindings.get(stmt)
+        if binding is not None and binding.reads == 0 and not binding.assigned:
+            self.declarations += 1
+            return None
+        stmt.body = self.optimizeStmts(stmt.body)
+        return stmt
+
+    def visitClassStmt(self, stmt: Class):
+        for method in stmt.methods:
+            method.body = self.optimizeStmts(method.body)
+        return stmt
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression = self.expr(stmt.expression)
+        if self.isPure(stmt.expression):
+            self.statements += 1
+            return None
+        return stmt
+
+    def visitIfStmt(self, stmt: If):
+        stmt.condition = self.expr(stmt.condition)
+        if isinstance(stmt.condition, Literal):
+            self.branches += 1
+            if isTruthy(stmt.condition.value):
+                return stmt.thenBranch.accept(self)
+            if stmt.elseBranch:
+                return stmt.elseBranch.accept(self)
+            return None
+        stmt.thenBranch = self.optimizeBranch(stmt.thenBranch)
+        if stmt.elseBranch:
+            stmt.elseBranch = stmt.elseBranch.accept(self)
+        return stmt
+
+    def visitPrintStmt(self, stmt: Print):
+        stmt.expression = self.expr(stmt.expression)
+        return stmt
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value:
+            stmt.value = self.expr(stmt.value)
+        return stmt
+
+    def visitWhileStmt(self, stmt: While):
+        stmt.condition = self.expr(stmt.condition)
+        if isinstance(stmt.condition, Literal) and not isTruthy(stmt.condition.value):
+            self.loops += 1
+            return None
+        stmt.body = self.optimizeBranch(stmt.body)
+        return stmt
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        if not (isinstance(expr.left, Literal) and isinstance(expr.right, Literal)):
+            return expr
+        left = expr.left.value
+        right = expr.right.value
+        opType = expr.operator.type
+        if opType is TokenType.EQUAL_EQUAL:
+            return self.fold(isEqual(left, right))
+        if opType is TokenType.BANG_EQUAL:
+            return self.fold(not isEqual(left, right))
+        if opType is TokenType.PLUS and type(left) is type(right) is str:
+            return self.fold(left + right)
+        if not (type(left) is type(right) is float):
+            return expr
+        if opType is TokenType.PLUS:
+            return self.fold(left + right)
+        if opType is TokenType.MINUS:
+            return self.fold(left - right)
+        if opType is TokenType.STAR:
+            return self.fold(left * right)
+        if opType is TokenType.SLASH and right != 0:
+            return self.fold(left / right)
+        if opType is TokenType.GREATER:
+            return self.fold(left > right)
+        if opType is TokenType.GREATER_EQUAL:
+            return self.fold(left >= right)
+        if opType is TokenType.LESS:
+            return self.fold(left < right)
+        if opType is TokenType.LESS_EQUAL:
+            return self.fold(left <= right)
+        return expr
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right = self.expr(expr.right)
+        if not isinstance(expr.right, Literal):
+            return expr
+        value = expr.right.value
+        if expr.operator.type is TokenType.BANG:
+            return self.fold(not isTruthy(value))
+        if expr.operator.type is TokenType.MINUS and type(value) is float:
+            return self.fold(value * -1.0)
+        return expr
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        if not isinstance(expr.left, Literal):
+            return expr
+        self.folded += 1
+        if isTruthy(expr.left.value) == (expr.operator.type is TokenType.OR):
+            return expr.left
+        return expr.right
+
+    def visitGroupingExpr(self, expr: Grouping):
+        expr.expression = self.expr(expr.expression)
+        if isinstance(expr.expression, Literal):
+            self.folded += 1
+            return expr.expression
+        return expr
+
+    def visitLiteralExpr(self, expr: Literal):
+        return expr
+
+    def visitVariableExpr(self, expr: Variable):
+        binding = self.bindings.get(expr)
+        if binding is not None and binding.constant is not None:
+            self.propagated += 1
+            return Literal(binding.constant.value)
+        return expr
+
+    def visitAssignExpr(self, expr: Assign):
+        expr.value = self.expr(expr.value)
+        return expr
+
+    def visitCallExpr(self, expr: Call):
+        expr.callee = self.expr(expr.callee)
+        expr.args = [self.expr(arg) for arg in expr.args]
+        return expr
+
+    def visitGetExpr(self, expr: Get):
+        expr.object = self.expr(expr.object)
+        return expr
+
+    def visitSetExpr(self, expr: Set):
+        expr.value = self.expr(expr.value)
+        expr.object = self.expr(expr.object)
+        return expr
+
+    def visitSuperExpr(self, expr: Super):
+        return expr
+
+    def visitThisExpr(self, expr: This):
+        return expr
+
+def printStats(optimizer: Optimizer, file=sys.stderr):
+    print(f'optimizer (-O{optimizer.level}): {optimizer.nodesBefore} -> {optimizer.nodesAfter} nodes, '
+          f'{optimizer.folded} folded, {optimizer.propagated} propagated', file=file)
+    print(f'  removed {optimizer.branches} dead branches, {optimizer.loops} dead loops, '
+          f'{optimizer.declarations} declarations, {optimizer.statements} statements', file=file)
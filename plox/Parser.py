@@ -1,12 +1,20 @@
-from typing import List
+from __future__ import annotations
+from collections.abc import Iterable
 from .Expr import Expr, Logical
 from .TokenType import *
 from . import Util
 from .Stmt import *
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
-        self.tokens = tokens
+    # `tokens` is either the full token list or an iterator that is pulled
+    # from as the parser needs more lookahead.
+    def __init__(self, tokens: Iterable[Token]):
+        if isinstance(tokens, list):
+            self.tokens = tokens
+            self.stream = None
+        else:
+            self.tokens = list()
+            self.stream = iter(tokens)
         self.current = 0
         self.hadError = False
 
@@ -16,6 +24,16 @@ class Parser:
             statements.append(self.declaration())
         return statements
 
+    def declarations(self):
+        # Yields top-level declarations one at a time. Tokens of a finished
+        # declaration are dropped, so only the one being parsed is held.
+        while not self.isAtEnd():
+            statement = self.declaration()
+            if self.current > 1:
+                del self.tokens[:self.current - 1]
+                self.current = 1
+            yield statement
+
     def declaration(self):
         try:
             if self.match(TokenType.CLASS):
@@ -337,6 +355,8 @@ class Parser:
         return self.peek().type == TokenType.EOF
 
     def peek(self):
+        if self.current == len(self.tokens):
+            self.tokens.append(next(self.stream))
         return self.tokens[self.current]
 
     def previous(self):
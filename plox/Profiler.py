@@ -0,0 +1,131 @@
+import sys
+import json
+from time import perf_counter
+from .LoxCallable import LoxCallable
+from .LoxFunction import LoxFunction
+from .LoxClass import LoxClass
+
+# Per-function call counts and wall time (--profile). Nothing is checked on
+# the call paths of an unprofiled run: install() swaps timed wrappers in for
+# the call methods of Lox functions, classes and natives, and uninstall()
+# puts the originals back.
+#
+# Inclusive time covers a call and everything it calls, and is only counted
+# for the outermost of recursive calls. Exclusive time leaves out the time
+# spent in profiled callees. The functions run by a tail call count as
+# callees of the function being returned from.
+
+class Profiler:
+    def __init__(self):
+        # key -> [calls, inclusive, exclusive]
+        self.stats = dict()
+        # key -> (name, line), for keys that are not Function statements.
+        self.labels = dict()
+        # Time spent in the callees of each running profiled call.
+        self.children = []
+        self.active = dict()
+        self.originals = []
+
+    def install(self, interpreter):
+        if interpreter.engine not in ('tree', 'closure'):
+            raise ValueError(f'profiling is not supported by the {interpreter.engine} engine')
+        declaration = lambda function: function.declaration
+        itself = lambda callable: callable
+        classes = [LoxFunction]
+        if interpreter.engine == 'closure':
+            from .ClosureCompiler import ClosureFunction
+            classes.append(ClosureFunction)
+        for cls in classes:
+            for name in ('call', 'callBound', 'execute'):
+                self.instrument(cls, name, declaration)
+        self.instrument(LoxClass, 'call', itself)
+        self.labelClasses()
+        for name, value in interpreter.globals.values.items():
+            if isinstance(value, LoxCallable) and not isinstance(value, (LoxFunction, LoxClass)):
+                self.labels[value] = (name, 0)
+                if 'call' in type(value).__dict__:
+                    self.instrument(type(value), 'call', itself)
+
+    def uninstall(self):
+        for cls, name, original in reversed(self.originals):
+            setattr(cls, name, original)
+        self.originals.clear()
+
+    def instrument(self, cls, name: str, keyOf):
+        original = cls.__dict__[name]
+        self.originals.append((cls, name, original))
+        stats = self.stats
+        children = self.children
+        active = self.active
+        def profiled(callee, *args):
+            key = keyOf(callee)
+            depth = active.get(key, 0)
+            active[key] = depth + 1
+            children.append(0.0)
+            start = perf_counter()
+            try:
+                return original(callee, *args)
+            finally:
+                elapsed = perf_counter() - start
+                inner = children.pop()
+                if children:
+                    children[-1] += elapsed
+                active[key] = depth
+                entry = stats.get(key)
+                if entry is None:
+                    entry = stats[key] = [0, 0.0, 0.0]
+                entry[0] += 1
+                if depth == 0:
+                    entry[1] += elapsed
+                entry[2] += elapsed - inner
+        setattr(cls, name, profiled)
+
+    def labelClasses(self):
+        # Names methods Class.method, and classes after the line of their
+        # declaration.
+        labels = self.labels
+        original = LoxClass.__dict__['__init__']
+        self.originals.append((LoxClass, '__init__', original))
+        def __init__(klass, name, superclass, methods, line=0):
+            original(klass, name, superclass, methods, line)
+            labels[klass] = (name, line)
+            for methodName, method in methods.items():
+                labels[method.declaration] = (f'{name}.{methodName}', method.declaration.name.line)
+        LoxClass.__init__ = __init__
+
+    def label(self, key):
+        label = self.labels.get(key)
+        if label is None:
+            return key.name.lexeme, key.name.line
+        return label
+
+    def report(self):
+        # One row per name and line: functions declared again by a later
+        # REPL line or streamed declaration are added up.
+        rows = dict()
+        for key, (calls, inclusive, exclusive) in self.stats.items():
+            row = rows.setdefault(self.label(key), [0, 0.0, 0.0])
+            row[0] += calls
+            row[1] += inclusive
+            row[2] += exclusive
+        return sorted(
+            ({'name': name, 'line': line, 'calls': calls, 'inclusive': inclusive, 'exclusive': exclusive}
+             for (name, line), (calls, inclusive, exclusive) in rows.items()),
+            key=lambda row: row['exclusive'], reverse=True)
+
+def printReport(profiler: Profiler, file=sys.stderr, top: int = 20):
+    rows = profiler.report()
+    total = sum(row['exclusive'] for row in rows)
+    print(f'profile: {len(rows)} functions, {sum(row["calls"] for row in rows)} calls, '
+          f'{total:.3f}s in profiled calls', file=file)
+    print(f'  {"calls":>10} {"inclusive":>10} {"exclusive":>10} {"per call":>10}  function', file=file)
+    for row in rows[:top]:
+        perCall = row['exclusive'] / row['calls'] * 1000.0
+        line = f' [Line {row["line"]}]' if row['line'] else ' [native]'
+        print(f'  {row["calls"]:>10} {row["inclusive"]:>9.3f}s {row["exclusive"]:>9.3f}s {perCall:>8.3f}ms  '
+              f'{row["name"]}{line}', file=file)
+
+def writeJson(profiler: Profiler, path: str):
+    with open(path, 'w') as f:
+        json.dump({'functions': profiler.report()}, f, indent=2)
+        f.write('\n')
@@ -0,0 +1,841 @@
+from __future__ import annotations
+import math
+from .Expr import *
+from .Stmt import *
+from .TokenType import Token, TokenType
+
+# Lox -> Python source. Lox functions become Python functions and Lox classes
+# become Python classes deriving from PythonRuntime._LoxObject. Every local
+# declaration gets its own Python name, so block scoping and shadowing need
+# no runtime support, and variables captured by closures become ordinary
+# Python closure cells. The one semantic gap is a variable declared inside a
+# loop body and captured by a closure: Lox creates a fresh variable on every
+# iteration, so such variables are "boxed" in a one element list and handed
+# to closures as keyword-only defaults, which are bound at definition time.
+
+class Binding:
+    def __init__(self, name: str, pyName: str, function, inLoop: bool):
+        self.name = name
+        self.pyName = pyName
+        self.function: FunctionInfo = function
+        self.inLoop = inLoop
+        self.captured = False
+        self.isGlobal = False
+        self.isSuper = False
+
+    @property
+    def boxed(self) -> bool:
+        return self.captured and self.inLoop
+
+    def storage(self) -> str:
+        if self.boxed:
+            return 'b' + self.pyName[1:]
+        return self.pyName
+
+class FunctionInfo:
+    def __init__(self, parent, declaration: Function):
+        self.parent: FunctionInfo = parent
+        self.declaration = declaration
+        # Bindings of enclosing functions used here or in nested functions.
+        self.free: list[Binding] = []
+        # Bindings of enclosing functions (or globals) assigned here.
+        self.assigns: list[Binding] = []
+
+    def addFree(self, binding: Binding):
+        if binding not in self.free:
+            self.free.append(binding)
+
+    def addAssign(self, binding: Binding):
+        if binding not in self.assigns:
+            self.assigns.append(binding)
+
+class ScopeAnalyzer(ExprVisitor, StmtVisitor):
+    # Mirrors the Resolver's scopes and uses its depths to bind every
+    # variable reference to the declaration it refers to.
+    def __init__(self, generator):
+        self.generator = generator
+        self.scopes: list[dict] = []
+        self.function: FunctionInfo = None
+        self.loopDepth = 0
+        self.bindings: dict = dict()
+        self.functions: dict[Function, FunctionInfo] = dict()
+        self.supers: dict[Class, Binding] = dict()
+        self.globals: dict[str, Binding] = dict()
+        self.assignedGlobals = set()
+        self.declaredGlobals = set()
+
+    def analyze(self, statements: list[Stmt]):
+        for stmt in statements:
+            stmt.accept(self)
+
+    def globalBinding(self, name: str) -> Binding:
+        binding = self.globals.get(name)
+        if binding is None:
+            binding = Binding(name, f'l_{name}', None, False)
+            binding.isGlobal = True
+            self.globals[name] = binding
+        return binding
+
+    def declare(self, node, name: str) -> Binding:
+        if not self.scopes:
+            self.declaredGlobals.add(name)
+            binding = self.globalBinding(name)
+        else:
+            binding = Binding(name, self.generator.localName(name), self.function, self.loopDepth > 0)
+            self.scopes[-1][name] = binding
+        self.bindings[node] = binding
+        return binding
+
+    def reference(self, expr: Expr, name: str, assign: bool = False):
+        if expr.depth is None:
+            binding = self.globalBinding(name)
+            if assign:
+                self.assignedGlobals.add(name)
+        else:
+            binding = self.scopes[-1 - expr.depth][name]
+        self.bindings[expr] = binding
+        if binding.isGlobal:
+            if assign and self.function is not None:
+                self.function.addAssign(binding)
+            return
+        if binding.function is not self.function:
+            binding.captured = True
+            function = self.function
+            while function is not binding.function:
+                function.addFree(binding)
+                function = function.parent
+            if assign:
+                self.function.addAssign(binding)
+
+    def visitBlockStmt(self, stmt: Block):
+        self.scopes.append(dict())
+        self.analyze(stmt.statements)
+        self.scopes.pop()
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer:
+            stmt.initializer.accept(self)
+        self.declare(stmt, stmt.name.lexeme)
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.declare(stmt, stmt.name.lexeme)
+        self.function_(stmt)
+
+    def function_(self, stmt: Function):
+        info = FunctionInfo(self.function, stmt)
+        self.functions[stmt] = info
+        enclosing, enclosingLoopDepth = self.function, self.loopDepth
+        self.function, self.loopDepth = info, 0
+        self.scopes.append(dict())
+        for param in stmt.params:
+            self.declare(param, param.lexeme)
+        self.analyze(stmt.body)
+        self.scopes.pop()
+        self.function, self.loopDepth = enclosing, enclosingLoopDepth
+
+    def visitClassStmt(self, stmt: Class):
+        self.declare(stmt, stmt.name.lexeme)
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+            superBinding = Binding('super', self.generator.superName(), self.function, False)
+            superBinding.isSuper = True
+            self.supers[stmt] = superBinding
+            self.scopes.append({'super': superBinding})
+        this = Binding('this', 'self', self.function, False)
+        self.scopes.append({'this': this})
+        for method in stmt.methods:
+            self.function_(method)
+        self.scopes.pop()
+        if stmt.superclass is not None:
+            self.scopes.pop()
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression.accept(self)
+
+    def visitPrintStmt(self, stmt: Print):
+        stmt.expression.accept(self)
+
+    def visitIfStmt(self, stmt: If):
+        stmt.condition.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch:
+            stmt.elseBranch.accept(self)
+
+    def visitWhileStmt(self, stmt: While):
+        self.loopDepth += 1
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+        self.loopDepth -= 1
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value:
+            stmt.value.accept(self)
+
+    def visitVariableExpr(self, expr: Variable):
+        self.reference(expr, expr.name.lexeme)
+
+    def visitAssignExpr(self, expr: Assign):
+        expr.value.accept(self)
+        self.reference(expr, expr.name.lexeme, assign=True)
+
+    def visitThisExpr(self, expr: This):
+        self.reference(expr, 'this')
+
+    def visitSuperExpr(self, expr: Super):
+        self.reference(expr, 'super')
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right.accept(self)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        expr.expression.accept(self)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitCallExpr(self, expr: Call):
+        expr.callee.accept(self)
+        for arg in expr.args:
+            arg.accept(self)
+
+    def visitGetExpr(self, expr: Get):
+        expr.object.accept(self)
+
+    def visitSetExpr(self, expr: Set):
+        expr.object.accept(self)
+        expr.value.accept(self)
+
+def tailCalls(statements: list[Stmt]):
+    # The `return f(...)` statements of a function body that are not inside
+    # a loop or a nested function.
+    for stmt in statements:
+        if isinstance(stmt, Return) and stmt.tail:
+            yield stmt
+        elif isinstance(stmt, Block):
+            yield from tailCalls(stmt.statements)
+        elif isinstance(stmt, If):
+            yield from tailCalls([stmt.thenBranch] + ([stmt.elseBranch] if stmt.elseBranch else []))
+
+def declaresFunctions(statements: list[Stmt]) -> bool:
+    for stmt in statements:
+        if isinstance(stmt, (Function, Class)):
+            return True
+        if isinstance(stmt, Block) and declaresFunctions(stmt.statements):
+            return True
+        if isinstance(stmt, If) and declaresFunctions(
+                [stmt.thenBranch] + ([stmt.elseBranch] if stmt.elseBranch else [])):
+            return True
+        if isinstance(stmt, While) and declaresFunctions([stmt.body]):
+            return True
+    return False
+
+class TailLoop:
+    # A function whose calls to itself in tail position become a jump back
+    # to the top of its body: the body runs in `while True`, and a call site
+    # checks that the callee really is this function (held in the global
+    # `ref`) before rebinding the parameters and continuing.
+    def __init__(self, ref: str, params: list[str], sites: set):
+        self.ref = ref
+        self.params = params
+        self.sites = sites
+
+class HoistedLoop:
+    # A loop nested too deeply for Python (see MAX_LOOP_NESTING), emitted as
+    # a local function that is called straight away. Lox variables it binds
+    # are recorded so that the function can declare the ones it does not
+    # own nonlocal or global. A Lox `return` inside it returns a one element
+    # tuple, which the call site returns from the Lox function.
+    def __init__(self, enclosing):
+        self.enclosing: HoistedLoop = enclosing
+        self.declared = set()
+        self.assigned: dict[str, Binding] = dict()
+
+class Code:
+    # A generated expression: its source, the Lox type it is statically
+    # known to have (None if unknown), and whether it may be evaluated more
+    # than once without changing behaviour.
+    def __init__(self, text: str, kind: str = None, simple: bool = False):
+        self.text = text
+        self.kind = kind
+        self.simple = simple
+
+NUMERIC_OPS = {
+    TokenType.MINUS: '-',
+    TokenType.STAR: '*',
+    TokenType.GREATER: '>',
+    TokenType.GREATER_EQUAL: '>=',
+    TokenType.LESS: '<',
+    TokenType.LESS_EQUAL: '<=',
+}
+COMPARISONS = (TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL)
+
+# Loops nested in one Python function before the next one is hoisted into a
+# function of its own: CPython rejects more than 20 nested blocks.
+MAX_LOOP_NESTING = 16
+
+class PythonGenerator(ExprVisitor, StmtVisitor):
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.localCount = 0
+        self.superCount = 0
+        self.selfCount = 0
+        self.loopCount = 0
+        self.serial = 0
+
+    def localName(self, name: str) -> str:
+        self.localCount += 1
+        return f'l{self.localCount}_{name}'
+
+    def superName(self) -> str:
+        self.superCount += 1
+        return f'_s{self.superCount}'
+
+    def selfName(self) -> str:
+        self.selfCount += 1
+        return f'_r{self.selfCount}'
+
+    def generate(self, statements: list[Stmt], knownGlobals=()):
+        self.serial += 1
+        self.filename = f'<lox-python-{self.serial}>'
+        self.analyzer = ScopeAnalyzer(self)
+        self.analyzer.analyze(statements)
+        self.knownGlobals = set(knownGlobals) | {f'l_{name}' for name in self.analyzer.declaredGlobals}
+        self.lines: list[str] = []
+        self.lineTokens: dict[int, list] = dict()
+        self.pending: list[tuple] = []
+        self.tokenTable: list[Token] = []
+        self.tokenIndex: dict[int, int] = dict()
+        self.indent = 0
+        self.depth = 0
+        self.function: FunctionInfo = None
+        self.functionKind = None
+        self.tailLoop: TailLoop = None
+        # Loops nested in the Python function being emitted.
+        self.loops = 0
+        self.hoisted: HoistedLoop = None
+
+        for stmt in statements:
+            self.emitStmt(stmt)
+
+        table = ', '.join(
+            f'({token.type.name!r}, {token.lexeme!r}, {token.line})' for token in self.tokenTable)
+        header = [
+            f'# Generated by plox from Lox source; natives (l_clock, ...) are bound by the runner.',
+            'from plox.PythonRuntime import *',
+            f'_k{self.serial} = _tokens(({table}{"," if len(self.tokenTable) == 1 else ""}))',
+        ]
+        source = '\n'.join(header + self.lines) + '\n'
+        lineTokens = {line + len(header): tokens for line, tokens in self.lineTokens.items()}
+        return source, lineTokens
+
+    # Output helpers
+
+    def emit(self, line: str):
+        self.lines.append('    ' * self.indent + line)
+        if self.pending:
+            self.lineTokens[len(self.lines)] = self.pending
+            self.pending = []
+
+    def emitBody(self, statements):
+        self.indent += 1
+        before = len(self.lines)
+        for stmt in statements:
+            self.emitStmt(stmt)
+        if len(self.lines) == before:
+            self.emit('pass')
+        self.indent -= 1
+
+    def token(self, token: Token) -> str:
+        index = self.tokenIndex.get(id(token))
+        if index is None:
+            index = len(self.tokenTable)
+            self.tokenTable.append(token)
+            self.tokenIndex[id(token)] = index
+        return f'_k{self.serial}[{index}]'
+
+    def temp(self, prefix: str) -> str:
+        return f'_{prefix}{self.depth}'
+
+    def expr(self, expr: Expr) -> Code:
+        self.depth += 1
+        try:
+            return expr.accept(self)
+        finally:
+            self.depth -= 1
+
+    def emitStmt(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def truthy(self, expr: Expr) -> str:
+        return self.test(self.expr(expr))[1]
+
+    def test(self, code: Code):
+        # Returns (value, test): `test` decides Lox truthiness of the code
+        # and `value` refers to its result afterwards.
+        if code.kind == 'bool':
+            return code.text, code.text
+        if code.kind in ('num', 'str') and code.simple:
+            return code.text, 'True'
+        if code.kind == 'nil':
+            return code.text, 'False'
+        if code.simple:
+            return code.text, f'({code.text} is not None and {code.text} is not False)'
+        value = self.temp('v')
+        return value, f'(({value} := {code.text}) is not None and {value} is not False)'
+
+    def isPure(self, expr: Expr) -> bool:
+        # No calls or assignments: evaluating it cannot change any variable.
+        if isinstance(expr, (Literal, Variable, This, Super)):
+            return True
+        if isinstance(expr, Grouping):
+            return self.isPure(expr.expression)
+        if isinstance(expr, Unary):
+            return self.isPure(expr.right)
+        if isinstance(expr, (Binary, Logical)):
+            return self.isPure(expr.left) and self.isPure(expr.right)
+        if isinstance(expr, Get):
+            return self.isPure(expr.object)
+        return False
+
+    # Variables
+
+    def read(self, binding: Binding, token: Token) -> Code:
+        if binding.isGlobal:
+            self.pending.append(('var', token))
+            return Code(binding.pyName, simple=True)
+        if binding.boxed:
+            return Code(f'{binding.storage()}[0]', simple=True)
+        return Code(binding.pyName, simple=True)
+
+    def write(self, binding: Binding, value: str, token: Token, statement: bool) -> str:
+        if binding.boxed:
+            if statement:
+                return f'{binding.storage()}[0] = {value}'
+            return f'_setbox({binding.storage()}, {value})'
+        if binding.isGlobal and binding.pyName not in self.knownGlobals:
+            return f'_assignGlobal(globals(), {binding.pyName!r}, {value}, {self.token(token)})'
+        if self.hoisted is not None:
+            self.hoisted.assigned[binding.pyName] = binding
+        if statement:
+            return f'{binding.pyName} = {value}'
+        return f'({binding.pyName} := {value})'
+
+    def bind(self, *names: str):
+        # Names declared by the code being emitted.
+        if self.hoisted is not None:
+            self.hoisted.declared.update(names)
+
+    def declare(self, binding: Binding, value: str):
+        self.bind(binding.storage())
+        if binding.boxed:
+            self.emit(f'{binding.storage()} = [{value}]')
+        else:
+            self.emit(f'{binding.pyName} = {value}')
+
+    # Statements
+
+    def visitExpressionStmt(self, stmt: Expression):
+        expression = stmt.expression
+        if isinstance(expression, Assign):
+            value = self.expr(expression.value)
+            binding = self.analyzer.bindings[expression]
+            self.emit(self.write(binding, value.text, expression.name, statement=True))
+            return
+        if isinstance(expression, Set):
+            self.emitSet(expression)
+            return
+        self.emit(self.expr(expression).text)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.emit(f'_print({self.expr(stmt.expression).text})')
+
+    def visitVarStmt(self, stmt: Var):
+        value = self.expr(stmt.initializer).text if stmt.initializer else 'None'
+        self.declare(self.analyzer.bindings[stmt], value)
+
+    def visitBlockStmt(self, stmt: Block):
+        for statement in stmt.statements:
+            self.emitStmt(statement)
+
+    def visitIfStmt(self, stmt: If):
+        self.emit(f'if {self.truthy(stmt.condition)}:')
+        self.emitBody([stmt.thenBranch])
+        if stmt.elseBranch:
+            self.emit('else:')
+            self.emitBody([stmt.elseBranch])
+
+    def visitWhileStmt(self, stmt: While):
+        if self.loops >= MAX_LOOP_NESTING:
+            self.emitHoistedLoop(stmt)
+            return
+        self.loops += 1
+        self.emit(f'while {self.truthy(stmt.condition)}:')
+        self.emitBody([stmt.body])
+        self.loops -= 1
+
+    def emitHoistedLoop(self, stmt: While):
+        self.loopCount += 1
+        name = f'_w{self.loopCount}'
+        hoisted = HoistedLoop(self.hoisted)
+        self.emit(f'def {name}():')
+        self.indent += 1
+        # Filled in with the global and nonlocal statements once the body
+        # has been emitted; a blank line if there are none.
+        declarations = len(self.lines)
+        self.lines.append('')
+        enclosingLoops, self.loops, self.hoisted = self.loops, 0, hoisted
+        self.visitWhileStmt(stmt)
+        self.loops, self.hoisted = enclosingLoops, hoisted.enclosing
+        if self.function is None:
+            # Top-level code: every name keeps being a module global.
+            globals = hoisted.declared | hoisted.assigned.keys()
+            nonlocals = ()
+        else:
+            owned = {name: binding for name, binding in hoisted.assigned.items()
+                     if name not in hoisted.declared}
+            globals = {name for name, binding in owned.items()
+                       if binding.isGlobal or binding.function is None}
+            nonlocals = owned.keys() - globals
+        statements = []
+        if globals:
+            statements.append(f'global {", ".join(sorted(globals))}')
+        if nonlocals:
+            statements.append(f'nonlocal {", ".join(sorted(nonlocals))}')
+        self.lines[declarations] = '    ' * self.indent + '; '.join(statements)
+        self.indent -= 1
+        if self.function is None:
+            self.emit(f'{name}()')
+            return
+        result = self.temp('h')
+        self.emit(f'{result} = {name}()')
+        self.emit(f'if {result} is not None:')
+        self.emit(f'    return {result}' if self.hoisted is not None else f'    return {result}[0]')
+
+    def visitReturnStmt(self, stmt: Return):
+        if self.tailLoop is not None and stmt in self.tailLoop.sites:
+            self.emitSelfCall(stmt.value)
+        elif self.hoisted is not None:
+            if self.functionKind == 'init':
+                value = 'self'
+            elif stmt.value is None:
+                value = 'None'
+            else:
+                value = self.expr(stmt.value).text
+            self.emit(f'return ({value},)')
+        elif self.functionKind == 'init':
+            self.emit('return self')
+        elif stmt.value is None:
+            self.emit('return None')
+        else:
+            self.emit(f'return {self.expr(stmt.value).text}')
+
+    def visitFunctionStmt(self, stmt: Function):
+        binding = self.analyzer.bindings[stmt]
+        self.bind(binding.pyName, binding.storage())
+        if binding.boxed:
+            self.emit(f'{binding.storage()} = [None]')
+        tailLoop = None
+        if binding.isGlobal:
+            tailLoop = self.findTailLoop(stmt, lambda callee: isinstance(callee, Variable)
+                                         and self.analyzer.bindings[callee] is binding)
+        self.emitFunction(stmt, binding.pyName, 'function', tailLoop)
+        if tailLoop is not None:
+            self.emit(f'{tailLoop.ref} = {binding.pyName}')
+        if binding.boxed:
+            self.emit(f'{binding.storage()}[0] = {binding.pyName}')
+
+    def findTailLoop(self, stmt: Function, isSelf) -> TailLoop:
+        # Only for functions declaring no closures: those could capture a
+        # parameter, which must then not be rebound by the next iteration.
+        sites = {site for site in tailCalls(stmt.body)
+                 if isSelf(site.value.callee) and len(site.value.args) == len(stmt.params)}
+        if not sites or declaresFunctions(stmt.body):
+            return None
+        params = [self.analyzer.bindings[param].pyName for param in stmt.params]
+        return TailLoop(self.selfName(), params, sites)
+
+    def emitSelfCall(self, expr: Call):
+        callee = expr.callee
+        function = self.temp('c')
+        params = list(self.tailLoop.params)
+        if isinstance(callee, Get):
+            self.pending.append(('get', callee.name))
+            self.emit(f'{function} = {self.expr(callee.object).text}.l_{callee.name.lexeme}')
+            self.emit(f'if type({function}) is _M and {function}.__func__ is {self.tailLoop.ref}:')
+            params.insert(0, 'self')
+            values = [f'{function}.__self__']
+            calleeType, argCount = '_M', len(expr.args) + 1
+        else:
+            self.emit(f'{function} = {self.expr(callee).text}')
+            self.emit(f'if {function} is {self.tailLoop.ref}:')
+            values = []
+            calleeType, argCount = '_F', len(expr.args)
+        self.indent += 1
+        values.extend(self.expr(arg).text for arg in expr.args)
+        if params:
+            self.emit(f'{", ".join(params)} = {", ".join(values)}')
+        self.emit('continue')
+        self.indent -= 1
+        args = [self.expr(arg).text for arg in expr.args]
+        self.emit(f'return {self.callSite(function, calleeType, argCount, args, expr.paren).text}')
+
+    def emitFunction(self, stmt: Function, name: str, kind: str, tailLoop: TailLoop = None):
+        info = self.analyzer.functions[stmt]
+        params = [self.analyzer.bindings[param].pyName for param in stmt.params]
+        if kind != 'function':
+            params.insert(0, 'self')
+        defaults = sorted(
+            binding.storage() for binding in info.free
+            if (binding.boxed or binding.isSuper) and binding.function is info.parent)
+        if defaults:
+            params.append('*')
+            params.extend(f'{default}={default}' for default in defaults)
+        self.emit(f'def {name}({", ".join(params)}):')
+
+        enclosing, enclosingKind, enclosingDepth = self.function, self.functionKind, self.depth
+        enclosingLoop, enclosingLoops, enclosingHoisted = self.tailLoop, self.loops, self.hoisted
+        self.function, self.functionKind, self.depth = info, kind, 0
+        self.tailLoop, self.loops, self.hoisted = tailLoop, 0, None
+        self.indent += 1
+        globals = sorted(
+            binding.storage() for binding in info.assigns
+            if not binding.boxed and (binding.isGlobal or binding.function is None))
+        nonlocals = sorted(
+            binding.storage() for binding in info.assigns
+            if not binding.boxed and not binding.isGlobal and binding.function is not None)
+        if globals:
+            self.emit(f'global {", ".join(globals)}')
+        if nonlocals:
+            self.emit(f'nonlocal {", ".join(nonlocals)}')
+        if tailLoop is not None:
+            self.emit('while True:')
+            self.indent += 1
+            self.loops = 1
+        before = len(self.lines)
+        for statement in stmt.body:
+            self.emitStmt(statement)
+        if kind == 'init':
+            self.emit('return self')
+        elif tailLoop is not None:
+            self.emit('return None')
+            self.indent -= 1
+        elif len(self.lines) == before:
+            self.emit('pass')
+        self.indent -= 1
+        self.function, self.functionKind, self.depth = enclosing, enclosingKind, enclosingDepth
+        self.tailLoop, self.loops, self.hoisted = enclosingLoop, enclosingLoops, enclosingHoisted
+
+    def visitClassStmt(self, stmt: Class):
+        binding = self.analyzer.bindings[stmt]
+        self.bind(binding.pyName, binding.storage())
+        base = '_LoxObject'
+        if stmt.superclass is not None:
+            superBinding = self.analyzer.supers[stmt]
+            self.bind(superBinding.pyName)
+            superclass = self.expr(stmt.superclass).text
+            self.emit(f'{superBinding.pyName} = _superclass({superclass}, {self.token(stmt.superclass.name)})')
+            base = superBinding.pyName
+        if binding.boxed:
+            self.emit(f'{binding.storage()} = [None]')
+        self.emit(f'class {binding.pyName}({base}):')
+        self.indent += 1
+        self.emit(f'_name = {stmt.name.lexeme!r}')
+        tailLoops = []
+        for method in stmt.methods:
+            kind = 'init' if method.name.lexeme == 'init' else 'method'
+            tailLoop = None
+            if kind == 'method' and binding.isGlobal:
+                name = method.name.lexeme
+                tailLoop = self.findTailLoop(method, lambda callee: isinstance(callee, Get)
+                                             and callee.name.lexeme == name)
+                if tailLoop is not None:
+                    tailLoops.append((tailLoop, name))
+            self.emitFunction(method, f'l_{method.name.lexeme}', kind, tailLoop)
+        self.indent -= 1
+        for tailLoop, name in tailLoops:
+            self.emit(f'{tailLoop.ref} = {binding.pyName}.l_{name}')
+        if binding.boxed:
+            self.emit(f'{binding.storage()}[0] = {binding.pyName}')
+
+    def emitSet(self, expr: Set):
+        object = self.expr(expr.object)
+        attribute = f'l_{expr.name.lexeme}'
+        if isinstance(expr.object, This):
+            self.emit(f'{object.text}.{attribute} = {self.expr(expr.value).text}')
+            return
+        instance = self.temp('o')
+        self.emit(f'{instance} = _instance({object.text}, {self.token(expr.name)})')
+        self.emit(f'{instance}.{attribute} = {self.expr(expr.value).text}')
+
+    # Expressions
+
+    def visitLiteralExpr(self, expr: Literal):
+        value = expr.value
+        if value is None:
+            return Code('None', 'nil', True)
+        if value is True or value is False:
+            return Code(repr(value), 'bool', True)
+        if isinstance(value, float):
+            if math.isfinite(value):
+                return Code(repr(value), 'num', True)
+            return Code(f'float({repr(value)!r})', 'num', True)
+        return Code(repr(value), 'str', True)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.expr(expr.expression)
+
+    def visitVariableExpr(self, expr: Variable):
+        return self.read(self.analyzer.bindings[expr], expr.name)
+
+    def visitThisExpr(self, expr: This):
+        return Code('self', simple=True)
+
+    def visitAssignExpr(self, expr: Assign):
+        value = self.expr(expr.value)
+        binding = self.analyzer.bindings[expr]
+        return Code(self.write(binding, value.text, expr.name, statement=False), value.kind)
+
+    def visitLogicalExpr(self, expr: Logical):
+        left = self.expr(expr.left)
+        right = self.expr(expr.right)
+        kind = left.kind if left.kind == right.kind else None
+        value, test = self.test(left)
+        if expr.operator.type == TokenType.OR:
+            return Code(f'({value} if {test} else {right.text})', kind)
+        return Code(f'({right.text} if {test} else {value})', kind)
+
+    def visitUnaryExpr(self, expr: Unary):
+        right = self.expr(expr.right)
+        if expr.operator.type is TokenType.BANG:
+            return Code(f'(not {self.test(right)[1]})', 'bool')
+        if right.kind == 'num':
+            return Code(f'(-{right.text})', 'num')
+        error = f'_numErr({self.token(expr.operator)})'
+        if right.simple:
+            return Code(f'(-{right.text} if type({right.text}) is float else {error})', 'num')
+        value = self.temp('v')
+        return Code(f'(-{value} if type({value} := {right.text}) is float else {error})', 'num')
+
+    def operands(self, expr: Binary):
+        # Returns (left, right) as (use, evaluate) pairs: `evaluate` appears
+        # first in the generated guard and binds a temporary if needed,
+        # `use` refers to the value afterwards.
+        left = self.expr(expr.left)
+        right = self.expr(expr.right)
+        if left.simple and self.isPure(expr.right):
+            leftPair = (left.text, left.text)
+        else:
+            name = self.temp('l')
+            leftPair = (name, f'({name} := {left.text})')
+        if right.simple:
+            rightPair = (right.text, right.text)
+        else:
+            name = self.temp('r')
+            rightPair = (name, f'({name} := {right.text})')
+        return left, right, leftPair, rightPair
+
+    def visitBinaryExpr(self, expr: Binary):
+        opType = expr.operator.type
+        left, right, (l, lEval), (r, rEval) = self.operands(expr)
+
+        if opType in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            negate = 'not ' if opType is TokenType.BANG_EQUAL else ''
+            if left.kind == 'nil' or right.kind == 'nil':
+                other = right if left.kind == 'nil' else left
+                if other.kind is not None and other.simple:
+                    return Code(repr((other.kind == 'nil') != bool(negate)), 'bool', True)
+                return Code(f'({negate}({other.text}) is None)', 'bool')
+            if left.kind is not None and left.kind == right.kind:
+                return Code(f'({negate}({left.text} == {right.text}))', 'bool')
+            if left.kind is None and right.kind is None:
+                # Bound methods (_M) are equal in Python when they bind the
+                # same function to the same instance, but in Lox only to
+                # themselves.
+                return Code(f'({negate}({lEval} == {rEval} and (type({l}) is type({r}) is not _M '
+                            f'or {l} is {r} or _strings({l}, {r}))))', 'bool')
+            return Code(f'({negate}({lEval} == {rEval} and (type({l}) is type({r}) or _strings({l}, {r}))))',
+                        'bool')
+
+        token = self.token(expr.operator)
+        if opType is TokenType.PLUS:
+            # Strings are concatenated by _add or _concat, which build ropes
+            # (see Rope.py); only numbers are added inline.
+            if left.kind == right.kind == 'num':
+                return Code(f'({left.text} + {right.text})', 'num')
+            if left.kind == right.kind == 'str':
+                return Code(f'_concat({left.text}, {right.text})', 'str')
+            if 'num' in (left.kind, right.kind):
+                return Code(f'({l} + {r} if type({lEval}) is type({rEval}) is float else _addErr({token}))', 'num')
+            return Code(f'({l} + {r} if type({lEval}) is type({rEval}) is float else _add({l}, {r}, {token}))',
+                        'str' if 'str' in (left.kind, right.kind) else None)
+
+        resultKind = 'bool' if opType in COMPARISONS else 'num'
+        if opType is TokenType.SLASH:
+            if left.kind == 'num' and right.kind == 'num':
+                return Code(f'({l} / {r} if {rEval} else _divErr({token}, {l}, {r}))'
+                            if right.simple and left.simple else
+                            f'({l} / {r} if ({lEval}, {rEval})[1] else _divErr({token}, {l}, {r}))', 'num')
+            return Code(f'({l} / {r} if type({lEval}) is type({rEval}) is float and {r} '
+                        f'else _divErr({token}, {l}, {r}))', 'num')
+
+        op = NUMERIC_OPS[opType]
+        if left.kind == 'num' and right.kind == 'num':
+            return Code(f'({left.text} {op} {right.text})', resultKind)
+        if right.kind == 'num' and right.simple:
+            return Code(f'({l} {op} {right.text} if type({lEval}) is float else _numErr({token}))', resultKind)
+        return Code(f'({l} {op} {r} if type({lEval}) is type({rEval}) is float else _numErr({token}))',
+                    resultKind)
+
+    def callSite(self, callee: str, calleeType: str, argCount: int, args: list[str], paren: Token) -> Code:
+        function = self.temp('c')
+        self.pending.append(('call', paren))
+        return Code(
+            f'({function} if type({function} := {callee}) is {calleeType} and '
+            f'{function}.__code__.co_argcount == {argCount} '
+            f'else _callable({function}, {self.token(paren)}))({", ".join(args)})')
+
+    def visitCallExpr(self, expr: Call):
+        callee = expr.callee
+        argCount = len(expr.args)
+        if isinstance(callee, Get):
+            method = self.property(callee)
+            args = [self.expr(arg).text for arg in expr.args]
+            return self.callSite(method, '_M', argCount + 1, args, expr.paren)
+        if isinstance(callee, Super):
+            method = self.expr(callee)
+            args = [self.expr(arg).text for arg in expr.args]
+            return self.callSite(method.text, '_M', argCount + 1, args, expr.paren)
+        function = self.expr(callee)
+        args = [self.expr(arg).text for arg in expr.args]
+        return self.callSite(function.text, '_F', argCount, args, expr.paren)
+
+    def visitGetExpr(self, expr: Get):
+        return Code(self.property(expr))
+
+    def property(self, expr: Get) -> str:
+        # obj.name, with the object checked to be an instance: classes and
+        # functions have Python attributes too, but no Lox properties.
+        object = self.expr(expr.object)
+        instance = self.temp('o')
+        self.pending.append(('get', expr.name))
+        return (f'({instance} if isinstance({instance} := {object.text}, _LoxObject) '
+                f'else _getErr({self.token(expr.name)})).l_{expr.name.lexeme}')
+
+    def visitSetExpr(self, expr: Set):
+        object = self.expr(expr.object)
+        value = self.expr(expr.value)
+        return Code(f'_setattr({object.text}, {"l_" + expr.name.lexeme!r}, {value.text}, {self.token(expr.name)})',
+                    value.kind)
+
+    def visitSuperExpr(self, expr: Super):
+        binding = self.analyzer.bindings[expr]
+        self.pending.append(('super', expr.method))
+        return Code(f'{binding.storage()}.l_{expr.method.lexeme}.__get__(self)')
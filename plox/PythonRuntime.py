@@ -0,0 +1,157 @@
+from types import FunctionType as _F, MethodType as _M
+from .LoxCallable import LoxCallable
+from .NativeFunctions import NativeError
+from .RuntimeError import RuntimeError
+from .TokenType import Token, TokenType
+from .Rope import STRING_TYPES as _S, concat as _concat
+
+# Support code for modules produced by PythonGenerator. Generated code does
+# the common cases inline and only calls into here for the slow paths, so
+# everything below is about Lox semantics rather than speed.
+
+__all__ = [
+    '_F', '_M', '_LoxObject', '_tokens', '_print', '_numErr', '_addErr', '_add', '_concat',
+    '_strings', '_divErr', '_getErr', '_callable', '_superclass', '_instance', '_setattr', '_setbox', '_assignGlobal',
+    'loxName', 'translateError',
+]
+
+def loxName(pyName: str) -> str:
+    # Lox names are emitted as l_<name> (globals, fields, methods) or
+    # l<n>_<name> (locals); strip the prefix back off.
+    return pyName.split('_', 1)[1]
+
+class _LoxObject:
+    _name = None
+
+    def __repr__(self) -> str:
+        return f'<class-instance {type(self)._name}>'
+
+def _tokens(entries):
+    return tuple(Token(TokenType[type], lexeme, None, line) for type, lexeme, line in entries)
+
+def _print(value):
+    valueType = type(value)
+    if valueType is _F:
+        value = f'<fn {loxName(value.__name__)} >'
+    elif valueType is _M:
+        value = f'<fn {loxName(value.__func__.__name__)} >'
+    elif isinstance(value, type):
+        value = f'<class {value._name}>'
+    print(value)
+
+def _numErr(token: Token):
+    raise RuntimeError(token, 'Operand must be a number', 'Interpreter')
+
+def _addErr(token: Token):
+    raise RuntimeError(token, "Operands must be two strings or two numbers", 'Interpreter')
+
+def _add(left, right, token: Token):
+    if isinstance(left, _S) and isinstance(right, _S):
+        return _concat(left, right)
+    _addErr(token)
+
+def _strings(left, right) -> bool:
+    # A str and a Rope holding the same text are equal.
+    return isinstance(left, _S) and isinstance(right, _S)
+
+def _divErr(token: Token, left, right):
+    if type(left) is float and type(right) is float:
+        raise RuntimeError(token, "Divide by zero is not allowed", 'Interpreter')
+    _numErr(token)
+
+def _getErr(token: Token):
+    raise RuntimeError(token, "Only instances have properties.", 'Interpreter')
+
+def _callable(callee, token: Token):
+    # Reached when the inline check at a call site fails: the callee is a
+    # class, a native, a function of the wrong arity or not callable at all.
+    # Arity errors are raised only once the arguments have been evaluated.
+    def invoke(*args):
+        calleeType = type(callee)
+        if calleeType is _F:
+            arity = callee.__code__.co_argcount
+        elif calleeType is _M:
+            arity = callee.__code__.co_argcount - 1
+        elif isinstance(callee, type) and issubclass(callee, _LoxObject):
+            initializer = getattr(callee, 'l_init', None)
+            arity = 0 if initializer is None else initializer.__code__.co_argcount - 1
+            checkArity(arity, args)
+            instance = object.__new__(callee)
+            if initializer is not None:
+                initializer(instance, *args)
+            return instance
+        elif isinstance(callee, LoxCallable):
+            checkArity(callee.arity(), args)
+            try:
+                return callee.call(None, list(args))
+            except NativeError as e:
+                raise RuntimeError(token, e.message, 'Interpreter') from None
+        else:
+            raise RuntimeError(token, "Can only call functions and classes", 'Interpreter')
+        checkArity(arity, args)
+        return callee(*args)
+
+    def checkArity(arity, args):
+        if len(args) != arity:
+            raise RuntimeError(token, f'Expected {arity} arguments got {len(args)}.', 'Interpreter')
+
+    return invoke
+
+def _superclass(value, token: Token):
+    if isinstance(value, type) and issubclass(value, _LoxObject):
+        return value
+    raise RuntimeError(token, "Superclass must be a class", 'Interpreter')
+
+def _instance(value, token: Token):
+    if isinstance(value, _LoxObject):
+        return value
+    raise RuntimeError(token, "Only instances have fields", 'Interpreter')
+
+def _setattr(object, name: str, value, token: Token):
+    setattr(_instance(object, token), name, value)
+    return value
+
+def _setbox(box: list, value):
+    box[0] = value
+    return value
+
+def _assignGlobal(namespace: dict, name: str, value, token: Token):
+    if name not in namespace:
+        raise RuntimeError(token, f"Undefined variable '{token.lexeme}'.", 'Environment Search')
+    namespace[name] = value
+    return value
+
+def translateError(error: Exception, lineTokens: dict):
+    # Python raises NameError/AttributeError for the few checks generated
+    # code leaves to the Python runtime, and RecursionError when Lox calls
+    # nest too deeply. Find the innermost generated frame and report the
+    # error against the matching Lox token on that line.
+    traceback = error.__traceback__
+    candidates = []
+    while traceback is not None:
+        code = traceback.tb_frame.f_code
+        if code.co_filename in lineTokens:
+            candidates = lineTokens[code.co_filename].get(traceback.tb_lineno, [])
+        traceback = traceback.tb_next
+
+    def find(kinds, lexeme):
+        for kind, token in candidates:
+            if kind in kinds and token.lexeme == lexeme:
+                return token
+        line = candidates[0][1].line if candidates else 0
+        return Token(TokenType.IDENTIFIER, lexeme, None, line)
+
+    if isinstance(error, RecursionError):
+        return RuntimeError(find(('call',), ')'), 'Stack overflow', 'Interpreter')
+    if isinstance(error, NameError) and getattr(error, 'name', None):
+        name = loxName(error.name)
+        return RuntimeError(find(('var',), name), f'Undefined variable {name}.', 'Environment Search')
+    if isinstance(error, AttributeError) and getattr(error, 'name', None):
+        name = loxName(error.name)
+        if isinstance(error.obj, _LoxObject):
+            return RuntimeError(find(('get',), name), f'Undefined property {name}', 'Instance Call')
+        for kind, token in candidates:
+            if kind == 'super' and token.lexeme == name:
+                return RuntimeError(token, f'Undefined property {name}', 'Interpreter')
+        return RuntimeError(find(('get',), name), "Only instances have properties.", 'Interpreter')
+    return None
@@ -0,0 +1,332 @@
+import sys
+from .Expr import Binary, Unary, Logical
+from .TokenType import TokenType
+from .Rope import STRING_TYPES, concat
+
+# Quickening for the tree-walker. The first time a Binary, Unary or
+# Logical node is evaluated with operands of one kind (two numbers, two
+# strings or a boolean), it turns itself into a specialized node by
+# swapping its __class__ for a subclass below. The subclass's accept() has
+# the operation inlined behind a single type guard, skipping the operator
+# dispatch in Interpreter. When the guard fails, the node becomes a
+# Deoptimized one, which stays generic for good, and the interpreter
+# finishes the operation on the operands already evaluated.
+#
+# A node's state is its class, so nothing is kept on the side and a
+# program (or a --stream declaration) can be freed as soon as it is done.
+# Specialized subclasses add no fields, so the swap is allowed both ways,
+# and pickling (Expr.__reduce__) always stores the generic node. Only the
+# tree-walker runs them, after every other visitor is done with a program.
+
+class NodeStats:
+    __slots__ = ('expr', 'kind', 'operands', 'deoptimized')
+
+    def __init__(self, expr):
+        self.expr = expr
+        # Operand kind the node was specialized for, if it ever was.
+        self.kind: str = None
+        # Kinds of the operands that first kept it generic, or that
+        # deoptimized it.
+        self.operands: str = None
+        self.deoptimized = False
+
+    def state(self) -> str:
+        if self.deoptimized:
+            return 'deoptimized'
+        return self.kind or 'generic'
+
+class Quickening:
+    def __init__(self):
+        # NodeStats for every node seen, only kept for --quicken-stats.
+        self.nodes: dict = None
+
+    def collectStats(self):
+        self.nodes = dict()
+
+    def binary(self, expr: Binary, left, right):
+        kind = operandKind(left)
+        if kind != operandKind(right):
+            kind = None
+        self.specialize(expr, kind, BINARY.get((kind, expr.operator.type)), left, right)
+
+    def unary(self, expr: Unary, right):
+        kind = operandKind(right)
+        self.specialize(expr, kind, UNARY.get((kind, expr.operator.type)), right)
+
+    def logical(self, expr: Logical, left):
+        kind = operandKind(left)
+        self.specialize(expr, kind, LOGICAL.get((kind, expr.operator.type)), left)
+
+    def specialize(self, expr, kind: str, specialized: type, *operands):
+        if specialized is not None:
+            expr.__class__ = specialized
+        if self.nodes is not None:
+            stats = self.stats(expr)
+            if specialized is not None:
+                stats.kind = kind
+            elif stats.operands is None:
+                stats.operands = describe(*operands)
+
+    def deoptimize(self, expr, *operands):
+        expr.__class__ = expr.deoptimized
+        if self.nodes is not None:
+            stats = self.stats(expr)
+            stats.deoptimized = True
+            stats.operands = describe(*operands)
+
+    def stats(self, expr) -> NodeStats:
+        stats = self.nodes.get(expr)
+        if stats is None:
+            stats = self.nodes[expr] = NodeStats(expr)
+        return stats
+
+def operandKind(value) -> str:
+    valueType = type(value)
+    if valueType is float:
+        return 'number'
+    if valueType is bool:
+        return 'bool'
+    if isinstance(value, STRING_TYPES):
+        return 'string'
+    return None
+
+def describe(*operands) -> str:
+    return ', '.join(operandKind(value) or ('nil' if value is None else 'object') for value in operands)
+
+# Nodes whose specialization failed: evaluated generically, without trying
+# to specialize them again.
+
+class DeoptimizedBinary(Binary):
+    __slots__ = ()
+    generic = Binary
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        return interpreter.binaryOperation(self, left, self.right.accept(interpreter))
+
+class DeoptimizedUnary(Unary):
+    __slots__ = ()
+    generic = Unary
+    def accept(self, interpreter):
+        return interpreter.unaryOperation(self, self.right.accept(interpreter))
+
+class DeoptimizedLogical(Logical):
+    __slots__ = ()
+    generic = Logical
+    def accept(self, interpreter):
+        return interpreter.logicalOperation(self, self.left.accept(interpreter))
+
+class QuickBinary(Binary):
+    __slots__ = ()
+    generic = Binary
+    deoptimized = DeoptimizedBinary
+
+class QuickUnary(Unary):
+    __slots__ = ()
+    generic = Unary
+    deoptimized = DeoptimizedUnary
+
+class QuickLogical(Logical):
+    __slots__ = ()
+    generic = Logical
+    deoptimized = DeoptimizedLogical
+
+class NumberAdd(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left + right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberSubtract(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left - right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberMultiply(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left * right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberDivide(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        # Dividing by zero is an error, left to the generic node.
+        if type(left) is float and type(right) is float and right:
+            return left / right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberGreater(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left > right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberGreaterEqual(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left >= right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberLess(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left < right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberLessEqual(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left <= right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberEqual(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left == right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberNotEqual(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if type(left) is float and type(right) is float:
+            return left != right
+        return interpreter.binaryFallback(self, left, right)
+
+class StringAdd(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+            return concat(left, right)
+        return interpreter.binaryFallback(self, left, right)
+
+class StringEqual(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+            return left == right
+        return interpreter.binaryFallback(self, left, right)
+
+class StringNotEqual(QuickBinary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        right = self.right.accept(interpreter)
+        if isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+            return left != right
+        return interpreter.binaryFallback(self, left, right)
+
+class NumberNegate(QuickUnary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        right = self.right.accept(interpreter)
+        if type(right) is float:
+            return -right
+        return interpreter.unaryFallback(self, right)
+
+class BoolNot(QuickUnary):
+    __slots__ = ()
+    def accept(self, interpreter):
+        right = self.right.accept(interpreter)
+        if type(right) is bool:
+            return not right
+        return interpreter.unaryFallback(self, right)
+
+class BoolAnd(QuickLogical):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        if left is True:
+            return self.right.accept(interpreter)
+        if left is False:
+            return left
+        return interpreter.logicalFallback(self, left)
+
+class BoolOr(QuickLogical):
+    __slots__ = ()
+    def accept(self, interpreter):
+        left = self.left.accept(interpreter)
+        if left is False:
+            return self.right.accept(interpreter)
+        if left is True:
+            return left
+        return interpreter.logicalFallback(self, left)
+
+BINARY = {
+    ('number', TokenType.PLUS): NumberAdd,
+    ('number', TokenType.MINUS): NumberSubtract,
+    ('number', TokenType.STAR): NumberMultiply,
+    ('number', TokenType.SLASH): NumberDivide,
+    ('number', TokenType.GREATER): NumberGreater,
+    ('number', TokenType.GREATER_EQUAL): NumberGreaterEqual,
+    ('number', TokenType.LESS): NumberLess,
+    ('number', TokenType.LESS_EQUAL): NumberLessEqual,
+    ('number', TokenType.EQUAL_EQUAL): NumberEqual,
+    ('number', TokenType.BANG_EQUAL): NumberNotEqual,
+    ('string', TokenType.PLUS): StringAdd,
+    ('string', TokenType.EQUAL_EQUAL): StringEqual,
+    ('string', TokenType.BANG_EQUAL): StringNotEqual,
+}
+UNARY = {
+    ('number', TokenType.MINUS): NumberNegate,
+    ('bool', TokenType.BANG): BoolNot,
+}
+LOGICAL = {
+    ('bool', TokenType.AND): BoolAnd,
+    ('bool', TokenType.OR): BoolOr,
+}
+
+def printStats(quickening: Quickening, file=sys.stderr, top: int = 10):
+    # How monomorphic the program's operators were: the kind each node
+    # was specialized for, or the operands that kept it generic.
+    nodes = list(quickening.nodes.values())
+    states = dict()
+    for stats in nodes:
+        states[stats.state()] = states.get(stats.state(), 0) + 1
+    specialized = sum(states.get(kind, 0) for kind in ('number', 'string', 'bool'))
+    rate = 100.0 * specialized / len(nodes) if nodes else 0.0
+    print(f'quickening: {len(nodes)} nodes, {specialized} specialized ({rate:.1f}%), '
+          f'{states.get("deoptimized", 0)} deoptimized, {states.get("generic", 0)} generic', file=file)
+    for kind in ('number', 'string', 'bool'):
+        if kind in states:
+            print(f'  {kind:12} {states[kind]} nodes', file=file)
+    # Deoptimized nodes first: those saw more than one kind of operand.
+    unspecialized = sorted((stats for stats in nodes if stats.state() in ('deoptimized', 'generic')),
+                           key=lambda stats: (not stats.deoptimized, stats.expr.operator.line))[:top]
+    for stats in unspecialized:
+        operator = stats.expr.operator
+        was = f'was {stats.kind}, ' if stats.deoptimized else ''
+        print(f'  [Line {operator.line}] {operator.lexeme:16} {stats.state():12} '
+              f'{was}saw {stats.operands}', file=file)
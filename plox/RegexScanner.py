@@ -0,0 +1,103 @@
+import re
+from sys import intern
+from .TokenType import *
+from .Util import atLineError
+
+# Same token stream and errors as Scanner, but driven by one compiled
+# pattern: each match is a token (or a newline or comment) preceded by any
+# blanks on the same line, and `lastgroup` says which kind it is.
+TOKEN_PATTERN = re.compile(r'''
+  [ \t\r]*
+  (?:
+    (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<newline>\n[ \t\r\n]*)
+  | (?P<operator>!=|==|<=|>=|[(){},.\-+;*!=<>])
+  | (?P<number>[0-9]+(?:\.[0-9]+)?)
+  | (?P<comment>//[^\n]*)
+  | (?P<slash>/)
+  | (?P<string>"[^"]*")
+  | (?P<unterminated>"[^"]*)
+  | (?P<unexpected>.)
+  )
+''', re.VERBOSE | re.DOTALL)
+
+KEYWORDS = {
+    "and": TokenType.AND,
+    "class": TokenType.CLASS,
+    "else": TokenType.ELSE,
+    "false": TokenType.FALSE,
+    "for": TokenType.FOR,
+    "fun": TokenType.FUN,
+    "if": TokenType.IF,
+    "nil": TokenType.NIL,
+    "or": TokenType.OR,
+    "print": TokenType.PRINT,
+    "return": TokenType.RETURN,
+    "super": TokenType.SUPER,
+    "this": TokenType.THIS,
+    "true": TokenType.TRUE,
+    "var": TokenType.VAR,
+    "while": TokenType.WHILE
+}
+
+OPERATORS = dict(simpleCharsMap())
+for char, (single, double) in maybeTwoCharacterMap().items():
+    OPERATORS[char] = single
+    OPERATORS[char + '='] = double
+
+class RegexScanner:
+    # `source` is either the whole program as a string or an iterable of
+    # lines (e.g. an open file), which iterTokens scans one line at a time.
+    def __init__(self, source):
+        self.source = source
+        self.tokens = list()
+        self.line = 1
+        self.hadError = False
+
+    def scanTokens(self) -> list:
+        self.tokens.extend(self.iterTokens())
+        return self.tokens
+
+    def iterTokens(self):
+        chunks = (self.source,) if isinstance(self.source, str) else self.source
+        line = self.line
+        keywords = KEYWORDS
+        operators = OPERATORS
+        identifier = TokenType.IDENTIFIER
+        # A string left open at the end of a chunk is carried over and
+        # rescanned together with the next one.
+        pending = ''
+        for chunk in chunks:
+            text = pending + chunk if pending else chunk
+            pending = ''
+            for match in TOKEN_PATTERN.finditer(text):
+                kind = match.lastgroup
+                value = match.group(kind)
+                if kind == 'identifier':
+                    # Names repeat a lot; interning shares one string per name.
+                    yield Token(keywords.get(value, identifier), intern(value), None, line)
+                elif kind == 'newline':
+                    line += value.count('\n')
+                elif kind == 'operator':
+                    yield Token(operators[value], intern(value), None, line)
+                elif kind == 'number':
+                    yield Token(TokenType.NUMBER, value, float(value), line)
+                elif kind == 'comment':
+                    pass
+                elif kind == 'slash':
+                    yield Token(TokenType.SLASH, value, None, line)
+                elif kind == 'string':
+                    line += value.count('\n')
+                    yield Token(TokenType.STRING, value, value[1:-1], line)
+                elif kind == 'unterminated':
+                    pending = value
+                    break
+                else:
+                    atLineError(line, "<Scanning>Unexpected character.")
+                    self.hadError = True
+        if pending:
+            line += pending.count('\n')
+            atLineError(line, "<Scanning>Unterminated string")
+            self.hadError = True
+        self.line = line
+        yield Token(TokenType.EOF, "", None, line)
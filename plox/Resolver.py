@@ -1,3 +1,4 @@
+from __future__ import annotations
 from .Expr import *
 from .Stmt import *
 from .Interpreter import Interpreter
@@ -18,7 +19,8 @@ class ClassType(Enum):
 class Resolver(ExprVisitor, StmtVisitor):
     def __init__(self, interpreter: Interpreter):
         self.interpreter = interpreter
-        self.scopes: List[dict[str, bool]] = []
+        self.scopes: list[dict[str, bool]] = []
+        self.slots: list[dict[str, int]] = []
         self.currentFunction = FunctionType.NONE
         self.currentClass = ClassType.NONE
         self.hadError = False
@@ -42,7 +44,7 @@ class Resolver(ExprVisitor, StmtVisitor):
     def resolveLocal(self, expr: Expr, name: Token):
         for i in range(len(self.scopes) - 1, -1, -1):
             if self.scopes[i].get(name.lexeme):
-                self.interpreter.resolve(expr, len(self.scopes) -1 -i)
+                self.interpreter.resolve(expr, len(self.scopes) -1 -i, self.slots[i][name.lexeme])
                 return
 
     def visitAssignExpr(self, expr: Assign):
@@ -68,8 +70,10 @@ class Resolver(ExprVisitor, StmtVisitor):
         if stmt.superclass is not None:
             self.beginScope()
             self.scopes[-1]["super"] = True
+            self.slots[-1]["super"] = 0
         self.beginScope()
         self.scopes[-1]["this"] = True
+        self.slots[-1]["this"] = 0
         for method in stmt.methods:
             declaration = FunctionType.METHOD
             if method.name.lexeme == 'init':
@@ -129,6 +133,8 @@ class Resolver(ExprVisitor, StmtVisitor):
             if self.currentFunction == FunctionType.INITIALIZER:
                 self.error(stmt.keyword, "Can't return a value from an initializer")
             self.resolve(stmt.value)
+            # `return f(...)` can reuse the caller's activation.
+            stmt.tail = isinstance(stmt.value, Call)
 
     def visitWhileStmt(self, stmt: While):
         self.resolve(stmt.condition)
@@ -165,7 +171,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         else:
             self.resolveStmts(val)
 
-    def resolveStmts(self, stmts: List[Stmt]):
+    def resolveStmts(self, stmts: list[Stmt]):
         for stmt in stmts:
             self.resolveStmt(stmt)
 
@@ -178,9 +184,11 @@ class Resolver(ExprVisitor, StmtVisitor):
     def beginScope(self):
         newScope : dict[str, bool] = {}
         self.scopes.append(newScope)
+        self.slots.append({})
 
     def endScope(self):
         self.scopes.pop()
+        self.slots.pop()
 
     def declare(self, name: Token):
         if len(self.scopes) == 0:
@@ -190,6 +198,10 @@ class Resolver(ExprVisitor, StmtVisitor):
             self.error(name, "Already variable with this name in scope")
         scope[name.lexeme] = False
         self.scopes[-1] = scope
+        # Locals live at fixed indices of their Environment, in the order
+        # they are declared.
+        slots = self.slots[-1]
+        slots[name.lexeme] = len(slots)
 
 
     def define(self, name: Token):
@@ -1,3 +0,0 @@
-class ReturnEx(Exception):
-    def __init__(self, value) -> None:
-        self.value = value 
\ No newline at end of file
@@ -0,0 +1,98 @@
+# Lox strings built by `+` are kept as ropes: a Rope is the concatenation
+# of two strings (str or Rope), so `s = s + piece` costs O(1) instead of
+# copying `s`. A rope is flattened into a str the first time it is printed,
+# compared or hashed, and keeps that str from then on.
+#
+# Strings up to FLAT_LIMIT characters are always plain str, so short
+# strings stay as cheap as before and every Rope is longer than that.
+# Traversals are iterative: `s = s + piece` in a loop builds a rope as deep
+# as the loop is long.
+
+FLAT_LIMIT = 64
+
+class Rope:
+    __slots__ = ('left', 'right', 'length', 'flat')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.length: int = len(left) + len(right)
+        self.flat: str = None
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        if self.flat is None:
+            self.flat = ''.join(self.pieces())
+            # The pieces are no longer needed, and may be large.
+            self.left = self.right = None
+        return self.flat
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __eq__(self, other):
+        if type(other) is Rope or type(other) is str:
+            return self.length == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    # Python-level `+`, used by modules generated for the python engine.
+    def __add__(self, other):
+        if type(other) is Rope or type(other) is str:
+            return concat(self, other)
+        return NotImplemented
+
+    def __radd__(self, other):
+        if type(other) is str:
+            return concat(other, self)
+        return NotImplemented
+
+    def pieces(self):
+        # The str leaves (or flattened subtrees) in order.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if type(node) is str:
+                yield node
+            elif node.flat is not None:
+                yield node.flat
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def slice(self, start: int, end: int) -> str:
+        # self[start:end], visiting only the pieces that overlap it.
+        if self.flat is not None:
+            return self.flat[start:end]
+        result = []
+        stack = [(self, 0)]
+        while stack:
+            node, offset = stack.pop()
+            if offset >= end or offset + len(node) <= start:
+                continue
+            if type(node) is Rope and node.flat is None:
+                stack.append((node.right, offset + len(node.left)))
+                stack.append((node.left, offset))
+            else:
+                result.append(str(node)[max(start - offset, 0):end - offset])
+        return ''.join(result)
+
+STRING_TYPES = (str, Rope)
+
+def concat(left, right):
+    # left + right for two Lox strings.
+    if type(right) is str:
+        if type(left) is str:
+            if len(left) + len(right) <= FLAT_LIMIT:
+                return left + right
+        elif left.flat is None and type(left.right) is str and \
+                len(left.right) + len(right) <= FLAT_LIMIT:
+            # Appending a short piece to a rope ending in a short piece:
+            # merge the two, so ropes built a few characters at a time have
+            # a node per FLAT_LIMIT characters rather than per piece.
+            return Rope(left.left, left.right + right)
+    return Rope(left, right)
@@ -46,9 +46,8 @@ class Scanner:
             self.addToken(_charMap.get(char))
         elif _twoCharMap.get(char):
             (l, r) = _twoCharMap.get(char)
-            if self.peekNext() == '=':
-                self.addToken(r, text=f'{char + "="}')
-                self.advance()
+            if self.match('='):
+                self.addToken(r)
             else:
                 self.addToken(l)
         elif char == '/':
@@ -123,7 +122,7 @@ class Scanner:
     def peekNext(self) -> chr:
         if self.current + 1 >= len(self.source):
             return '\0'
-        return self.source[self.current]
+        return self.source[self.current + 1]
 
     def identifier(self):
         while self.isAlphaNumeric(self.peek()):
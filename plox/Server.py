@@ -0,0 +1,217 @@
+import io
+import os
+import sys
+import json
+import pickle
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# A long-lived plox (--serve) that runs scripts for ploxc.py (Client.py)
+# over a UNIX domain socket, see Client.py for the protocol. Everything
+# plox can need is imported up front, and compiled programs stay in memory
+# between requests, so a request only costs a fresh Lox and Interpreter.
+#
+# Requests run on a bounded pool of threads. Each thread's print()s and
+# error reports are routed to its own client by ThreadOutput, which stands
+# in for sys.stdout and sys.stderr.
+
+from .Lox import Lox, parseArgs, printStats
+from .Interpreter import PYTHON_FRAMES_PER_CALL
+from .Cache import Cache
+from . import ClosureCompiler, BytecodeCompiler, VM, PythonGenerator, PythonRuntime
+from . import Optimizer, Memoizer
+from .Client import defaultSocket
+
+# The recursive engines run deep Lox recursion on the request threads.
+THREAD_STACK_SIZE = 64 * 1024 * 1024
+
+# Exit status of a request plox could not run (bad options).
+EXIT_USAGE = 2
+
+class ThreadOutput(io.TextIOBase):
+    # Writes to the stream the current thread has set, or to `default`.
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def current(self):
+        return getattr(self.local, 'stream', None) or self.default
+
+    def write(self, text: str) -> int:
+        return self.current().write(text)
+
+    def flush(self):
+        self.current().flush()
+
+class ClientStream(io.TextIOBase):
+    # Sends what is written as {name: text} messages, a line at a time.
+    def __init__(self, connection: socket.socket, name: str):
+        self.connection = connection
+        self.name = name
+        self.buffer = []
+
+    def write(self, text: str) -> int:
+        self.buffer.append(text)
+        if '\n' in text:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            text = ''.join(self.buffer)
+            self.buffer.clear()
+            send(self.connection, {self.name: text})
+
+def send(connection: socket.socket, message: dict):
+    try:
+        connection.sendall(json.dumps(message).encode() + b'\n')
+    except OSError:
+        # The client went away; the script still runs to completion.
+        pass
+
+class MemoryCache:
+    # Keeps compiled programs in memory, keyed on the script's path and
+    # modification time, in front of the on-disk cache. Programs are kept
+    # pickled, so every run gets its own copy of the AST and its annotations.
+    def __init__(self, disk: Cache):
+        self.disk = disk
+        self.entries = dict()
+
+    def load(self, script: str, source: str):
+        path = os.path.abspath(script)
+        entry = self.entries.get(path)
+        if entry is not None:
+            mtime, cachedSource, program = entry
+            if mtime == os.stat(path).st_mtime_ns and cachedSource == source:
+                return pickle.loads(program)
+        if self.disk is None:
+            return None
+        statements = self.disk.load(script, source)
+        if statements is not None:
+            self.remember(path, source, statements)
+        return statements
+
+    def store(self, script: str, source: str, statements):
+        self.remember(os.path.abspath(script), source, statements)
+        if self.disk is not None:
+            self.disk.store(script, source, statements)
+
+    def remember(self, path: str, source: str, statements):
+        try:
+            program = pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+            self.entries[path] = (os.stat(path).st_mtime_ns, source, program)
+        except (OSError, pickle.PicklingError, RecursionError):
+            pass
+
+class Server:
+    def __init__(self, path: str, jobs: int):
+        self.path = path
+        self.jobs = jobs
+        # (cache directory, -O level, on-disk cache) -> MemoryCache
+        self.caches = dict()
+        self.lock = threading.Lock()
+
+    def cacheFor(self, args) -> MemoryCache:
+        key = (args.cache_dir, args.optimize, args.no_cache)
+        with self.lock:
+            cache = self.caches.get(key)
+            if cache is None:
+                disk = None if args.no_cache else Cache(args.cache_dir, args.optimize)
+                cache = self.caches[key] = MemoryCache(disk)
+            return cache
+
+    def serve(self):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(self.path):
+            try:
+                listener.connect(self.path)
+                raise SystemExit(f'a plox server is already listening on {self.path}')
+            except ConnectionRefusedError:
+                os.unlink(self.path)
+            listener.close()
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        os.chmod(self.path, 0o600)
+        listener.listen()
+        sys.stdout = ThreadOutput(sys.stdout)
+        sys.stderr = ThreadOutput(sys.stderr)
+        threading.stack_size(THREAD_STACK_SIZE)
+        print(f'plox server listening on {self.path} with {self.jobs} workers', file=sys.stderr)
+        try:
+            with ThreadPoolExecutor(self.jobs) as pool:
+                while True:
+                    connection, _ = listener.accept()
+                    pool.submit(self.handle, connection)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            os.unlink(self.path)
+
+    def handle(self, connection: socket.socket):
+        stdout = ClientStream(connection, 'stdout')
+        stderr = ClientStream(connection, 'stderr')
+        sys.stdout.local.stream = stdout
+        sys.stderr.local.stream = stderr
+        try:
+            with connection:
+                request = json.loads(connection.makefile('r', encoding='utf-8').readline())
+                try:
+                    status = self.run(request)
+                except Exception:
+                    print(f"Some failure occured: {sys.exc_info()[0]}")
+                    traceback.print_exc()
+                    status = 1
+                stdout.flush()
+                stderr.flush()
+                send(connection, {'exit': status})
+        except (OSError, ValueError):
+            pass
+        finally:
+            sys.stdout.local.stream = None
+            sys.stderr.local.stream = None
+
+    def run(self, request: dict) -> int:
+        cwd = request.get('cwd', '/')
+        source = request.get('source')
+        try:
+            args = parseArgs(request.get('args', []))
+        except SystemExit as e:
+            return e.code or 0
+        if args.batch or args.serve or args.profile or args.profile_json:
+            print('--batch, --serve and --profile cannot be used through the server', file=sys.stderr)
+            return EXIT_USAGE
+        if args.max_depth and args.engine in PYTHON_FRAMES_PER_CALL:
+            # The recursive engines would raise Python's recursion limit,
+            # which is shared by every request the server runs.
+            print(f'--max-depth cannot be used through the server with --engine={args.engine}', file=sys.stderr)
+            return EXIT_USAGE
+        if args.script is None and source is None:
+            print('the server needs a script, or - to read one from stdin', file=sys.stderr)
+            return EXIT_USAGE
+        # Paths are relative to the client's directory, not the server's.
+        dumpPython = os.path.join(cwd, args.dump_python) if args.dump_python else None
+        if args.cache_dir:
+            args.cache_dir = os.path.join(cwd, args.cache_dir)
+        lox = Lox(args.engine, dumpPython, self.cacheFor(args), args.max_depth, args.optimize,
+                  args.memo_size if args.memoize else 0)
+        if args.ic_stats:
+            lox.interpreter.collectCacheStats()
+        if args.quicken_stats:
+            lox.interpreter.quickening.collectStats()
+        if source is not None:
+            lox.run(source)
+        else:
+            script = os.path.join(cwd, args.script)
+            print(f'Executing file: {args.script}')
+            if args.stream:
+                lox.runStream(script)
+            else:
+                lox.runFile(script)
+        printStats(lox, args)
+        return lox.exitStatus()
+
+def serve(path: str, jobs: int):
+    Server(path or defaultSocket(), jobs).serve()
@@ -0,0 +1,19 @@
+# Hidden classes for LoxInstance. A shape maps field names to offsets in
+# an instance's `values` list. Shapes never change: adding a field moves
+# the instance to a child shape, so instances of a class that get the same
+# fields in the same order (typically in `init`) share one shape.
+
+class Shape:
+    __slots__ = ('offsets', 'transitions')
+
+    def __init__(self, offsets: dict = None):
+        self.offsets: dict[str, int] = offsets if offsets is not None else dict()
+        self.transitions: dict[str, Shape] = dict()
+
+    def withField(self, name: str):
+        shape = self.transitions.get(name)
+        if shape is None:
+            offsets = dict(self.offsets)
+            offsets[name] = len(offsets)
+            shape = self.transitions[name] = Shape(offsets)
+        return shape
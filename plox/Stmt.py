@@ -1,7 +1,8 @@
-from typing import *
+from __future__ import annotations
 from .TokenType import Token
 from .Expr import *
 class Stmt:
+	__slots__ = ()
 	def init(self): pass
 	def accept(self,visitor): pass
 class StmtVisitor:
@@ -16,65 +17,93 @@ class StmtVisitor:
 	def visitWhileStmt(self,stmt:Stmt): pass
 
 class Block(Stmt):
-	def __init__(self,statements:List[Stmt]):
+	__slots__ = ('statements',)
+	def __init__(self,statements:list[Stmt]):
 		self.statements = statements
+	def __reduce__(self):
+		return (Block, (self.statements, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitBlockStmt(self)
 
 class Class(Stmt):
-	def __init__(self,name:Token, superclass:Variable, methods:List):
+	__slots__ = ('name', 'superclass', 'methods',)
+	def __init__(self,name:Token, superclass:Variable, methods:list):
 		self.name = name
 		self. superclass =  superclass
 		self. methods =  methods
+	def __reduce__(self):
+		return (Class, (self.name, self.superclass, self.methods, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitClassStmt(self)
 
 class Expression(Stmt):
+	__slots__ = ('expression',)
 	def __init__(self,expression:Expr):
 		self.expression = expression
+	def __reduce__(self):
+		return (Expression, (self.expression, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitExpressionStmt(self)
 
 class If(Stmt):
+	__slots__ = ('condition', 'thenBranch', 'elseBranch',)
 	def __init__(self,condition:Expr, thenBranch:Stmt, elseBranch:Stmt):
 		self.condition = condition
 		self. thenBranch =  thenBranch
 		self. elseBranch =  elseBranch
+	def __reduce__(self):
+		return (If, (self.condition, self.thenBranch, self.elseBranch, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitIfStmt(self)
 
 class Function(Stmt):
-	def __init__(self,name:Token, params:List[Token], body:List[Stmt]):
+	__slots__ = ('name', 'params', 'body',)
+	def __init__(self,name:Token, params:list[Token], body:list[Stmt]):
 		self.name = name
 		self. params =  params
 		self. body =  body
+	def __reduce__(self):
+		return (Function, (self.name, self.params, self.body, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitFunctionStmt(self)
 
 class Print(Stmt):
+	__slots__ = ('expression',)
 	def __init__(self,expression:Expr):
 		self.expression = expression
+	def __reduce__(self):
+		return (Print, (self.expression, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitPrintStmt(self)
 
 class Return(Stmt):
+	__slots__ = ('keyword', 'value', 'tail',)
 	def __init__(self,keyword:Token, value:Expr):
 		self.keyword = keyword
 		self. value =  value
+		self.tail = None
+	def __reduce__(self):
+		return (Return, (self.keyword, self.value, ), (None, {'tail': self.tail}))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitReturnStmt(self)
 
 class Var(Stmt):
+	__slots__ = ('name', 'initializer',)
 	def __init__(self,name:Token, initializer:Expr):
 		self.name = name
 		self. initializer =  initializer
+	def __reduce__(self):
+		return (Var, (self.name, self.initializer, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitVarStmt(self)
 
 class While(Stmt):
+	__slots__ = ('condition', 'body',)
 	def __init__(self,condition:Expr, body:Stmt):
 		self.condition = condition
 		self. body =  body
+	def __reduce__(self):
+		return (While, (self.condition, self.body, ))
 	def accept(self, visitor:StmtVisitor):
 		return visitor.visitWhileStmt(self)
 
@@ -79,6 +79,8 @@ def whiteSpaceMap():
     return d
 
 class Token:
+    __slots__ = ('type', 'lexeme', 'literal', 'line')
+
     def __init__(self,
                  type:TokenType=None,
                  lexeme:str="",
@@ -89,6 +91,9 @@ class Token:
         self.literal = literal
         self.line = line
 
+    def __reduce__(self):
+        return (Token, (self.type, self.lexeme, self.literal, self.line))
+
     def toString(self):
         return f"TYPE={self.type} LEXEME={self.lexeme} LITERAL={self.literal}\n"
 
@@ -0,0 +1,494 @@
+from __future__ import annotations
+from .Chunk import OpCode
+from .LoxCallable import LoxCallable
+from .NativeFunctions import NativeError
+from .RuntimeError import RuntimeError
+from .Rope import STRING_TYPES, concat
+from .Interpreter import isEqual
+from .VMObjects import *
+
+class VM:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.globals: dict[str, object] = dict()
+        self.stack: list[object] = []
+        self.frames: list[CallFrame] = []
+        self.openUpvalues: dict[int, ObjUpvalue] = dict()
+        # Frames live on the heap, so Lox recursion is bounded by this
+        # rather than by Python's own stack.
+        self.maxDepth: int = interpreter.maxDepth
+
+    def defineNative(self, name: str, function: LoxCallable):
+        self.globals[name] = function
+
+    def interpret(self, function: ObjFunction):
+        closure = ObjClosure(function, [])
+        self.stack.append(closure)
+        self.frames.append(CallFrame(closure, 0, 0))
+        try:
+            self.run()
+        except RuntimeError:
+            self.resetStack()
+            raise
+
+    def resetStack(self):
+        self.stack.clear()
+        self.frames.clear()
+        self.openUpvalues.clear()
+
+    def runtimeError(self, frame: CallFrame, ip: int, message: str, stage: str = 'Interpreter'):
+        # `ip` points just past the failing instruction's operands; walk back
+        # to the closest recorded instruction offset.
+        tokens = frame.closure.function.chunk.tokens
+        offset = ip - 1
+        while offset >= 0 and offset not in tokens:
+            offset -= 1
+        return RuntimeError(tokens[offset], message, stage)
+
+    def captureUpvalue(self, index: int) -> ObjUpvalue:
+        upvalue = self.openUpvalues.get(index)
+        if upvalue is None:
+            upvalue = ObjUpvalue(self.stack, index)
+            self.openUpvalues[index] = upvalue
+        return upvalue
+
+    def closeUpvalues(self, last: int):
+        openUpvalues = self.openUpvalues
+        for index in [i for i in openUpvalues if i >= last]:
+            openUpvalues.pop(index).close()
+
+    def run(self):
+        # Opcodes, the stack and the current frame's state are all cached in
+        # locals; frame state is spilled back only around calls and returns.
+        CONSTANT = OpCode.CONSTANT.value
+        NIL = OpCode.NIL.value
+        TRUE = OpCode.TRUE.value
+        FALSE = OpCode.FALSE.value
+        POP = OpCode.POP.value
+        GET_LOCAL = OpCode.GET_LOCAL.value
+        SET_LOCAL = OpCode.SET_LOCAL.value
+        GET_GLOBAL = OpCode.GET_GLOBAL.value
+        DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+        SET_GLOBAL = OpCode.SET_GLOBAL.value
+        GET_UPVALUE = OpCode.GET_UPVALUE.value
+        SET_UPVALUE = OpCode.SET_UPVALUE.value
+        GET_PROPERTY = OpCode.GET_PROPERTY.value
+        SET_PROPERTY = OpCode.SET_PROPERTY.value
+        GET_SUPER = OpCode.GET_SUPER.value
+        EQUAL = OpCode.EQUAL.value
+        NOT_EQUAL = OpCode.NOT_EQUAL.value
+        GREATER = OpCode.GREATER.value
+        GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+        LESS = OpCode.LESS.value
+        LESS_EQUAL = OpCode.LESS_EQUAL.value
+        ADD = OpCode.ADD.value
+        SUBTRACT = OpCode.SUBTRACT.value
+        MULTIPLY = OpCode.MULTIPLY.value
+        DIVIDE = OpCode.DIVIDE.value
+        NOT = OpCode.NOT.value
+        NEGATE = OpCode.NEGATE.value
+        PRINT = OpCode.PRINT.value
+        JUMP = OpCode.JUMP.value
+        JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+        POP_JUMP_IF_FALSE = OpCode.POP_JUMP_IF_FALSE.value
+        LOOP = OpCode.LOOP.value
+        CALL = OpCode.CALL.value
+        INVOKE = OpCode.INVOKE.value
+        SUPER_INVOKE = OpCode.SUPER_INVOKE.value
+        TAIL_CALL = OpCode.TAIL_CALL.value
+        TAIL_INVOKE = OpCode.TAIL_INVOKE.value
+        TAIL_SUPER_INVOKE = OpCode.TAIL_SUPER_INVOKE.value
+        CLOSURE = OpCode.CLOSURE.value
+        CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+        RETURN = OpCode.RETURN.value
+        CLASS = OpCode.CLASS.value
+        INHERIT = OpCode.INHERIT.value
+        METHOD = OpCode.METHOD.value
+
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        globals = self.globals
+        frames = self.frames
+        maxDepth = self.maxDepth
+
+        frame = frames[-1]
+        closure = frame.closure
+        code = closure.function.chunk.code
+        constants = closure.function.chunk.constants
+        upvalues = closure.upvalues
+        base = frame.base
+        ip = frame.ip
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                push(constants[code[ip]])
+                ip += 1
+            elif op == GET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                try:
+                    push(globals[name])
+                except KeyError:
+                    raise self.runtimeError(frame, ip, f'Undefined variable {name}.', 'Environment Search')
+            elif op == POP_JUMP_IF_FALSE:
+                value = pop()
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                stack[-1] = left - right
+            elif op == ADD:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left + right
+                elif isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+                    stack[-1] = concat(left, right)
+                else:
+                    raise self.runtimeError(frame, ip, "Operands must be two strings or two numbers")
+            elif op == LESS:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                stack[-1] = left < right
+            elif op == LESS_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                stack[-1] = left <= right
+            elif op == CALL:
+                argCount = code[ip]
+                ip += 1
+                callee = stack[-1 - argCount]
+                if type(callee) is ObjClosure:
+                    function = callee.function
+                    if argCount != function.arity:
+                        raise self.runtimeError(
+                            frame, ip, f'Expected {function.arity} arguments got {argCount}.')
+                    if len(frames) >= maxDepth:
+                        raise self.runtimeError(frame, ip, 'Stack overflow')
+                    frame.ip = ip
+                    frame = CallFrame(callee, 0, len(stack) - argCount - 1)
+                    frames.append(frame)
+                    closure = callee
+                    code = function.chunk.code
+                    constants = function.chunk.constants
+                    upvalues = callee.upvalues
+                    base = frame.base
+                    ip = 0
+                else:
+                    frame.ip = ip
+                    self.callValue(frame, ip, callee, argCount)
+                    frame = frames[-1]
+                    closure = frame.closure
+                    code = closure.function.chunk.code
+                    constants = closure.function.chunk.constants
+                    upvalues = closure.upvalues
+                    base = frame.base
+                    ip = frame.ip
+            elif op == RETURN:
+                result = pop()
+                if self.openUpvalues:
+                    self.closeUpvalues(base)
+                frames.pop()
+                if not frames:
+                    pop()
+                    return
+                del stack[base:]
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                upvalues = closure.upvalues
+                base = frame.base
+                ip = frame.ip
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == POP:
+                pop()
+            elif op == GET_UPVALUE:
+                upvalue = upvalues[code[ip]]
+                push(upvalue.location[upvalue.index])
+                ip += 1
+            elif op == SET_UPVALUE:
+                upvalue = upvalues[code[ip]]
+                upvalue.location[upvalue.index] = stack[-1]
+                ip += 1
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == JUMP or op == LOOP:
+                ip = code[ip]
+            elif op == NIL:
+                push(None)
+            elif op == TRUE:
+                push(True)
+            elif op == FALSE:
+                push(False)
+            elif op == MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                stack[-1] = left * right
+            elif op == DIVIDE:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                if right == 0:
+                    raise self.runtimeError(frame, ip, "Divide by zero is not allowed")
+                stack[-1] = left / right
+            elif op == GREATER:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                stack[-1] = left > right
+            elif op == GREATER_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                stack[-1] = left >= right
+            elif op == EQUAL:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = left == right if type(left) is type(right) else isEqual(left, right)
+            elif op == NOT_EQUAL:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = not (left == right if type(left) is type(right) else isEqual(left, right))
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op == NEGATE:
+                value = stack[-1]
+                if not isinstance(value, float):
+                    raise self.runtimeError(frame, ip, 'Operand must be a number')
+                stack[-1] = value * -1.0
+            elif op == PRINT:
+                print(pop())
+            elif op == SET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name not in globals:
+                    raise self.runtimeError(frame, ip, f"Undefined variable '{name}'.", 'Environment Search')
+                globals[name] = stack[-1]
+            elif op == DEFINE_GLOBAL:
+                globals[constants[code[ip]]] = pop()
+                ip += 1
+            elif op == GET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                instance = stack[-1]
+                if type(instance) is not ObjInstance:
+                    raise self.runtimeError(frame, ip, "Only instances have properties.")
+                fields = instance.fields
+                if name in fields:
+                    stack[-1] = fields[name]
+                else:
+                    method = instance.klass.methods.get(name)
+                    if method is None:
+                        raise self.runtimeError(frame, ip, f'Undefined property {name}', 'Instance Call')
+                    stack[-1] = ObjBoundMethod(instance, method)
+            elif op == SET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                value = pop()
+                instance = stack[-1]
+                if type(instance) is not ObjInstance:
+                    raise self.runtimeError(frame, ip, "Only instances have fields")
+                instance.fields[name] = value
+                stack[-1] = value
+            elif op == INVOKE or op == SUPER_INVOKE:
+                name = constants[code[ip]]
+                argCount = code[ip + 1]
+                ip += 2
+                frame.ip = ip
+                self.invoke(frame, ip, op == INVOKE, name, argCount)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                upvalues = closure.upvalues
+                base = frame.base
+                ip = frame.ip
+            elif op == CLOSURE:
+                function = constants[code[ip]]
+                ip += 1
+                captured = []
+                for _ in range(function.upvalueCount):
+                    isLocal = code[ip]
+                    index = code[ip + 1]
+                    ip += 2
+                    if isLocal:
+                        captured.append(self.captureUpvalue(base + index))
+                    else:
+                        captured.append(upvalues[index])
+                push(ObjClosure(function, captured))
+            elif op == CLOSE_UPVALUE:
+                self.closeUpvalues(len(stack) - 1)
+                pop()
+            elif op == GET_SUPER:
+                name = constants[code[ip]]
+                ip += 1
+                superclass = pop()
+                method = superclass.methods.get(name)
+                if method is None:
+                    raise self.runtimeError(frame, ip, f'Undefined property {name}')
+                stack[-1] = ObjBoundMethod(stack[-1], method)
+            elif op == CLASS:
+                push(ObjClass(constants[code[ip]]))
+                ip += 1
+            elif op == INHERIT:
+                superclass = stack[-2]
+                if type(superclass) is not ObjClass:
+                    raise self.runtimeError(frame, ip, "Superclass must be a class")
+                stack[-1].methods.update(superclass.methods)
+                pop()
+            elif op == METHOD:
+                method = pop()
+                stack[-1].methods[constants[code[ip]]] = method
+                ip += 1
+            elif op == TAIL_CALL or op == TAIL_INVOKE or op == TAIL_SUPER_INVOKE:
+                depth = len(frames)
+                if op == TAIL_CALL:
+                    argCount = code[ip]
+                    ip += 1
+                    frame.ip = ip
+                    self.callValue(frame, ip, stack[-1 - argCount], argCount)
+                else:
+                    name = constants[code[ip]]
+                    argCount = code[ip + 1]
+                    ip += 2
+                    frame.ip = ip
+                    self.invoke(frame, ip, op == TAIL_INVOKE, name, argCount)
+                # Natives and classes without an initializer have already
+                # left their result on the stack for the RETURN that follows.
+                if len(frames) > depth:
+                    self.replaceCaller()
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                upvalues = closure.upvalues
+                base = frame.base
+                ip = frame.ip
+            else:
+                raise Exception(f'Unknown opcode {op}')
+
+    def replaceCaller(self):
+        # The frame just pushed by a tail call takes over its caller's: the
+        # callee and its arguments move down to the caller's base, so a
+        # chain of tail calls runs in constant stack and frame space.
+        frames = self.frames
+        callee = frames.pop()
+        caller = frames[-1]
+        if self.openUpvalues:
+            self.closeUpvalues(caller.base)
+        del self.stack[caller.base:callee.base]
+        callee.base = caller.base
+        frames[-1] = callee
+
+    def invoke(self, frame: CallFrame, ip: int, onInstance: bool, name: str, argCount: int):
+        stack = self.stack
+        if onInstance:
+            receiver = stack[-1 - argCount]
+            if type(receiver) is not ObjInstance:
+                raise self.invokeError(frame, ip, 0, "Only instances have properties.")
+            if name in receiver.fields:
+                callee = receiver.fields[name]
+                stack[-1 - argCount] = callee
+                self.callValue(frame, ip, callee, argCount)
+            else:
+                self.invokeFromClass(frame, ip, receiver.klass, name, argCount, 'Instance Call')
+        else:
+            superclass = stack.pop()
+            self.invokeFromClass(frame, ip, superclass, name, argCount, 'Interpreter')
+
+    def invokeError(self, frame: CallFrame, ip: int, which: int, message: str, stage: str = 'Interpreter'):
+        # INVOKE records (property name, call paren) as its error tokens.
+        tokens = frame.closure.function.chunk.tokens
+        offset = ip - 1
+        while offset not in tokens:
+            offset -= 1
+        return RuntimeError(tokens[offset][which], message, stage)
+
+    def invokeFromClass(self, frame: CallFrame, ip: int, klass: ObjClass, name: str, argCount: int,
+                        stage: str):
+        # `stage` labels a missing method: the other engines report one on
+        # an instance from the instance, and one on super from the interpreter.
+        method = klass.methods.get(name)
+        if method is None:
+            raise self.invokeError(frame, ip, 0, f'Undefined property {name}', stage)
+        self.callClosure(frame, ip, method, argCount)
+
+    def callClosure(self, frame: CallFrame, ip: int, closure: ObjClosure, argCount: int):
+        if argCount != closure.function.arity:
+            raise self.callError(
+                frame, ip, f'Expected {closure.function.arity} arguments got {argCount}.')
+        if len(self.frames) >= self.maxDepth:
+            raise self.callError(frame, ip, 'Stack overflow')
+        self.frames.append(CallFrame(closure, 0, len(self.stack) - argCount - 1))
+
+    def callError(self, frame: CallFrame, ip: int, message: str):
+        return RuntimeError(self.callToken(frame, ip), message, 'Interpreter')
+
+    def callToken(self, frame: CallFrame, ip: int):
+        # The paren of the call instruction just before `ip`.
+        tokens = frame.closure.function.chunk.tokens
+        offset = ip - 1
+        while offset not in tokens:
+            offset -= 1
+        token = tokens[offset]
+        if isinstance(token, tuple):
+            token = token[1]
+        return token
+
+    def callValue(self, frame: CallFrame, ip: int, callee: object, argCount: int):
+        stack = self.stack
+        calleeType = type(callee)
+        if calleeType is ObjClosure:
+            self.callClosure(frame, ip, callee, argCount)
+        elif calleeType is ObjBoundMethod:
+            stack[-1 - argCount] = callee.receiver
+            self.callClosure(frame, ip, callee.method, argCount)
+        elif calleeType is ObjClass:
+            stack[-1 - argCount] = ObjInstance(callee)
+            initializer = callee.methods.get('init')
+            if initializer is not None:
+                self.callClosure(frame, ip, initializer, argCount)
+            elif argCount != 0:
+                raise self.callError(frame, ip, f'Expected 0 arguments got {argCount}.')
+        elif isinstance(callee, LoxCallable):
+            if argCount != callee.arity():
+                raise self.callError(frame, ip, f'Expected {callee.arity()} arguments got {argCount}.')
+            args = stack[len(stack) - argCount:]
+            try:
+                result = callee.call(self.interpreter, args)
+            except NativeError as e:
+                raise self.callError(frame, ip, e.message)
+            del stack[len(stack) - argCount - 1:]
+            stack.append(result)
+        else:
+            raise self.callError(frame, ip, "Can only call functions and classes")
@@ -0,0 +1,81 @@
+from __future__ import annotations
+from .Chunk import Chunk
+
+# Runtime objects of the bytecode VM. They print the same way as their
+# tree-walker counterparts (LoxFunction, LoxClass, LoxInstance).
+
+class ObjFunction:
+    __slots__ = ('name', 'arity', 'upvalueCount', 'chunk')
+
+    def __init__(self, name: str, arity: int = 0):
+        self.name = name
+        self.arity = arity
+        self.upvalueCount = 0
+        self.chunk = Chunk()
+
+    def __repr__(self) -> str:
+        if self.name is None:
+            return '<script>'
+        return f'<fn {self.name} >'
+
+class ObjUpvalue:
+    # While the captured variable is still on the VM stack, `location` is
+    # the stack itself and `index` the variable's slot. Closing the upvalue
+    # moves the value into a one element list of its own.
+    __slots__ = ('location', 'index')
+
+    def __init__(self, location: list[object], index: int):
+        self.location = location
+        self.index = index
+
+    def close(self):
+        self.location = [self.location[self.index]]
+        self.index = 0
+
+class ObjClosure:
+    __slots__ = ('function', 'upvalues')
+
+    def __init__(self, function: ObjFunction, upvalues: list[ObjUpvalue]):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __repr__(self) -> str:
+        return repr(self.function)
+
+class ObjClass:
+    __slots__ = ('name', 'methods')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.methods: dict[str, ObjClosure] = dict()
+
+    def __repr__(self) -> str:
+        return f'<class {self.name}>'
+
+class ObjInstance:
+    __slots__ = ('klass', 'fields')
+
+    def __init__(self, klass: ObjClass):
+        self.klass = klass
+        self.fields: dict[str, object] = dict()
+
+    def __repr__(self) -> str:
+        return f'<class-instance {self.klass.name}>'
+
+class ObjBoundMethod:
+    __slots__ = ('receiver', 'method')
+
+    def __init__(self, receiver: object, method: ObjClosure):
+        self.receiver = receiver
+        self.method = method
+
+    def __repr__(self) -> str:
+        return repr(self.method.function)
+
+class CallFrame:
+    __slots__ = ('closure', 'ip', 'base')
+
+    def __init__(self, closure: ObjClosure, ip: int, base: int):
+        self.closure = closure
+        self.ip = ip
+        self.base = base
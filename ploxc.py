@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+from plox import Client
+
+if __name__ == "__main__":
+    Client.main()